@@ -78,15 +78,18 @@ def config_get(
         raise typer.Exit(1)
 
 
+GLOBAL_SECTIONS = ("evp.", "storage.")
+
+
 def _set(section: str, new: str | None, device: str | None) -> None:
-    if section.startswith("evp."):
-        __set_evp(section, new, device)
+    if section.startswith(GLOBAL_SECTIONS):
+        __set_global(section, new, device)
     else:
         __set_device_scope(section, new, device)
 
 
 def __set_device_scope(section: str, new: str | None, device: str | None) -> None:
-    assert not section.startswith("evp.")
+    assert not section.startswith(GLOBAL_SECTIONS)
 
     device_config = (
         config_obj.get_active_device_config()
@@ -117,8 +120,8 @@ def __set_device_scope(section: str, new: str | None, device: str | None) -> Non
         raise SystemExit(f"Error setting '{section}'. {e.errors()[0]['msg']}.")
 
 
-def __set_evp(section: str, new: str | None, device: str | None) -> None:
-    assert section.startswith("evp.")
+def __set_global(section: str, new: str | None, device: str | None) -> None:
+    assert section.startswith(GLOBAL_SECTIONS)
 
     sections_split = section.split(".")
     selected_config = config_obj.config
@@ -16,6 +16,9 @@
 import logging
 import os
 import sys
+from pathlib import Path
+from typing import Annotated
+from typing import Optional
 
 import trio
 import typer
@@ -26,7 +29,15 @@ app = typer.Typer()
 
 
 @app.command(help="Command to start the GUI mode")
-def gui() -> None:
+def gui(
+    latency_report: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="JSON file into which to save the latency histograms of the "
+            "streamed frames, on exit"
+        ),
+    ] = None,
+) -> None:
     os.environ["KIVY_LOG_MODE"] = "PYTHON"
     os.environ["KIVY_NO_ARGS"] = "1"
     os.environ["KIVY_NO_CONSOLELOG"] = "1"
@@ -44,7 +55,9 @@ def gui() -> None:
     logging.getLogger("PIL").setLevel(logging.ERROR)
 
     try:
-        trio.run(LocalConsoleGUIAPP().app_main)
+        gui_app = LocalConsoleGUIAPP()
+        gui_app.latency_report = latency_report
+        trio.run(gui_app.app_main)
     except:
         sys.exit(1)
 
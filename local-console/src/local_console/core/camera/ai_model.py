@@ -31,7 +31,8 @@ from local_console.core.config import config_obj
 from local_console.core.schemas.edge_cloud_if_v1 import DnnDelete
 from local_console.core.schemas.edge_cloud_if_v1 import DnnDeleteBody
 from local_console.core.schemas.schemas import OnWireProtocol
-from local_console.servers.webserver import AsyncWebserver
+from local_console.servers.shared_webserver import serve_directory
+from local_console.servers.webserver import log_download_progress
 from local_console.utils.local_network import get_webserver_ip
 
 logger = logging.getLogger(__name__)
@@ -121,12 +122,14 @@ async def deploy_step(
                 ephemeral_agent.mqtt_scope(
                     [MQTTTopics.ATTRIBUTES_REQ.value, MQTTTopics.ATTRIBUTES.value]
                 ),
-                AsyncWebserver(tmp_dir, webserver_port, None, True) as server,
+                serve_directory(
+                    state.webserver, tmp_dir, webserver_port, log_download_progress
+                ) as (port, prefix),
             ):
                 assert ephemeral_agent.nursery  # make mypy happy
                 # Fill config spec
                 spec = configuration_spec(
-                    OTAUpdateModule.DNNMODEL, tmp_module, tmp_dir, server.port, ip_addr
+                    OTAUpdateModule.DNNMODEL, tmp_module, tmp_dir, port, ip_addr, prefix
                 ).model_dump_json()
                 logger.debug(f"Update spec is: {spec}")
 
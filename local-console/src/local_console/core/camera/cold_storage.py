@@ -0,0 +1,203 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import contextlib
+import logging
+import os
+import sqlite3
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import cv2  # type: ignore
+import numpy as np
+from local_console.utils.fstools import FileInfo
+from local_console.utils.fstools import INDEX_DIR_NAME
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = ".frames.zip"
+ARCHIVE_INDEX_NAME = "archives.sqlite"
+# Already compressed, so they are stored as they are
+JPEG_SUFFIXES = {".jpg", ".jpeg"}
+
+
+class ColdStorageError(Exception):
+    """
+    Exception type for packing files into archives
+    """
+
+
+def is_archive(path: Path) -> bool:
+    return path.name.endswith(ARCHIVE_SUFFIX)
+
+
+class ArchiveIndex:
+    """
+    Locates the archive that holds each file packed out of a directory,
+    by the path of the file relative to that directory.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.location = root / INDEX_DIR_NAME / ARCHIVE_INDEX_NAME
+
+    def _connect(self) -> sqlite3.Connection:
+        self.location.parent.mkdir(exist_ok=True)
+        conn = sqlite3.connect(self.location)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS members ("
+            "name TEXT PRIMARY KEY, archive TEXT NOT NULL)"
+        )
+        return conn
+
+    def add(self, archive: Path, names: list[str]) -> None:
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO members VALUES (?, ?)",
+                    ((name, archive.name) for name in names),
+                )
+
+    def locate(self, name: str) -> Optional[Path]:
+        if not self.location.is_file():
+            return None
+        with contextlib.closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT archive FROM members WHERE name = ?", (name,)
+            ).fetchone()
+        return self.root / row[0] if row else None
+
+    def forget(self, archive: Path) -> None:
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                conn.execute("DELETE FROM members WHERE archive = ?", (archive.name,))
+
+
+class ColdStorage:
+    """
+    Packs old files of a directory into ZIP archives stored at its root,
+    sparing the per-file overhead of keeping them apart, and optionally
+    re-encoding JPEG images with a lower quality. An archive is dated as
+    the newest file it holds, so that retention prunes it as a whole when
+    its turn comes. Packed files can still be fetched one by one.
+    """
+
+    def __init__(self, quality: Optional[int] = None) -> None:
+        self.quality = quality
+
+    def pack(self, root: Path, entries: list[FileInfo]) -> Optional[Path]:
+        """
+        Packs the files of `entries` into a new archive under `root`, then
+        removes them. Files that no longer exist are skipped. Returns the
+        archive, or None if there was nothing to pack.
+        """
+        newest = max((entry.age for entry in entries), default=None)
+        if newest is None:
+            return None
+
+        archive = self._archive_path(root, min(entry.age for entry in entries))
+        # Written away from the watched files, then moved into place whole
+        staging = root / INDEX_DIR_NAME / f"{archive.name}.part"
+        staging.parent.mkdir(exist_ok=True)
+        packed = []
+        try:
+            with zipfile.ZipFile(staging, "w") as zf:
+                for entry in entries:
+                    name = entry.path.relative_to(root).as_posix()
+                    if self._write_member(zf, entry, name):
+                        packed.append(entry)
+            os.utime(staging, ns=(newest, newest))
+            if not packed:
+                staging.unlink()
+                return None
+            os.replace(staging, archive)
+        except (OSError, zipfile.BadZipFile) as e:
+            staging.unlink(missing_ok=True)
+            raise ColdStorageError(f"Could not pack files into {archive}: {e}") from e
+
+        ArchiveIndex(root).add(
+            archive, [entry.path.relative_to(root).as_posix() for entry in packed]
+        )
+        for entry in packed:
+            entry.path.unlink(missing_ok=True)
+        logger.debug(f"Packed {len(packed)} files into {archive}")
+        return archive
+
+    def fetch(self, root: Path, name: str) -> Optional[bytes]:
+        """
+        Contents of the file packed out of `root` with the given relative
+        path, or None if it is not held by any archive.
+        """
+        index = ArchiveIndex(root)
+        archive = index.locate(name)
+        if archive is None:
+            return None
+        try:
+            with zipfile.ZipFile(archive) as zf:
+                return zf.read(name)
+        except FileNotFoundError:
+            # Pruned after being packed
+            index.forget(archive)
+            return None
+        except KeyError:
+            return None
+
+    def _write_member(self, zf: zipfile.ZipFile, entry: FileInfo, name: str) -> bool:
+        try:
+            data = entry.path.read_bytes()
+        except FileNotFoundError:
+            logger.warning(f"File {entry.path} was removed before being packed")
+            return False
+
+        is_jpeg = entry.path.suffix.lower() in JPEG_SUFFIXES
+        if is_jpeg and self.quality is not None:
+            data = recompress_jpeg(data, self.quality)
+
+        info = zipfile.ZipInfo(name, _zip_time(entry.age))
+        info.compress_type = zipfile.ZIP_STORED if is_jpeg else zipfile.ZIP_DEFLATED
+        zf.writestr(info, data)
+        return True
+
+    @staticmethod
+    def _archive_path(root: Path, oldest: int) -> Path:
+        stamp = datetime.fromtimestamp(oldest / 1e9).strftime("%Y%m%d_%H%M%S_%f")
+        archive = root / f"{stamp}{ARCHIVE_SUFFIX}"
+        sequence = 0
+        while archive.exists():
+            sequence += 1
+            archive = root / f"{stamp}_{sequence}{ARCHIVE_SUFFIX}"
+        return archive
+
+
+def recompress_jpeg(data: bytes, quality: int) -> bytes:
+    """
+    Re-encodes a JPEG image with the given quality, keeping the original
+    if that does not make it smaller, or if it cannot be decoded.
+    """
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return data
+    success, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success or len(encoded) >= len(data):
+        return data
+    return bytes(encoded)
+
+
+def _zip_time(age: int) -> tuple[int, int, int, int, int, int]:
+    # The ZIP format cannot hold dates before 1980
+    stamp = max(datetime.fromtimestamp(age / 1e9), datetime(1980, 1, 1))
+    return stamp.timetuple()[:6]
@@ -62,6 +62,17 @@ class FirmwareExtension(StrEnum):
     SENSOR_FW = ".fpk"
 
 
+class FramePolicy(StrEnum):
+    """
+    Selects which frames the streaming pipeline decodes and draws
+    when it falls behind the rate at which the camera uploads them.
+    """
+
+    PROCESS_ALL = "Process all"
+    LATEST_WINS = "Latest wins"
+    EVERY_NTH = "Every Nth"
+
+
 class DeployStage(Enum):
     WaitFirstStatus = "WaitFirstStatus"
     WaitAppliedConfirmation = "WaitAppliedConfirmation"
@@ -71,3 +82,20 @@ class DeployStage(Enum):
 
 class DeploymentType(Enum):
     Application = "Application"
+
+
+class UploadMode(StrEnum):
+    """
+    Selects how the streaming pipeline receives the camera uploads:
+
+    - ON_DISK stages them into a temporary directory before moving them
+      into the input directories.
+    - IN_MEMORY hands them to the pipeline as received, writing them once
+      into the input directories.
+    - IN_MEMORY_ONLY hands them to the pipeline as received, without
+      saving them.
+    """
+
+    ON_DISK = "On disk"
+    IN_MEMORY = "In memory"
+    IN_MEMORY_ONLY = "In memory, not saved"
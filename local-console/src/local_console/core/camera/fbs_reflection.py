@@ -0,0 +1,607 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+"""
+In-process reflection tables for FlatBuffers schemas.
+
+A `.fbs` file is parsed once into a `Schema`, whose tables hold precomputed
+readers for every field. Payloads are then decoded straight into Python
+objects, reproducing the output of `flatc --json --defaults-json --strict-json`.
+
+Only the subset of the schema language used by inference outputs is covered.
+Schemas that make use of anything else raise `UnsupportedSchemaFeature`, so
+that callers can fall back to `flatc`.
+"""
+import enum
+import math
+import re
+import struct
+from collections.abc import Iterator
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Optional
+from typing import Union
+
+
+class SchemaError(Exception):
+    """
+    Conveys an error when parsing a schema or decoding a payload
+    """
+
+
+class UnsupportedSchemaFeature(SchemaError):
+    """
+    The schema is valid, but uses a feature that cannot be decoded in-process
+    """
+
+
+# Scalar type name -> struct format character
+SCALAR_TYPES: dict[str, str] = {
+    "bool": "?",
+    "byte": "b",
+    "int8": "b",
+    "ubyte": "B",
+    "uint8": "B",
+    "short": "h",
+    "int16": "h",
+    "ushort": "H",
+    "uint16": "H",
+    "int": "i",
+    "int32": "i",
+    "uint": "I",
+    "uint32": "I",
+    "long": "q",
+    "int64": "q",
+    "ulong": "Q",
+    "uint64": "Q",
+    "float": "f",
+    "float32": "f",
+    "double": "d",
+    "float64": "d",
+}
+
+# Decimal digits that flatc prints for floating point values
+FLOAT_PRECISION = {"f": 6, "d": 12}
+
+# Attributes whose semantics are not reproduced by this module
+UNSUPPORTED_ATTRIBUTES = {"bit_flags", "force_align", "nested_flatbuffer", "flexbuffer"}
+
+# Declarations that have no bearing on decoding
+_SKIPPED_DECLARATIONS = (
+    "attribute",
+    "file_identifier",
+    "file_extension",
+    "native_include",
+)
+
+_UOFFSET = struct.Struct("<I")
+_SOFFSET = struct.Struct("<i")
+_VOFFSET = struct.Struct("<H")
+
+
+class Kind(enum.Enum):
+    Scalar = enum.auto()
+    Enum = enum.auto()
+    String = enum.auto()
+    Table = enum.auto()
+    Struct = enum.auto()
+    Union = enum.auto()
+    UnionType = enum.auto()
+
+
+@dataclass
+class EnumDef:
+    name: str
+    scalar: str
+    values: dict[int, str] = field(default_factory=dict)
+    # For unions: value -> member table name
+    members: dict[int, str] = field(default_factory=dict)
+
+
+@dataclass
+class FieldDef:
+    name: str
+    type_name: str
+    is_vector: bool = False
+    default: Optional[str] = None
+    attributes: dict[str, Optional[str]] = field(default_factory=dict)
+
+    # Filled in during resolution
+    kind: Kind = Kind.Scalar
+    fmt: str = ""
+    ref: Optional[Union["EnumDef", "TableDef"]] = None
+    default_value: Any = None
+    voffset: int = 0
+    offset: int = 0  # Within structs only
+
+
+@dataclass
+class TableDef:
+    name: str
+    is_struct: bool
+    fields: list[FieldDef] = field(default_factory=list)
+    attributes: dict[str, Optional[str]] = field(default_factory=dict)
+
+    # Filled in during resolution, only for structs
+    size: int = 0
+    align: int = 1
+
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+|//[^\n]*|/\*.*?\*/)
+    |(?P<string>"(?:[^"\\]|\\.)*")
+    |(?P<number>[-+]?(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?))
+    |(?P<ident>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)
+    |(?P<punct>[{}\[\]():;,=])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+def _tokenize(text: str) -> Iterator[str]:
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise SchemaError(f"Unexpected character at offset {pos}: {text[pos]!r}")
+        pos = match.end()
+        if match.lastgroup != "ws":
+            yield match.group()
+
+
+class _Parser:
+    def __init__(self, text: str) -> None:
+        self._tokens = list(_tokenize(text))
+        self._pos = 0
+        self._namespace = ""
+        self.tables: dict[str, TableDef] = {}
+        self.enums: dict[str, EnumDef] = {}
+        self.root_type: Optional[str] = None
+        self._root_namespace = ""
+
+    def _peek(self) -> Optional[str]:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _next(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise SchemaError("Unexpected end of schema")
+        self._pos += 1
+        return token
+
+    def _expect(self, expected: str) -> None:
+        token = self._next()
+        if token != expected:
+            raise SchemaError(f"Expected '{expected}' but found '{token}'")
+
+    def _accept(self, expected: str) -> bool:
+        if self._peek() == expected:
+            self._pos += 1
+            return True
+        return False
+
+    def _qualify(self, name: str) -> str:
+        return f"{self._namespace}.{name}" if self._namespace else name
+
+    def parse(self) -> None:
+        while self._peek() is not None:
+            keyword = self._next()
+            if keyword in ("table", "struct"):
+                self._parse_table(keyword == "struct")
+            elif keyword == "enum":
+                self._parse_enum(is_union=False)
+            elif keyword == "union":
+                self._parse_enum(is_union=True)
+            elif keyword == "namespace":
+                self._namespace = self._next()
+                self._expect(";")
+            elif keyword == "root_type":
+                self.root_type = self._next()
+                self._root_namespace = self._namespace
+                self._expect(";")
+            elif keyword in _SKIPPED_DECLARATIONS:
+                self._next()
+                self._expect(";")
+            elif keyword == "rpc_service":
+                self._skip_block()
+            elif keyword == "include":
+                raise UnsupportedSchemaFeature("include directives")
+            elif keyword == ";":
+                continue
+            else:
+                raise SchemaError(f"Unexpected token '{keyword}'")
+
+    def _skip_block(self) -> None:
+        self._next()  # Name
+        self._expect("{")
+        depth = 1
+        while depth:
+            token = self._next()
+            depth += {"{": 1, "}": -1}.get(token, 0)
+
+    def _parse_attributes(self) -> dict[str, Optional[str]]:
+        attributes: dict[str, Optional[str]] = {}
+        if not self._accept("("):
+            return attributes
+        while not self._accept(")"):
+            name = self._next()
+            value = None
+            if self._accept(":"):
+                value = self._next().strip('"')
+            attributes[name] = value
+            self._accept(",")
+        return attributes
+
+    def _parse_table(self, is_struct: bool) -> None:
+        name = self._qualify(self._next())
+        table = TableDef(name, is_struct, attributes=self._parse_attributes())
+        self._expect("{")
+        while not self._accept("}"):
+            field_name = self._next()
+            self._expect(":")
+            is_vector = self._accept("[")
+            type_name = self._next()
+            if is_vector:
+                if self._accept(":"):
+                    raise UnsupportedSchemaFeature("fixed length arrays")
+                self._expect("]")
+            default = None
+            if self._accept("="):
+                default = self._next()
+            attributes = self._parse_attributes()
+            self._expect(";")
+            table.fields.append(
+                FieldDef(field_name, type_name, is_vector, default, attributes)
+            )
+        self.tables[name] = table
+
+    def _parse_enum(self, is_union: bool) -> None:
+        name = self._qualify(self._next())
+        scalar = "ubyte"
+        if not is_union:
+            self._expect(":")
+            scalar = self._next()
+        attributes = self._parse_attributes()
+        if "bit_flags" in attributes:
+            raise UnsupportedSchemaFeature("bit_flags enums")
+        enum_def = EnumDef(name, scalar)
+        value = 0
+        if is_union:
+            enum_def.values[0] = "NONE"
+            value = 1
+        self._expect("{")
+        while not self._accept("}"):
+            member = self._next()
+            target = member
+            if is_union and self._accept(":"):
+                target = self._next()
+            if self._accept("="):
+                value = int(self._next(), 0)
+            label = member.split(".")[-1]
+            enum_def.values[value] = label
+            if is_union:
+                enum_def.members[value] = target
+            value += 1
+            self._accept(",")
+        self.enums[name] = enum_def
+
+
+class Schema:
+    """
+    Reflection tables resolved from a parsed schema, ready to decode payloads
+    whose root is the schema's `root_type`.
+    """
+
+    def __init__(self, text: str) -> None:
+        parser = _Parser(text)
+        parser.parse()
+        if not parser.root_type:
+            raise SchemaError("Schema does not declare a root_type")
+
+        self.tables = parser.tables
+        self.enums = parser.enums
+        root = self._lookup(parser.root_type, parser._root_namespace)
+        if not isinstance(root, TableDef) or root.is_struct:
+            raise SchemaError(f"root_type {parser.root_type} is not a table")
+        self.root = root
+
+        for enum_def in self.enums.values():
+            if enum_def.members:
+                for value, member in enum_def.members.items():
+                    target = self._lookup(member, _namespace_of(enum_def.name))
+                    if not isinstance(target, TableDef) or target.is_struct:
+                        raise UnsupportedSchemaFeature(
+                            f"union member {member} that is not a table"
+                        )
+                    enum_def.members[value] = target.name
+
+        resolved: set[str] = set()
+        for table in self.tables.values():
+            self._resolve(table, resolved, set())
+
+    def _lookup(self, name: str, namespace: str) -> Union[TableDef, EnumDef, None]:
+        """
+        Resolve a type name as flatc does: from the innermost namespace
+        of the referring declaration outwards.
+        """
+        parts = namespace.split(".") if namespace else []
+        while True:
+            candidate = ".".join([*parts, name])
+            if candidate in self.tables:
+                return self.tables[candidate]
+            if candidate in self.enums:
+                return self.enums[candidate]
+            if not parts:
+                return None
+            parts.pop()
+
+    def _resolve(self, table: TableDef, resolved: set[str], stack: set[str]) -> None:
+        if table.name in resolved:
+            return
+        if table.name in stack:
+            raise SchemaError(f"Struct {table.name} contains itself")
+        stack.add(table.name)
+
+        unsupported = UNSUPPORTED_ATTRIBUTES.intersection(table.attributes)
+        if unsupported:
+            raise UnsupportedSchemaFeature(f"attributes {unsupported}")
+
+        namespace = _namespace_of(table.name)
+        expanded: list[FieldDef] = []
+        for fd in table.fields:
+            unsupported = UNSUPPORTED_ATTRIBUTES.intersection(fd.attributes)
+            if unsupported:
+                raise UnsupportedSchemaFeature(f"attributes {unsupported}")
+            self._resolve_field(fd, namespace, resolved, stack)
+            if table.is_struct and (fd.is_vector or fd.kind not in _STRUCT_KINDS):
+                raise SchemaError(f"Struct {table.name} has non-inline field {fd.name}")
+            if fd.kind == Kind.Union:
+                expanded.append(self._union_type_field(fd))
+            expanded.append(fd)
+
+        if table.is_struct:
+            _layout_struct(table, expanded)
+        else:
+            _assign_slots(table, expanded)
+        table.fields = expanded
+
+        stack.discard(table.name)
+        resolved.add(table.name)
+
+    def _resolve_field(
+        self, fd: FieldDef, namespace: str, resolved: set[str], stack: set[str]
+    ) -> None:
+        if fd.type_name in SCALAR_TYPES:
+            fd.kind = Kind.Scalar
+            fd.fmt = SCALAR_TYPES[fd.type_name]
+        elif fd.type_name == "string":
+            fd.kind = Kind.String
+        else:
+            ref = self._lookup(fd.type_name, namespace)
+            if ref is None:
+                raise SchemaError(f"Unknown type {fd.type_name} of field {fd.name}")
+            fd.ref = ref
+            if isinstance(ref, EnumDef):
+                if ref.members:
+                    if fd.is_vector:
+                        raise UnsupportedSchemaFeature("vectors of unions")
+                    fd.kind = Kind.Union
+                else:
+                    fd.kind = Kind.Enum
+                    fd.fmt = SCALAR_TYPES[ref.scalar]
+            elif ref.is_struct:
+                fd.kind = Kind.Struct
+                self._resolve(ref, resolved, stack)
+            else:
+                fd.kind = Kind.Table
+
+        if fd.kind in (Kind.Scalar, Kind.Enum) and not fd.is_vector:
+            fd.default_value = self._default_for(fd)
+
+    def _default_for(self, fd: FieldDef) -> Any:
+        raw = fd.default
+        if raw == "null":
+            return None
+        if fd.kind == Kind.Enum:
+            assert isinstance(fd.ref, EnumDef)
+            if raw is None:
+                return 0
+            for value, label in fd.ref.values.items():
+                if raw.split(".")[-1] == label:
+                    return value
+            return int(raw, 0)
+        if raw is None:
+            return False if fd.fmt == "?" else 0
+        if fd.fmt == "?":
+            return raw in ("true", "1")
+        if fd.fmt in FLOAT_PRECISION:
+            return float(raw)
+        return int(float(raw)) if "." in raw or "e" in raw.lower() else int(raw, 0)
+
+    def _union_type_field(self, fd: FieldDef) -> FieldDef:
+        type_field = FieldDef(f"{fd.name}_type", fd.type_name)
+        type_field.kind = Kind.UnionType
+        type_field.fmt = "B"
+        type_field.ref = fd.ref
+        type_field.default_value = 0
+        if "id" in fd.attributes:
+            assert fd.attributes["id"] is not None
+            type_field.attributes["id"] = str(int(fd.attributes["id"]) - 1)
+        if "deprecated" in fd.attributes:
+            type_field.attributes["deprecated"] = None
+        return type_field
+
+    def decode(self, buf: bytes) -> dict[str, Any]:
+        """
+        Decode a raw-binary FlatBuffer whose root is this schema's root_type.
+        """
+        try:
+            (root_offset,) = _UOFFSET.unpack_from(buf, 0)
+            return self._read_table(buf, root_offset, self.root)
+        except (struct.error, IndexError, UnicodeDecodeError, RecursionError) as e:
+            raise SchemaError(f"Malformed payload: {e}")
+
+    def _read_table(self, buf: bytes, pos: int, table: TableDef) -> dict[str, Any]:
+        (soffset,) = _SOFFSET.unpack_from(buf, pos)
+        vtable = pos - soffset
+        (vtable_size,) = _VOFFSET.unpack_from(buf, vtable)
+        if vtable < 0 or vtable_size < 4:
+            raise SchemaError(f"Invalid vtable for table {table.name}")
+
+        result: dict[str, Any] = {}
+        union_types: dict[str, int] = {}
+        for fd in table.fields:
+            field_offset = 0
+            if fd.voffset < vtable_size:
+                (field_offset,) = _VOFFSET.unpack_from(buf, vtable + fd.voffset)
+
+            if fd.kind in (Kind.Scalar, Kind.Enum, Kind.UnionType) and not fd.is_vector:
+                if field_offset:
+                    (value,) = struct.unpack_from("<" + fd.fmt, buf, pos + field_offset)
+                else:
+                    value = fd.default_value
+                if fd.kind == Kind.UnionType:
+                    union_types[fd.name] = value
+                if value is None or "deprecated" in fd.attributes:
+                    continue
+                result[fd.name] = self._scalar_value(fd, value)
+                continue
+
+            if not field_offset or "deprecated" in fd.attributes:
+                continue
+            field_pos = pos + field_offset
+
+            if fd.kind == Kind.Struct and not fd.is_vector:
+                assert isinstance(fd.ref, TableDef)
+                result[fd.name] = self._read_struct(buf, field_pos, fd.ref)
+                continue
+
+            (offset,) = _UOFFSET.unpack_from(buf, field_pos)
+            target = field_pos + offset
+            if fd.is_vector:
+                result[fd.name] = self._read_vector(buf, target, fd)
+            elif fd.kind == Kind.String:
+                result[fd.name] = _read_string(buf, target)
+            elif fd.kind == Kind.Table:
+                assert isinstance(fd.ref, TableDef)
+                result[fd.name] = self._read_table(buf, target, fd.ref)
+            elif fd.kind == Kind.Union:
+                assert isinstance(fd.ref, EnumDef)
+                type_value = union_types.get(f"{fd.name}_type", 0)
+                if type_value in fd.ref.members:
+                    member = self.tables[fd.ref.members[type_value]]
+                    result[fd.name] = self._read_table(buf, target, member)
+
+        return result
+
+    def _read_struct(self, buf: bytes, pos: int, table: TableDef) -> dict[str, Any]:
+        result: dict[str, Any] = {}
+        for fd in table.fields:
+            if fd.kind == Kind.Struct:
+                assert isinstance(fd.ref, TableDef)
+                result[fd.name] = self._read_struct(buf, pos + fd.offset, fd.ref)
+            else:
+                (value,) = struct.unpack_from("<" + fd.fmt, buf, pos + fd.offset)
+                result[fd.name] = self._scalar_value(fd, value)
+        return result
+
+    def _read_vector(self, buf: bytes, pos: int, fd: FieldDef) -> list[Any]:
+        (length,) = _UOFFSET.unpack_from(buf, pos)
+        start = pos + 4
+        if fd.kind in (Kind.Scalar, Kind.Enum):
+            values = struct.unpack_from(f"<{length}{fd.fmt}", buf, start)
+            return [self._scalar_value(fd, v) for v in values]
+        if fd.kind == Kind.Struct:
+            assert isinstance(fd.ref, TableDef)
+            stride = fd.ref.size
+            return [
+                self._read_struct(buf, start + i * stride, fd.ref)
+                for i in range(length)
+            ]
+
+        items: list[Any] = []
+        offsets = struct.unpack_from(f"<{length}I", buf, start)
+        for i, offset in enumerate(offsets):
+            target = start + 4 * i + offset
+            if fd.kind == Kind.String:
+                items.append(_read_string(buf, target))
+            else:
+                assert isinstance(fd.ref, TableDef)
+                items.append(self._read_table(buf, target, fd.ref))
+        return items
+
+    @staticmethod
+    def _scalar_value(fd: FieldDef, value: Any) -> Any:
+        if fd.kind in (Kind.Enum, Kind.UnionType):
+            assert isinstance(fd.ref, EnumDef)
+            return fd.ref.values.get(value, value)
+        if fd.fmt in FLOAT_PRECISION and math.isfinite(value):
+            return round(value, FLOAT_PRECISION[fd.fmt])
+        return value
+
+
+_STRUCT_KINDS = (Kind.Scalar, Kind.Enum, Kind.Struct)
+
+
+def _namespace_of(qualified_name: str) -> str:
+    return qualified_name.rpartition(".")[0]
+
+
+def _read_string(buf: bytes, pos: int) -> str:
+    (length,) = _UOFFSET.unpack_from(buf, pos)
+    if pos + 4 + length > len(buf):
+        raise SchemaError("String runs past the end of the buffer")
+    return bytes(buf[pos + 4 : pos + 4 + length]).decode("utf-8")
+
+
+def _assign_slots(table: TableDef, fields: list[FieldDef]) -> None:
+    """
+    Compute the vtable offset of each field, honoring `id` attributes,
+    and sort the fields into the order in which flatc prints them.
+    """
+    with_ids = [fd for fd in fields if "id" in fd.attributes]
+    if with_ids:
+        if len(with_ids) != len(fields):
+            raise SchemaError(f"Table {table.name}: either all fields have ids or none")
+        for fd in fields:
+            assert fd.attributes["id"] is not None
+            fd.voffset = 4 + 2 * int(fd.attributes["id"])
+        fields.sort(key=lambda fd: fd.voffset)
+    else:
+        for slot, fd in enumerate(fields):
+            fd.voffset = 4 + 2 * slot
+
+
+def _layout_struct(table: TableDef, fields: list[FieldDef]) -> None:
+    offset = 0
+    align = 1
+    for fd in fields:
+        if fd.kind == Kind.Struct:
+            assert isinstance(fd.ref, TableDef)
+            size, field_align = fd.ref.size, fd.ref.align
+        else:
+            size = field_align = struct.calcsize(fd.fmt)
+        offset = _align_up(offset, field_align)
+        fd.offset = offset
+        offset += size
+        align = max(align, field_align)
+    table.size = _align_up(offset, align)
+    table.align = align
+
+
+def _align_up(value: int, align: int) -> int:
+    return (value + align - 1) // align * align
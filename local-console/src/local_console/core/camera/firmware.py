@@ -15,6 +15,7 @@
 # SPDX-License-Identifier: Apache-2.0
 import logging
 import shutil
+from functools import partial
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from typing import Callable
@@ -31,7 +32,9 @@ from local_console.core.commands.ota_deploy import configuration_spec
 from local_console.core.config import config_obj
 from local_console.core.schemas.edge_cloud_if_v1 import DeviceConfiguration
 from local_console.core.schemas.schemas import OnWireProtocol
-from local_console.servers.webserver import AsyncWebserver
+from local_console.servers.shared_webserver import serve_directory
+from local_console.servers.webserver import DownloadProgress
+from local_console.servers.webserver import log_download_progress
 from local_console.utils.local_network import get_webserver_ip
 
 logger = logging.getLogger(__name__)
@@ -96,7 +99,8 @@ def progress_update_checkpoint(
     update_progress = device_config.OTA.UpdateProgress
 
     if update_status == OTAUpdateStatus.DOWNLOADING:
-        indicator.progress_download = update_progress
+        # The webserver may have reported further progress already
+        indicator.progress_download = max(indicator.progress_download, update_progress)
         indicator.progress_update = 0
 
     elif update_status == OTAUpdateStatus.UPDATING:
@@ -119,6 +123,17 @@ def progress_update_checkpoint(
     return done
 
 
+def download_progress_checkpoint(
+    progress: DownloadProgress, indicator: type[TransientStatus]
+) -> None:
+    """
+    Reflects the progress of the firmware download, as seen from
+    the webserver, which is more frequent than the camera reports.
+    """
+    log_download_progress(progress)
+    indicator.progress_download = max(indicator.progress_download, progress.percentage)
+
+
 async def update_firmware_task(
     state: CameraState,
     indicator: type[TransientStatus],
@@ -165,15 +180,21 @@ async def update_firmware_task(
                 ephemeral_agent.mqtt_scope(
                     [MQTTTopics.ATTRIBUTES_REQ.value, MQTTTopics.ATTRIBUTES.value]
                 ),
-                AsyncWebserver(tmp_dir, webserver_port, None, True) as serve,
+                serve_directory(
+                    state.webserver,
+                    tmp_dir,
+                    webserver_port,
+                    partial(download_progress_checkpoint, indicator=indicator),
+                ) as (port, prefix),
             ):
                 # Fill config spec
                 update_spec = configuration_spec(
                     state.firmware_file_type.value,
                     tmp_firmware,
                     tmp_dir,
-                    serve.port,
+                    port,
                     ip_addr,
+                    prefix,
                 )
                 # Use version specified by the user
                 update_spec.OTA.DesiredVersion = state.firmware_file_version.value
@@ -19,11 +19,25 @@ import os
 import subprocess
 import sys
 from base64 import b64decode
+from collections.abc import Mapping
+from dataclasses import dataclass
 from pathlib import Path
 from shutil import which
 from tempfile import TemporaryDirectory
 from typing import Any
 from typing import Optional
+from typing import Union
+
+from local_console.core.camera.fbs_reflection import Schema
+from local_console.core.camera.fbs_reflection import SchemaError
+from local_console.core.camera.fbs_reflection import UnsupportedSchemaFeature
+from local_console.core.camera.labels import ClassNameAnnotator
+from local_console.core.camera.labels import LabelTable
+from local_console.core.camera.labels import load_label_table
+from local_console.core.camera.tensors import decode_tensor
+from local_console.core.camera.tensors import InferenceTensor
+from local_console.core.camera.tensors import match_schema
+from local_console.core.camera.tensors import TensorKind
 
 logger = logging.getLogger(__file__)
 
@@ -34,7 +48,7 @@ class FlatbufferError(Exception):
     """
 
 
-def add_class_names(data: dict, class_id_to_name: dict) -> None:
+def add_class_names(data: dict, class_id_to_name: Mapping[int, str]) -> None:
     # Add class names to the data recursively
     if isinstance(data, dict):
         updates = []
@@ -50,14 +64,12 @@ def add_class_names(data: dict, class_id_to_name: dict) -> None:
             add_class_names(item, class_id_to_name)
 
 
-def map_class_id_to_name(labels_file: Optional[Path]) -> Optional[dict[int, str]]:
+def map_class_id_to_name(labels_file: Optional[Path]) -> Optional[LabelTable]:
     class_id_to_name = None
 
     if labels_file is not None:
         try:
-            class_names = labels_file.read_text().splitlines()
-            # Read labels and create a mapping of class IDs to class names
-            class_id_to_name = {i: name for i, name in enumerate(class_names)}
+            class_id_to_name = load_label_table(labels_file)
         except FileNotFoundError:
             raise FlatbufferError("Error while reading labels text file.")
         except Exception as e:
@@ -66,9 +78,23 @@ def map_class_id_to_name(labels_file: Optional[Path]) -> Optional[dict[int, str]
     return class_id_to_name
 
 
-def get_output_from_inference_results(raw_data: bytes) -> bytes:
+@dataclass
+class InferenceResult:
+    """
+    One of the inferences uploaded in a file, along with the camera
+    timestamp `T` at which it was produced.
+    """
+
+    timestamp: Optional[str]
+    # Base64-decoded value of "O"
+    output: bytes
+    # Result of decoding `output` against the application's schema
+    decoded: Union[dict[str, Any], InferenceTensor, None] = None
+
+
+def get_inference_results(raw_data: bytes) -> list[InferenceResult]:
     """
-    Extracts output from a device-specific format (`raw_data`):
+    Extracts all the inferences from a device-specific format (`raw_data`):
 
     {
         "DeviceID": "Aid-00010001-0000-2000-9002-0000000001d1",
@@ -82,16 +108,22 @@ def get_output_from_inference_results(raw_data: bytes) -> bytes:
         ]
     }
 
+    When the camera batches its uploads, there is more than one
+    inference per file.
+
     :param raw_data: binary buffer containing the input data to decode
-    :return: base64 decoded value of `Inferences[0]["O"]`.
+    :return: the inferences, from the oldest to the newest.
     """
     data: dict[str, list[dict[str, str]]] = json.loads(raw_data)
 
-    inferences = data["Inferences"]
-    if len(inferences) > 1:
-        logger.warn("More than 1 inference at a time. Using index 0.")
-    output_tensor = inferences[0]["O"]
-    return b64decode(output_tensor)
+    results = [
+        InferenceResult(inference.get("T"), b64decode(inference["O"]))
+        for inference in data["Inferences"]
+    ]
+    # The format of the timestamps makes them sort chronologically
+    if all(result.timestamp is not None for result in results):
+        results.sort(key=lambda result: str(result.timestamp))
+    return results
 
 
 def flatbuffer_binary_to_json(
@@ -105,6 +137,20 @@ def flatbuffer_binary_to_json(
     :inference_data: base64-decoded, flatbuffer-serialized payload to deserialize
     :return: True if success.
     """
+    return flatbuffer_binaries_to_json(fbs, [inference_data])[0]
+
+
+def flatbuffer_binaries_to_json(
+    fbs: Path,
+    payloads: list[bytes],
+) -> list[dict[str, Any]]:
+    """
+    Converts several flatbuffers objects at once, with a single run of `flatc`.
+
+    :param fbs: FlatBuffer schema file.
+    :payloads: base64-decoded, flatbuffer-serialized payloads to deserialize
+    :return: the decoded objects, in the order of `payloads`.
+    """
     flatc_path = get_flatc()
     try:
         with TemporaryDirectory() as tempdir:
@@ -114,9 +160,13 @@ def flatbuffer_binary_to_json(
             `flatc` does not support operating over stdin/stdout,
             so a temporary file structure is put in place
             """
-            input_file = area / "in" / "payload.bin"
-            input_file.parent.mkdir()
-            input_file.write_bytes(inference_data)
+            input_area = area / "in"
+            input_area.mkdir()
+            input_files = []
+            for index, inference_data in enumerate(payloads):
+                input_file = input_area / f"payload{index}.bin"
+                input_file.write_bytes(inference_data)
+                input_files.append(input_file)
 
             output_area = area / "out"
             output_area.mkdir()
@@ -132,24 +182,137 @@ def flatbuffer_binary_to_json(
                     "--raw-binary",
                     str(fbs),
                     "--",
-                    str(input_file),
+                    *(str(input_file) for input_file in input_files),
                 ],
                 check=True,
                 text=True,
             )
             generated_files = list(output_area.glob("*"))
-            if len(generated_files) != 1:
+            if len(generated_files) != len(input_files):
                 raise FlatbufferError(
-                    f"Output from flatc did not generate a single file: {str(generated_files)}"
+                    f"Output from flatc did not generate {len(input_files)} files: {str(generated_files)}"
                 )
-            else:
-                decoded: dict[str, Any] = json.load(generated_files[0].open())
-                return decoded
+            decoded: list[dict[str, Any]] = []
+            for input_file in input_files:
+                output_file = output_area / input_file.with_suffix(".json").name
+                with output_file.open() as f:
+                    decoded.append(json.load(f))
+            return decoded
 
     except Exception as e:
         raise FlatbufferError(f"Unexpected error decoding flatbuffers: {e}")
 
 
+class FlatbufferDecoder:
+    """
+    Decodes inference payloads against a FlatBuffers schema file.
+
+    The schema is loaded once into in-process reflection tables, so that
+    each payload is decoded without spawning `flatc`. The output follows
+    the same `--defaults-json` semantics as `flatbuffer_binary_to_json`,
+    which remains in use for schemas whose features cannot be handled
+    in-process. Payloads of the built-in applications' schemas can also
+    be decoded into structured arrays, by means of `decode_tensors`.
+    """
+
+    def __init__(self, fbs: Path) -> None:
+        self.fbs = fbs
+        self._schema: Optional[Schema] = None
+        try:
+            self._schema = Schema(fbs.read_text())
+        except UnsupportedSchemaFeature as e:
+            logger.info(f"Schema {fbs} will be decoded with flatc, as it uses {e}")
+        except SchemaError as e:
+            logger.warning(f"Could not load schema {fbs} in-process: {e}")
+        except OSError as e:
+            raise FlatbufferError(f"Error while reading schema file: {e}")
+        self.tensor_kind: Optional[TensorKind] = (
+            match_schema(self._schema) if self._schema else None
+        )
+        self._annotator: Optional[ClassNameAnnotator] = (
+            ClassNameAnnotator.for_schema(self._schema) if self._schema else None
+        )
+
+    @property
+    def in_process(self) -> bool:
+        return self._schema is not None
+
+    def decode(self, inference_data: bytes) -> dict[str, Any]:
+        """
+        :inference_data: base64-decoded, flatbuffer-serialized payload to deserialize
+        :return: the decoded object, as a python dictionary
+        """
+        if self._schema is None:
+            return flatbuffer_binary_to_json(self.fbs, inference_data)
+
+        try:
+            return self._schema.decode(inference_data)
+        except SchemaError as e:
+            raise FlatbufferError(f"Unexpected error decoding flatbuffers: {e}")
+
+    def decode_batch(self, payloads: list[bytes]) -> list[dict[str, Any]]:
+        """
+        Decodes several payloads, such as the inferences uploaded together
+        in a single file, spawning `flatc` at most once for all of them.
+        """
+        if self._schema is None:
+            return flatbuffer_binaries_to_json(self.fbs, payloads) if payloads else []
+
+        try:
+            return [self._schema.decode(payload) for payload in payloads]
+        except SchemaError as e:
+            raise FlatbufferError(f"Unexpected error decoding flatbuffers: {e}")
+
+    def add_class_names(
+        self, outputs: list[dict[str, Any]], labels: Mapping[int, str]
+    ) -> None:
+        """
+        Names the classes of decoded outputs, only visiting the fields
+        where the schema has them, unless it is recursive or not loaded.
+        """
+        table = LabelTable.of(labels)
+        for output in outputs:
+            if self._annotator:
+                self._annotator.annotate(output, table)
+            else:
+                add_class_names(output, table)
+
+    def decode_tensors(self, payloads: list[bytes]) -> list[InferenceTensor]:
+        """
+        Decodes payloads of a built-in application's schema, as given by
+        `tensor_kind`, into structured arrays.
+        """
+        if self.tensor_kind is None:
+            raise FlatbufferError(f"Schema {self.fbs} is not of a known application")
+
+        try:
+            return [decode_tensor(self.tensor_kind, payload) for payload in payloads]
+        except SchemaError as e:
+            raise FlatbufferError(f"Unexpected error decoding flatbuffers: {e}")
+
+
+_decoders: dict[Path, tuple[int, FlatbufferDecoder]] = {}
+
+
+def get_flatbuffer_decoder(fbs: Path) -> FlatbufferDecoder:
+    """
+    Returns a decoder for the given schema file, which is only
+    reloaded when the file has been modified since last time.
+    """
+    try:
+        mtime = fbs.stat().st_mtime_ns
+    except OSError as e:
+        raise FlatbufferError(f"Error while reading schema file: {e}")
+
+    cached = _decoders.get(fbs)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    decoder = FlatbufferDecoder(fbs)
+    _decoders[fbs] = (mtime, decoder)
+    return decoder
+
+
 def conform_flatbuffer_schema(fbs: Path) -> bool:
     """
     Verifies if JSON is valid.
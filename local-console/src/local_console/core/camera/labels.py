@@ -0,0 +1,192 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+"""
+Naming of the classes found in inference outputs, from a labels file
+listing one class name per line, in order of class id.
+"""
+import hashlib
+from collections.abc import Iterator
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+import numpy as np
+from local_console.core.camera.fbs_reflection import EnumDef
+from local_console.core.camera.fbs_reflection import Kind
+from local_console.core.camera.fbs_reflection import Schema
+from local_console.core.camera.fbs_reflection import TableDef
+
+UNKNOWN_CLASS = "Unknown"
+
+
+class LabelTable(Mapping[int, str]):
+    """
+    Class names indexed by class id, held in an array so that
+    looking up a name does not involve hashing.
+    """
+
+    def __init__(self, labels: Mapping[int, str]) -> None:
+        self._labels = dict(labels)
+        ids = [key for key in self._labels if isinstance(key, int) and key >= 0]
+        self._size = max(ids) + 1 if ids else 0
+        # The extra slot is where unknown ids are pointed at
+        names: list[Optional[str]] = [None] * self._size + [UNKNOWN_CLASS]
+        for key in ids:
+            names[key] = self._labels[key]
+        self._names = names
+        self._array = np.array(
+            [UNKNOWN_CLASS if name is None else name for name in names], dtype=object
+        )
+
+    @classmethod
+    def of(cls, labels: Mapping[int, str]) -> "LabelTable":
+        return labels if isinstance(labels, LabelTable) else cls(labels)
+
+    @classmethod
+    def from_lines(cls, lines: list[str]) -> "LabelTable":
+        return cls(dict(enumerate(lines)))
+
+    def name_of(self, class_id: Any) -> str:
+        """
+        Name of the class, or "Unknown" if it is not in the table.
+        """
+        if type(class_id) is int and 0 <= class_id < self._size:
+            name = self._names[class_id]
+            return UNKNOWN_CLASS if name is None else name
+        if isinstance(class_id, int) or isinstance(class_id, np.integer):
+            return self._labels.get(int(class_id), UNKNOWN_CLASS)
+        return UNKNOWN_CLASS
+
+    def lookup(self, class_ids: np.ndarray) -> np.ndarray:
+        """
+        Names of an array of class ids, as an array of objects.
+        """
+        index = class_ids.astype(np.int64)
+        index[(index < 0) | (index >= self._size)] = self._size
+        names: np.ndarray = self._array[index]
+        return names
+
+    def __getitem__(self, class_id: int) -> str:
+        return self._labels[class_id]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._labels)
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __repr__(self) -> str:
+        return repr(self._labels)
+
+
+_tables: dict[Path, tuple[tuple[int, int], bytes, LabelTable]] = {}
+
+
+def load_label_table(labels_file: Path) -> LabelTable:
+    """
+    Compiles the labels file into a table, which is only rebuilt when
+    the contents of the file change. While its modification time and
+    size are the same, the file is not even read.
+    """
+    stat = labels_file.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _tables.get(labels_file)
+    if cached and cached[0] == key:
+        return cached[2]
+
+    data = labels_file.read_bytes()
+    digest = hashlib.sha256(data).digest()
+    if cached and cached[1] == digest:
+        table = cached[2]
+    else:
+        table = LabelTable.from_lines(data.decode().splitlines())
+    _tables[labels_file] = (key, digest, table)
+    return table
+
+
+# Nested field names leading to `class_id` fields, where None marks the latter
+ClassIdPaths = dict[str, Optional["ClassIdPaths"]]
+
+
+class ClassNameAnnotator:
+    """
+    Adds a `class_name` next to every `class_id` of objects decoded against
+    a schema, only visiting the fields that the schema says may lead to one.
+    """
+
+    def __init__(self, paths: ClassIdPaths) -> None:
+        self.paths = paths
+
+    @classmethod
+    def for_schema(cls, schema: Schema) -> Optional["ClassNameAnnotator"]:
+        """
+        Returns None for recursive schemas, whose `class_id` fields
+        may be found at any depth.
+        """
+        try:
+            return cls(_class_id_paths(schema, schema.root, set()))
+        except RecursionError:
+            return None
+
+    def annotate(self, data: dict, labels: LabelTable) -> None:
+        stack: list[tuple[Any, ClassIdPaths]] = [(data, self.paths)]
+        while stack:
+            node, paths = stack.pop()
+            if isinstance(node, list):
+                stack.extend((item, paths) for item in node)
+            elif isinstance(node, dict):
+                for key, nested in paths.items():
+                    if key not in node:
+                        continue
+                    if nested is None:
+                        node["class_name"] = labels.name_of(node[key])
+                    else:
+                        stack.append((node[key], nested))
+
+
+def _class_id_paths(
+    schema: Schema, table: TableDef, visiting: set[str]
+) -> ClassIdPaths:
+    if table.name in visiting:
+        raise RecursionError(f"Table {table.name} contains itself")
+    visiting.add(table.name)
+    paths: ClassIdPaths = {}
+    for fd in table.fields:
+        if fd.name == "class_id":
+            paths[fd.name] = None
+            continue
+
+        targets: list[TableDef] = []
+        if fd.kind in (Kind.Table, Kind.Struct) and isinstance(fd.ref, TableDef):
+            targets = [fd.ref]
+        elif fd.kind == Kind.Union and isinstance(fd.ref, EnumDef):
+            targets = [schema.tables[member] for member in fd.ref.members.values()]
+        for target in targets:
+            nested = _class_id_paths(schema, target, visiting)
+            if nested:
+                _merge(paths.setdefault(fd.name, {}), nested)
+    visiting.remove(table.name)
+    return paths
+
+
+def _merge(paths: Optional[ClassIdPaths], other: ClassIdPaths) -> None:
+    assert paths is not None
+    for key, nested in other.items():
+        if nested is None or paths.get(key, {}) is None:
+            paths[key] = None
+        else:
+            _merge(paths.setdefault(key, {}), nested)
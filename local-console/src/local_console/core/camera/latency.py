@@ -0,0 +1,220 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the histogram buckets. The last
+# bucket, which is implicit, holds the samples above the last bound.
+BUCKET_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+# Points in the life of a frame, in the order they are reached
+RECEIVE = "receive"
+PAIR = "pair"
+DECODE = "decode"
+DRAW = "draw"
+STORE = "store"
+PUBLISH = "publish"
+
+# Spans between consecutive points, and between the ends of the trace
+SPANS = {
+    "upload": (None, RECEIVE),
+    "pair": (RECEIVE, PAIR),
+    "decode": (PAIR, DECODE),
+    "draw": (DECODE, DRAW),
+    "store": (DRAW, STORE),
+    "publish": (STORE, PUBLISH),
+    "pipeline": (RECEIVE, PUBLISH),
+    "total": (None, PUBLISH),
+}
+
+CAMERA_TIMESTAMP_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+def parse_camera_time(timestamp: str) -> Optional[float]:
+    """
+    Converts the timestamp `T` of an inference, such as "20240326110151928",
+    into seconds since the epoch, or None if it is malformed.
+    """
+    try:
+        # The last three digits are milliseconds, whereas %f parses microseconds
+        stamp = datetime.strptime(timestamp + "000", CAMERA_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+    return stamp.replace(tzinfo=timezone.utc).timestamp()
+
+
+@dataclass
+class FrameTrace:
+    """
+    Wall clock times at which a frame reached each point of the
+    streaming pipeline, in seconds since the epoch.
+    """
+
+    camera_time: Optional[float] = None
+    marks: dict[str, float] = field(default_factory=dict)
+
+    def mark(self, point: str, at: Optional[float] = None) -> None:
+        self.marks[point] = time.time() if at is None else at
+
+    def spans(self) -> dict[str, float]:
+        """
+        Durations in milliseconds of the spans whose ends were both
+        reached. Spans that start at the camera are left out if the
+        camera clock is ahead of this host's.
+        """
+        durations = {}
+        for name, (start, end) in SPANS.items():
+            start_time = self.camera_time if start is None else self.marks.get(start)
+            end_time = self.marks.get(end)
+            if start_time is None or end_time is None:
+                continue
+            duration = (end_time - start_time) * 1000
+            if duration >= 0:
+                durations[name] = duration
+        return durations
+
+
+class LatencyHistogram:
+    """
+    Counts latency samples into buckets of increasing width, so that
+    percentiles can be estimated within constant memory.
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, value_ms: float) -> None:
+        self.counts[bisect_left(BUCKET_BOUNDS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        self.min = min(self.min, value_ms)
+        self.max = max(self.max, value_ms)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Upper bound of the bucket holding the given fraction of samples,
+        capped to the largest sample.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and index < len(BUCKET_BOUNDS_MS):
+                return min(float(BUCKET_BOUNDS_MS[index]), self.max)
+        return self.max
+
+    def to_dict(self) -> dict[str, Any]:
+        labels = [f"<={bound}" for bound in BUCKET_BOUNDS_MS]
+        labels.append(f">{BUCKET_BOUNDS_MS[-1]}")
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets_ms": dict(zip(labels, self.counts)),
+        }
+
+
+class LatencyTracker:
+    """
+    Gathers the traces of the frames that went through the streaming
+    pipeline into a histogram per span. It is safe to use from several
+    threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.histograms: dict[str, LatencyHistogram] = {
+            name: LatencyHistogram() for name in SPANS
+        }
+
+    def record(self, trace: FrameTrace) -> None:
+        with self._lock:
+            for name, duration in trace.spans().items():
+                self.histograms[name].add(duration)
+
+    def reset(self) -> None:
+        with self._lock:
+            for name in SPANS:
+                self.histograms[name] = LatencyHistogram()
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                name: histogram.to_dict()
+                for name, histogram in self.histograms.items()
+                if histogram.count
+            }
+
+    def summary(self) -> str:
+        """
+        One line per span, with its sample count and percentiles.
+        """
+        lines = [f"{'span':<10}{'count':>8}{'p50':>10}{'p95':>10}{'max':>10}  (ms)"]
+        for name, stats in self.to_dict().items():
+            lines.append(
+                f"{name:<10}{stats['count']:>8}{stats['p50']:>10.1f}"
+                f"{stats['p95']:>10.1f}{stats['max']:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def headline(self) -> str:
+        """
+        Short description of the end-to-end latency, for display.
+        """
+        with self._lock:
+            name = "total" if self.histograms["total"].count else "pipeline"
+            histogram = self.histograms[name]
+            if not histogram.count:
+                return ""
+            return (
+                f"Latency ({name}) p50/p95: {histogram.percentile(0.5):.0f}"
+                f"/{histogram.percentile(0.95):.0f} ms"
+            )
+
+
+def export_latency_report(path: Path, trackers: dict[str, LatencyTracker]) -> None:
+    """
+    Writes the histograms of the trackers, indexed by device, as JSON.
+    """
+    report = {device: tracker.to_dict() for device, tracker in trackers.items()}
+    path.write_text(json.dumps(report, indent=2))
+    logger.info(f"Latency report written into {path}")
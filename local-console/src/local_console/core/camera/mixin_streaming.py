@@ -13,36 +13,74 @@
 # limitations under the License.
 #
 # SPDX-License-Identifier: Apache-2.0
+import contextlib
 import json
 import logging
 import shutil
+import time
+from collections import deque
+from collections.abc import Iterator
+from collections.abc import Mapping
 from datetime import timedelta
+from functools import partial
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from typing import Any
 from typing import Optional
 from typing import Protocol
+from typing import Union
 
 import trio
 from local_console.clients.agent import Agent
 from local_console.core.camera._shared import IsAsyncReady
 from local_console.core.camera.axis_mapping import pixel_roi_from_normals
 from local_console.core.camera.axis_mapping import UnitROI
-from local_console.core.camera.flatbuffers import add_class_names
-from local_console.core.camera.flatbuffers import flatbuffer_binary_to_json
+from local_console.core.camera.cold_storage import ColdStorage
+from local_console.core.camera.cold_storage import ColdStorageError
+from local_console.core.camera.cold_storage import is_archive
+from local_console.core.camera.enums import FramePolicy
+from local_console.core.camera.enums import UploadMode
 from local_console.core.camera.flatbuffers import FlatbufferError
-from local_console.core.camera.flatbuffers import get_output_from_inference_results
+from local_console.core.camera.flatbuffers import get_flatbuffer_decoder
+from local_console.core.camera.flatbuffers import get_inference_results
+from local_console.core.camera.labels import LabelTable
+from local_console.core.camera.latency import DECODE
+from local_console.core.camera.latency import DRAW
+from local_console.core.camera.latency import LatencyTracker
+from local_console.core.camera.latency import PAIR
+from local_console.core.camera.latency import parse_camera_time
+from local_console.core.camera.latency import PUBLISH
+from local_console.core.camera.latency import RECEIVE
+from local_console.core.camera.latency import STORE
+from local_console.core.camera.preview import decode_pixels
+from local_console.core.camera.preview import FramePixels
+from local_console.core.camera.streaming import FileGroup
 from local_console.core.camera.streaming import FileGrouping
+from local_console.core.camera.streaming import Frame
+from local_console.core.camera.streaming import FrameSelector
+from local_console.core.camera.streaming import OrphanReason
+from local_console.core.camera.streaming import run_stage
+from local_console.core.camera.tensors import InferenceTensor
 from local_console.core.schemas.edge_cloud_if_v1 import StartUploadInferenceData
 from local_console.gui.drawer.classification import ClassificationDrawer
+from local_console.gui.drawer.drawer import Overlay
 from local_console.gui.drawer.objectdetection import DetectionDrawer
 from local_console.gui.enums import ApplicationType
 from local_console.gui.utils.sync_async import run_on_ui_thread
+from local_console.servers.shared_webserver import SharedWebserver
 from local_console.servers.webserver import AsyncWebserver
+from local_console.servers.webserver import Incoming
+from local_console.servers.webserver import InMemoryUpload
+from local_console.utils.fstools import BackgroundDeleter
 from local_console.utils.fstools import check_and_create_directory
+from local_console.utils.fstools import DeletionReport
 from local_console.utils.fstools import DirectoryMonitor
 from local_console.utils.fstools import StorageSizeWatcher
 from local_console.utils.local_network import get_webserver_ip
+from local_console.utils.retention import StoragePool
 from local_console.utils.tracking import TrackingVariable
+from trio import TASK_STATUS_IGNORED
+from watchdog.events import FileSystemEvent
 
 
 logger = logging.getLogger(__name__)
@@ -54,16 +92,34 @@ SYSINFO_TOPIC = "systemInfo"
 DEPLOY_STATUS_TOPIC = "deploymentStatus"
 CONNECTION_STATUS_TIMEOUT = timedelta(seconds=180)
 
+# Streaming pipeline constants
+PIPELINE_BUFFER_SIZE = 8
+PIPELINE_WORKERS = 3
+# Number of preview images kept when uploads are not saved
+PREVIEW_HISTORY = 2
+# Minimum period between log reports of dropped frames
+DROPPED_FRAMES_LOG_PERIOD = timedelta(seconds=10)
+# Minimum period between updates of the displayed frame latency
+LATENCY_DISPLAY_PERIOD = timedelta(seconds=1)
+# Period between full rescans of the storage, otherwise tracked by file events
+STORAGE_RECONCILE_PERIOD = timedelta(minutes=10)
+# Period between applications of the retention policy while no files arrive
+RETENTION_PERIOD = timedelta(minutes=1)
+# Period between packings of old files into archives, and files per archive
+COMPACTION_PERIOD = timedelta(minutes=5)
+ARCHIVE_MAX_FILES = 1000
+
 
 class HasMQTTset(Protocol):
     """
     This Protocol states that classes onto which this applies,
-    will have a `mqtt_client` member. For StreamingMixin below,
-    this means that `mqtt_client` originates elsewhere within
-    CameraState, but StreamingMixin expects to find it.
+    will have `mqtt_client` and `mqtt_port` members. For StreamingMixin
+    below, this means that these originate elsewhere within
+    CameraState, but StreamingMixin expects to find them.
     """
 
     mqtt_client: Optional[Agent]
+    mqtt_port: TrackingVariable[int]
 
 
 class StreamingMixin(HasMQTTset, IsAsyncReady):
@@ -74,26 +130,87 @@ class StreamingMixin(HasMQTTset, IsAsyncReady):
     the associated data traffic.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        webserver: Optional[SharedWebserver] = None,
+        storage_pool: Optional[StoragePool] = None,
+    ) -> None:
 
         # Ancillary variables
+        self.webserver = webserver
+        self.storage_pool = storage_pool
         self.upload_port: int | None = None
+        self.upload_prefix = ""
+        self._upload_server: Optional[AsyncWebserver] = None
+        self._upload_key: Optional[str] = None
+        self._preview_dir: Optional[Path] = None
+        self._previews: deque[Path] = deque()
         self._extension_images = "jpg"
         self._extension_infers = "txt"
-        self._grouper = FileGrouping({self._extension_images, self._extension_infers})
-        self.total_dir_watcher = StorageSizeWatcher()
+        self._grouper = FileGrouping(
+            {self._extension_images, self._extension_infers},
+            on_orphan=self._on_orphaned_group,
+        )
+        # Frames made of unmatched images, pending being yielded
+        self._orphan_frames: list[Frame] = []
+        self._orphans_logged_at = 0.0
+        self.storage_deleter = BackgroundDeleter(self._on_deletion_report)
+        # Kept up to date by the directory monitor's file events
+        self.total_dir_watcher = StorageSizeWatcher(
+            check_frequency=None, deleter=self.storage_deleter
+        )
+        self.cold_storage = ColdStorage()
+        if storage_pool:
+            storage_pool.join(self.total_dir_watcher)
+        self._pipeline_limiter = trio.CapacityLimiter(PIPELINE_WORKERS)
+        self._frame_selector = FrameSelector()
+        self._dropped_frames_logged_at = 0.0
+        # Last invalid frame policy warned about, so as to warn once
+        self._invalid_frame_policy: Optional[str] = None
+        self.latency = LatencyTracker()
+        self._latency_displayed_at = 0.0
         self.dir_monitor = DirectoryMonitor()
+        # Set by a frame sink that displays stream_pixels, such as the GUI's
+        self.decode_stream_pixels = False
 
         # State variables
         self.stream_image: TrackingVariable[str] = TrackingVariable("")
+        self.stream_overlay: TrackingVariable[Overlay] = TrackingVariable()
+        # Set instead of stream_image when frames are decoded for display
+        self.stream_pixels: TrackingVariable[FramePixels] = TrackingVariable()
+        # Size of the view where stream_pixels are displayed, to decode
+        # them at no larger a scale than needed
+        self.stream_view_size: TrackingVariable[tuple[int, int]] = TrackingVariable()
         self.image_dir_path: TrackingVariable[Path] = TrackingVariable()
         self.roi: TrackingVariable[UnitROI] = TrackingVariable()
 
         self.inference_field: TrackingVariable[str] = TrackingVariable("")
         self.inference_dir_path: TrackingVariable[Path] = TrackingVariable()
 
+        self.frame_policy: TrackingVariable[str] = TrackingVariable(
+            FramePolicy.PROCESS_ALL.value
+        )
+        self.frame_policy_nth: TrackingVariable[str] = TrackingVariable("2")
+        self.frames_dropped: TrackingVariable[int] = TrackingVariable(0)
+        self.frames_orphaned: TrackingVariable[int] = TrackingVariable(0)
+        self.frame_latency: TrackingVariable[str] = TrackingVariable("")
+        self.upload_mode: TrackingVariable[str] = TrackingVariable(
+            UploadMode.ON_DISK.value
+        )
+
         self.size: TrackingVariable[str] = TrackingVariable("10")
         self.unit: TrackingVariable[str] = TrackingVariable("MB")
+        # Further retention limits, unlimited if empty
+        self.max_files: TrackingVariable[str] = TrackingVariable("")
+        self.max_age_hours: TrackingVariable[str] = TrackingVariable("")
+        # Files older than this are packed into archives, never if empty
+        self.archive_after_hours: TrackingVariable[str] = TrackingVariable("")
+        # JPEG quality of packed images, kept as they are if empty
+        self.archive_quality: TrackingVariable[str] = TrackingVariable("")
+        # Whether images whose inference never arrives are displayed
+        self.show_orphan_images: TrackingVariable[str] = TrackingVariable("")
+        # Whether inferences are laid over images by the GUI, leaving them as is
+        self.overlay_inferences: TrackingVariable[str] = TrackingVariable("")
 
         self.vapp_schema_file: TrackingVariable[str] = TrackingVariable("")
         self.vapp_config_file: TrackingVariable[str] = TrackingVariable("")
@@ -101,7 +218,7 @@ class StreamingMixin(HasMQTTset, IsAsyncReady):
         self.vapp_type: TrackingVariable[str] = TrackingVariable(
             ApplicationType.CUSTOM.value
         )
-        self.vapp_labels_map: TrackingVariable[dict[int, str]] = TrackingVariable()
+        self.vapp_labels_map: TrackingVariable[Mapping[int, str]] = TrackingVariable()
 
     def _init_bindings_streaming(self) -> None:
         """
@@ -110,6 +227,10 @@ class StreamingMixin(HasMQTTset, IsAsyncReady):
         """
         self.image_dir_path.subscribe(self.input_directory_setup)
         self.inference_dir_path.subscribe(self.input_directory_setup)
+        self.upload_mode.subscribe(self._on_upload_mode)
+        self.max_files.subscribe(self._on_max_files)
+        self.max_age_hours.subscribe(self._on_max_age_hours)
+        self.archive_quality.subscribe(self._on_archive_quality)
 
     async def streaming_rpc_stop(self) -> None:
         assert self.mqtt_client
@@ -124,7 +245,7 @@ class StreamingMixin(HasMQTTset, IsAsyncReady):
         instance_id = "node"
         method = "StartUploadInferenceData"
         host = get_webserver_ip()
-        upload_url = f"http://{host}:{self.upload_port}"
+        upload_url = f"http://{host}:{self.upload_port}{self.upload_prefix}"
 
         (h_offset, v_offset), (h_size, v_size) = pixel_roi_from_normals(roi)
 
@@ -145,23 +266,28 @@ class StreamingMixin(HasMQTTset, IsAsyncReady):
 
     async def blobs_webserver_task(self) -> None:
         """
-        Spawn a webserver on an arbitrary available port for receiving
-        images from a camera.
-        :param on_received: Callback that is triggered for each new received image
-        :param base_dir: Path to directory where images will be saved into
-        :return:
+        Route the images uploaded by the camera into the pipeline that
+        processes them. Uploads are received by the webserver shared
+        among all devices, under a path prefix of this device, or by a
+        webserver spawned on an arbitrary available port if none is shared.
         """
+        send_channel, receive_channel = trio.open_memory_channel[Incoming](
+            PIPELINE_BUFFER_SIZE
+        )
         with (TemporaryDirectory(prefix="LocalConsole_") as tempdir,):
             logger.info(f"Webserver_task {str(tempdir)}")
-            async with AsyncWebserver(
-                Path(tempdir), port=0, on_incoming=self._process_camera_upload
-            ) as image_serve:
-
+            self._preview_dir = Path(tempdir) / "preview"
+            async with trio.open_nursery() as nursery:
+                nursery.start_soon(self.streaming_pipeline_task, receive_channel)
+                nursery.start_soon(self.storage_reconcile_task)
+                nursery.start_soon(self.storage_retention_task)
+                nursery.start_soon(self.storage_compaction_task)
+                await nursery.start(self.upload_route_task, Path(tempdir), send_channel)
                 logger.info(f"Uploading data into {tempdir}")
-
-                assert image_serve.port
-                self.upload_port = image_serve.port
-                logger.info(f"Webserver listening on port {self.upload_port}")
+                logger.info(
+                    f"Webserver listening on port {self.upload_port}"
+                    f" under '{self.upload_prefix}/'"
+                )
                 tmp_image_directory = Path(tempdir) / "images"
                 tmp_inference_directory = Path(tempdir) / "inferences"
                 tmp_image_directory.mkdir(exist_ok=True)
@@ -172,55 +298,470 @@ class StreamingMixin(HasMQTTset, IsAsyncReady):
                 if not self.inference_dir_path.value:
                     self.inference_dir_path.value = tmp_inference_directory
 
-                await trio.sleep_forever()
+    async def storage_reconcile_task(self) -> None:
+        """
+        Rescans the input directories now and then, to correct the storage
+        bookkeeping for any file event that the directory monitor missed.
+        The scan runs in a worker thread, without holding the storage lock.
+        The bookkeeping is then persisted, also when shutting down, so that
+        the next session does not need to rescan the directories. Pending
+        deletions of pruned files are completed beforehand.
+        """
+        try:
+            while True:
+                await trio.sleep(STORAGE_RECONCILE_PERIOD.total_seconds())
+                await trio.to_thread.run_sync(self._reconcile_storage)
+                await trio.to_thread.run_sync(self._persist_storage_index)
+        finally:
+            self.storage_deleter.stop()
+            self._persist_storage_index()
+
+    def _reconcile_storage(self) -> None:
+        if self.total_dir_watcher.roots:
+            self.total_dir_watcher.reconcile()
+
+    async def storage_retention_task(self) -> None:
+        """
+        Applies the retention limits periodically, since files may get
+        older than the age limit while no new files arrive.
+        """
+        while True:
+            await trio.sleep(RETENTION_PERIOD.total_seconds())
+            await trio.to_thread.run_sync(self._apply_retention)
+
+    def _apply_retention(self) -> None:
+        self.total_dir_watcher.apply_retention()
+        if self.storage_pool:
+            self.storage_pool.rebalance()
 
-    @run_on_ui_thread
-    def _process_camera_upload(self, incoming_file: Path) -> None:
-        if incoming_file.suffix.lstrip(".") == self._extension_infers:
+    def _on_max_files(self, current: Optional[str], previous: Optional[str]) -> None:
+        limit = _parse_limit(current)
+        self.total_dir_watcher.set_file_limit(None if limit is None else int(limit))
+
+    def _on_max_age_hours(
+        self, current: Optional[str], previous: Optional[str]
+    ) -> None:
+        limit = _parse_limit(current)
+        self.total_dir_watcher.set_age_limit(
+            None if limit is None else timedelta(hours=limit)
+        )
+
+    def _on_archive_quality(
+        self, current: Optional[str], previous: Optional[str]
+    ) -> None:
+        quality = _parse_limit(current)
+        self.cold_storage.quality = None if quality is None else min(int(quality), 100)
+
+    async def storage_compaction_task(self) -> None:
+        """
+        Packs the files older than `archive_after_hours` into archives,
+        in a worker thread.
+        """
+        while True:
+            await trio.sleep(COMPACTION_PERIOD.total_seconds())
+            await trio.to_thread.run_sync(self._compact_storage)
+
+    def _compact_storage(self) -> None:
+        hours = _parse_limit(self.archive_after_hours.value)
+        if hours is None:
+            return
+        threshold = time.time_ns() - int(hours * 3600 * 1e9)
+
+        for root in self.total_dir_watcher.roots:
+            while self._compact_batch(root, threshold) == ARCHIVE_MAX_FILES:
+                pass
+
+    def _compact_batch(self, root: Path, threshold: int) -> int:
+        entries = self.total_dir_watcher.entries_before(
+            threshold, root, ARCHIVE_MAX_FILES, is_archive
+        )
+        if not entries:
+            return 0
+        try:
+            archive = self.cold_storage.pack(root, entries)
+        except ColdStorageError as e:
+            logger.warning(str(e))
+            return 0
+        self.total_dir_watcher.replace_entries(entries, archive)
+        return len(entries)
+
+    def _on_deletion_report(self, report: DeletionReport) -> None:
+        if report.failed:
+            path, error = report.failed[0]
+            self.send_message_sync(
+                "error",
+                f"Could not delete {len(report.failed)} old files, such as {path}: {error}",
+            )
+
+    def _persist_storage_index(self) -> None:
+        for root in self.total_dir_watcher.roots:
+            self.total_dir_watcher.save_index(root)
+
+    async def upload_route_task(
+        self,
+        directory: Path,
+        incoming: trio.MemorySendChannel[Incoming],
+        *,
+        task_status: Any = TASK_STATUS_IGNORED,
+    ) -> None:
+        """
+        Keeps uploads routed into `directory` until cancelled. The upload
+        port and prefix are known once this task has signaled it has started.
+        """
+        in_memory = self._uploads_in_memory()
+        if not self.webserver:
+            image_serve = AsyncWebserver(
+                directory, port=0, incoming=incoming, in_memory=in_memory
+            )
+            try:
+                async with trio.open_nursery() as nursery:
+                    await nursery.start(image_serve.serve)
+                    self._upload_server = image_serve
+                    self.upload_port = image_serve.port
+                    self.upload_prefix = ""
+                    task_status.started()
+            finally:
+                self._upload_server = None
+            return
+
+        key = str(self.mqtt_port.value)
+        self.upload_prefix = self.webserver.register_device(
+            key, directory, incoming, in_memory
+        )
+        self.upload_port = self.webserver.port
+        self._upload_key = key
+        try:
+            task_status.started()
+            await trio.sleep_forever()
+        finally:
+            self._upload_key = None
+            self.webserver.unregister_device(key)
+
+    def _uploads_in_memory(self) -> bool:
+        return self.upload_mode.value != UploadMode.ON_DISK
+
+    def _on_upload_mode(self, current: Optional[str], previous: Optional[str]) -> None:
+        in_memory = self._uploads_in_memory()
+        if self.webserver and self._upload_key:
+            self.webserver.set_in_memory(self._upload_key, in_memory)
+        elif self._upload_server:
+            self._upload_server.in_memory = in_memory
+
+    async def streaming_pipeline_task(
+        self, receive_channel: trio.MemoryReceiveChannel[Incoming]
+    ) -> None:
+        """
+        Processes uploaded files through the stages:
+        ingest -> pair -> select -> decode -> draw -> store -> publish
+
+        Filesystem operations, decoding and drawing run in worker threads,
+        so that only the final publication of a frame reaches the UI thread.
+        Paired frames wait before the select stage, where the frame policy
+        determines which of them get decoded and drawn. The channels past
+        that point are unbuffered, so that no backlog builds up beyond it.
+
+        Uploads kept in memory are decoded and drawn from memory, and
+        only written to disk at the store stage, or at the select stage
+        for skipped frames.
+        """
+        send_paired, receive_paired = trio.open_memory_channel[Incoming](
+            PIPELINE_BUFFER_SIZE
+        )
+        send_select, receive_select = trio.open_memory_channel[Frame](
+            PIPELINE_BUFFER_SIZE
+        )
+        send_decode, receive_decode = trio.open_memory_channel[Frame](0)
+        send_draw, receive_draw = trio.open_memory_channel[Frame](0)
+        send_store, receive_store = trio.open_memory_channel[Frame](0)
+        send_publish, receive_publish = trio.open_memory_channel[Frame](0)
+        limiter = self._pipeline_limiter
+        self._frame_selector = FrameSelector()
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(
+                run_stage,
+                "ingest",
+                self._ingest_upload,
+                receive_channel,
+                send_paired,
+                limiter,
+            )
+            nursery.start_soon(
+                run_stage,
+                "pair",
+                self._pair_upload,
+                receive_paired,
+                send_select,
+                limiter,
+            )
+            nursery.start_soon(
+                partial(
+                    run_stage,
+                    "select",
+                    self._select_frames,
+                    receive_select,
+                    send_decode,
+                    limiter,
+                    batch=True,
+                )
+            )
+            nursery.start_soon(
+                run_stage,
+                "decode",
+                self._decode_frame,
+                receive_decode,
+                send_draw,
+                limiter,
+            )
+            nursery.start_soon(
+                run_stage, "draw", self._draw_frame, receive_draw, send_store, limiter
+            )
+            nursery.start_soon(
+                run_stage,
+                "store",
+                self._store_frame,
+                receive_store,
+                send_publish,
+                limiter,
+            )
+            nursery.start_soon(
+                run_stage, "publish", self._publish_frame, receive_publish
+            )
+
+    def _ingest_upload(self, incoming: Incoming) -> Iterator[Incoming]:
+        incoming_file, data = _unpack(incoming)
+        extension = incoming_file.suffix.lstrip(".")
+        if extension == self._extension_infers:
             assert self.inference_dir_path.value
             target_dir = Path(self.inference_dir_path.value)
-            assert target_dir
-            final_file = self._save_into_input_directory(incoming_file, target_dir)
-            logger.debug(f"Inferences file path : {final_file}")
-            self._grouper.register(final_file, final_file)
-
-        elif incoming_file.suffix.lstrip(".") == self._extension_images:
+        elif extension == self._extension_images:
             assert self.image_dir_path.value
             target_dir = Path(self.image_dir_path.value)
-            assert target_dir
-            final_file = self._save_into_input_directory(incoming_file, target_dir)
-            logger.debug(f"Images file path : {final_file}")
-            self._grouper.register(final_file, final_file)
         else:
             logger.warning(f"Unknown incoming file: {incoming_file}")
-
-        # Process matched image-inference file pairs
+            return
+
+        if data is not None:
+            # Written at the store stage, if ever
+            yield InMemoryUpload(target_dir / incoming_file.name, data)
+            return
+
+        final_file = self._save_into_input_directory(incoming_file, target_dir)
+        logger.debug(f"Saved incoming file into: {final_file}")
+        yield final_file
+
+    def _pair_upload(self, upload: Incoming) -> Iterator[Frame]:
+        self._grouper.register(_unpack(upload)[0], (upload, time.time()))
+        if self._orphan_frames:
+            yield from self._orphan_frames
+            self._orphan_frames.clear()
         for pair in self._grouper:
-            inference_file = pair[self._extension_infers]
-            image_file = pair[self._extension_images]
-
-            payload_render = inference_file.read_text()
-            output_data = get_output_from_inference_results(inference_file.read_bytes())
-            if self.vapp_schema_file.value:
-                try:
-                    output_tensor = self._get_flatbuffers_inference_data(output_data)
-                    if output_tensor:
-                        payload_render = json.dumps(output_tensor, indent=2)
-                        output_data = output_tensor  # type: ignore
-                except FlatbufferError as e:
-                    logger.error("Error decoding inference data:", exc_info=e)
-
-            self.inference_field.value = payload_render
+            image_upload, image_received = pair[self._extension_images]
+            inference_upload, inference_received = pair[self._extension_infers]
+            image, image_data = _unpack(image_upload)
+            inference, inference_data = _unpack(inference_upload)
+            frame = Frame(
+                image=image,
+                inference=inference,
+                image_data=image_data,
+                inference_data=inference_data,
+            )
+            frame.trace.mark(RECEIVE, min(image_received, inference_received))
+            frame.trace.mark(PAIR)
+            yield frame
+
+    def _on_orphaned_group(
+        self, stem: str, group: FileGroup, reason: OrphanReason
+    ) -> None:
+        """
+        Files of groups left incomplete remain stored in the input
+        directories, where those that were kept in memory get written,
+        unless uploads are not to be saved. If the group holds an image
+        and such images are to be shown, it goes on as a frame of its own.
+        """
+        if self.upload_mode.value != UploadMode.IN_MEMORY_ONLY:
+            for extension, (upload, received) in group.items():
+                if isinstance(upload, InMemoryUpload):
+                    self._write_into_input_directory(upload.path, upload.data)
+                    group[extension] = (upload.path, received)
+
+        stats = self._grouper.stats
+        self.frames_orphaned.value = stats.orphaned
+        now = time.monotonic()
+        if now - self._orphans_logged_at >= DROPPED_FRAMES_LOG_PERIOD.total_seconds():
+            self._orphans_logged_at = now
+            logger.info(
+                f"{stats.orphaned} file groups were left incomplete "
+                f"({stats.orphan_rate:.1%}), the latest being {stem} ({reason.value})"
+            )
+
+        if self._extension_images not in group or not _parse_flag(
+            self.show_orphan_images.value
+        ):
+            return
+        image_upload, image_received = group[self._extension_images]
+        image, image_data = _unpack(image_upload)
+        frame = Frame(image=image, inference=None, image_data=image_data)
+        frame.trace.mark(RECEIVE, image_received)
+        frame.trace.mark(PAIR)
+        self._orphan_frames.append(frame)
+
+    def _select_frames(self, pending: list[Frame]) -> Iterator[Frame]:
+        """
+        Skipped frames remain stored in the input directories,
+        but they are neither decoded nor drawn. Those that were kept
+        in memory are stored right away, unless uploads are not saved.
+        """
+        selector = self._frame_selector
+        try:
+            selector.policy = FramePolicy(self.frame_policy.value)
+        except ValueError:
+            if self.frame_policy.value != self._invalid_frame_policy:
+                self._invalid_frame_policy = self.frame_policy.value
+                logger.warning(
+                    f"Invalid frame policy '{self.frame_policy.value}', "
+                    f"falling back to '{FramePolicy.PROCESS_ALL}'"
+                )
+            selector.policy = FramePolicy.PROCESS_ALL
+        try:
+            selector.nth = int(str(self.frame_policy_nth.value))
+        except ValueError:
+            selector.nth = 1
+
+        kept = selector.select(pending)
+        if len(kept) < len(pending):
+            if self.upload_mode.value != UploadMode.IN_MEMORY_ONLY:
+                kept_ids = {id(frame) for frame in kept}
+                for frame in pending:
+                    if id(frame) not in kept_ids:
+                        self._store_uploads(frame)
+            self.frames_dropped.value = selector.dropped
+            now = time.monotonic()
+            period = DROPPED_FRAMES_LOG_PERIOD.total_seconds()
+            if now - self._dropped_frames_logged_at >= period:
+                self._dropped_frames_logged_at = now
+                logger.info(
+                    f"Dropped {selector.dropped} out of {selector.received} frames "
+                    f"under the '{selector.policy}' frame policy"
+                )
+        yield from kept
+
+    def _decode_frame(self, frame: Frame) -> Iterator[Frame]:
+        if frame.inference is None:
+            frame.trace.mark(DECODE)
+            yield frame
+            return
+
+        raw_data = (
+            frame.inference_data
+            if frame.inference_data is not None
+            else frame.inference.read_bytes()
+        )
+        frame.inference_render = raw_data.decode()
+        # Uploads may be batched, holding several inferences. All of them
+        # are decoded, while the newest one is rendered.
+        frame.inferences = get_inference_results(raw_data)
+        if not frame.inferences:
+            # Shown as is, without drawings
+            frame.trace.mark(DECODE)
+            yield frame
+            return
+        newest = frame.inferences[-1]
+        if newest.timestamp:
+            frame.trace.camera_time = parse_camera_time(newest.timestamp)
+        frame.inference_output = newest.output
+        if self.vapp_schema_file.value:
             try:
-                {
-                    ApplicationType.CLASSIFICATION.value: ClassificationDrawer,
-                    ApplicationType.DETECTION.value: DetectionDrawer,
-                }[str(self.vapp_type.value)].process_frame(image_file, output_data)
+                output_tensors = self._get_flatbuffers_inference_data(
+                    [result.output for result in frame.inferences]
+                )
+                if output_tensors:
+                    for result, output_tensor in zip(frame.inferences, output_tensors):
+                        result.decoded = output_tensor
+                    if newest.decoded:
+                        frame.inference_render = _render_output(newest.decoded)
+                        frame.inference_output = newest.decoded
+            except FlatbufferError as e:
+                logger.error("Error decoding inference data:", exc_info=e)
+        frame.trace.mark(DECODE)
+        yield frame
+
+    def _draw_frame(self, frame: Frame) -> Iterator[Frame]:
+        if frame.inference is not None:
+            self._draw_inference(frame)
+        if self.decode_stream_pixels:
+            frame.pixels = decode_pixels(
+                frame.image, frame.image_data, self.stream_view_size.value
+            )
+            # Drawings laid over the image are displayed over its preview
+            if frame.pixels and frame.overlay:
+                frame.overlay = frame.overlay.reduced(frame.pixels.reduction)
+        frame.trace.mark(DRAW)
+        yield frame
+
+    def _draw_inference(self, frame: Frame) -> None:
+        try:
+            drawer = {
+                ApplicationType.CLASSIFICATION.value: ClassificationDrawer,
+                ApplicationType.DETECTION.value: DetectionDrawer,
+            }[str(self.vapp_type.value)]
+            if _parse_flag(self.overlay_inferences.value):
+                frame.overlay = drawer.process_overlay(frame.inference_output)
+            elif frame.image_data is not None:
+                frame.image_data = drawer.process_buffer(
+                    frame.image_data, frame.inference_output, frame.image.suffix
+                )
+            else:
+                drawer.process_frame(frame.image, frame.inference_output)
                 # Adding drawings modifies file size. Update storage watcher
-                self.total_dir_watcher.update_file_size(image_file)
-            except Exception as e:
-                logger.error(f"Error while performing the drawing: {e}")
-            self.stream_image.value = str(image_file)
+                self.total_dir_watcher.update_file_size(frame.image)
+        except Exception as e:
+            logger.error(f"Error while performing the drawing: {e}")
+
+    def _store_frame(self, frame: Frame) -> Iterator[Frame]:
+        """
+        Writes the files of a frame that was kept in memory into the
+        input directories. If uploads are not to be saved, only the
+        image is written, as a preview for display.
+        """
+        if self.upload_mode.value == UploadMode.IN_MEMORY_ONLY:
+            # Frames already decoded for display need no preview file
+            if frame.image_data is not None and frame.pixels is None:
+                frame.image = self._write_preview(frame.image.name, frame.image_data)
+        else:
+            self._store_uploads(frame)
+        frame.trace.mark(STORE)
+        yield frame
+
+    def _store_uploads(self, frame: Frame) -> None:
+        """
+        Writes the files of a frame that were kept in memory
+        into the input directories.
+        """
+        if frame.image_data is not None:
+            self._write_into_input_directory(frame.image, frame.image_data)
+        if frame.inference and frame.inference_data is not None:
+            self._write_into_input_directory(frame.inference, frame.inference_data)
+
+    def _publish_frame(self, frame: Frame) -> Iterator[Frame]:
+        self._update_stream_views(frame)
+        yield frame
+
+    @run_on_ui_thread
+    def _update_stream_views(self, frame: Frame) -> None:
+        self.inference_field.value = frame.inference_render
+        # Set first, so that it is laid over the image as soon as it loads
+        self.stream_overlay.value = frame.overlay
+        if frame.pixels is not None:
+            self.stream_pixels.value = frame.pixels
+        else:
+            self.stream_image.value = str(frame.image)
+        frame.trace.mark(PUBLISH)
+        self.latency.record(frame.trace)
+
+        now = time.monotonic()
+        if now - self._latency_displayed_at >= LATENCY_DISPLAY_PERIOD.total_seconds():
+            self._latency_displayed_at = now
+            self.frame_latency.value = self.latency.headline()
 
     def input_directory_setup(
         self, current: Optional[str], previous: Optional[str]
@@ -233,11 +774,16 @@ class StreamingMixin(HasMQTTset, IsAsyncReady):
         if cur_path:
             check_and_create_directory(cur_path)
             self.total_dir_watcher.set_path(cur_path)
-            self.dir_monitor.watch(cur_path, self.notify_directory_deleted)
+            self.dir_monitor.watch(
+                cur_path, self.notify_directory_deleted, self._on_file_event
+            )
 
         if pre_path:
             self.dir_monitor.unwatch(pre_path)
 
+    def _on_file_event(self, event: FileSystemEvent) -> None:
+        self.total_dir_watcher.on_file_event(event)
+
     def notify_directory_deleted(self, dir_path: Path) -> None:
         self.send_message_sync("error", f"Directory {dir_path} does no longer exist.")
 
@@ -264,19 +810,85 @@ class StreamingMixin(HasMQTTset, IsAsyncReady):
                 target_file.unlink()
             final = Path(shutil.move(incoming_file, target_dir))
         self.total_dir_watcher.incoming(final)
+        if self.storage_pool:
+            self.storage_pool.rebalance()
         return final
 
+    def _write_into_input_directory(self, target_file: Path, data: bytes) -> None:
+        check_and_create_directory(target_file.parent)
+        if target_file.exists():
+            logger.info("Image with same name has arrived. Removing previous one.")
+            target_file.unlink()
+        target_file.write_bytes(data)
+        self.total_dir_watcher.incoming(target_file)
+        if self.storage_pool:
+            self.storage_pool.rebalance()
+
+    def _write_preview(self, name: str, data: bytes) -> Path:
+        """
+        Writes an image for display only, removing the
+        oldest ones once there are more than PREVIEW_HISTORY.
+        """
+        assert self._preview_dir
+        check_and_create_directory(self._preview_dir)
+        preview = self._preview_dir / name
+        preview.write_bytes(data)
+        self._previews.append(preview)
+        while len(self._previews) > PREVIEW_HISTORY:
+            self._previews.popleft().unlink(missing_ok=True)
+        return preview
+
     def _get_flatbuffers_inference_data(
-        self, flatbuffer_payload: bytes
-    ) -> None | str | dict:
-        return_value = None
+        self, flatbuffer_payloads: list[bytes]
+    ) -> Optional[list[Union[dict, InferenceTensor]]]:
+        return_value: Optional[list[Union[dict, InferenceTensor]]] = None
         if self.vapp_schema_file.value:
-            json_data = flatbuffer_binary_to_json(
-                self.vapp_schema_file.value, flatbuffer_payload
-            )
+            decoder = get_flatbuffer_decoder(Path(self.vapp_schema_file.value))
             labels_map = self.vapp_labels_map.value
-            if labels_map:
-                add_class_names(json_data, labels_map)
-            return_value = json_data
+            if decoder.tensor_kind:
+                tensors = decoder.decode_tensors(flatbuffer_payloads)
+                if labels_map:
+                    labels = LabelTable.of(labels_map)
+                    for tensor in tensors:
+                        tensor.apply_labels(labels)
+                return_value = list(tensors)
+            else:
+                json_data = decoder.decode_batch(flatbuffer_payloads)
+                if labels_map:
+                    decoder.add_class_names(json_data, labels_map)
+                return_value = list(json_data)
 
         return return_value
+
+
+def _parse_limit(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a retention limit setting, which is unlimited if empty or invalid
+    """
+    if not value:
+        return None
+    with contextlib.suppress(ValueError):
+        limit = float(value)
+        if limit >= 0:
+            return limit
+    logger.warning(f"Ignoring invalid retention limit '{value}'")
+    return None
+
+
+def _render_output(output: Union[dict, InferenceTensor]) -> str:
+    if isinstance(output, InferenceTensor):
+        output = output.to_dict()
+    return json.dumps(output, indent=2)
+
+
+def _parse_flag(value: Optional[str]) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _unpack(upload: Incoming) -> tuple[Path, Optional[bytes]]:
+    """
+    Returns the path of an upload and, if kept in memory, its contents.
+    """
+    if isinstance(upload, InMemoryUpload):
+        return upload.path, upload.data
+    return upload, None
@@ -0,0 +1,132 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+"""
+Decoding of the images of streamed frames into pixels ready for display,
+so that the GUI does not have to load them from their files.
+
+JPEG images are decoded at a reduced scale when the view they are shown in
+is smaller than them, which is much cheaper than decoding them in full.
+Full resolution is kept for the files that are stored.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import cv2  # type: ignore
+import numpy as np
+
+# Scales, as divisors, at which JPEG images can be decoded
+REDUCED_MODES = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Start of frame markers, holding the image size
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers that are not followed by a segment length
+_STANDALONE_MARKERS = {0x01, 0xD8, *range(0xD0, 0xD8)}
+
+
+@dataclass(frozen=True)
+class FramePixels:
+    """
+    An image as RGB bytes, row after row from the top one. When decoded
+    at a reduced scale, `reduction` is the divisor of its dimensions.
+    """
+
+    width: int
+    height: int
+    data: bytes
+    reduction: int = 1
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+
+def decode_pixels(
+    image: Path,
+    data: Optional[bytes] = None,
+    view_size: Optional[tuple[int, int]] = None,
+) -> Optional[FramePixels]:
+    """
+    Decodes the image from `data` if given, or else from its file. If
+    `view_size` is given, it is decoded at the smallest scale at which
+    it still fills the view. Returns None if it could not be decoded.
+    """
+    if data is None:
+        try:
+            data = image.read_bytes()
+        except OSError:
+            return None
+
+    reduction = 1
+    image_size = jpeg_size(data)
+    if image_size and view_size:
+        reduction = preview_reduction(image_size, view_size)
+    mode = REDUCED_MODES.get(reduction, cv2.IMREAD_COLOR)
+
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), mode)
+    if img is None:
+        return None
+    height, width = img.shape[:2]
+    return FramePixels(
+        width, height, cv2.cvtColor(img, cv2.COLOR_BGR2RGB).tobytes(), reduction
+    )
+
+
+def preview_reduction(image_size: tuple[int, int], view_size: tuple[int, int]) -> int:
+    """
+    Largest divisor of the image dimensions at which it is still at least
+    as large as when fit into the view, keeping its aspect ratio.
+    """
+    if not all(view_size):
+        return 1
+    # The image is shrunk by the ratio of its most constrained dimension
+    shrink = max(image / view for image, view in zip(image_size, view_size))
+    for reduction in sorted(REDUCED_MODES, reverse=True):
+        if reduction <= shrink:
+            return reduction
+    return 1
+
+
+def jpeg_size(data: bytes) -> Optional[tuple[int, int]]:
+    """
+    Width and height of a JPEG image, read from its frame header.
+    Returns None if `data` does not hold a JPEG image.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+        elif marker in _STANDALONE_MARKERS:
+            pos += 2
+        elif marker in _SOF_MARKERS:
+            if pos + 9 > len(data):
+                return None
+            height = int.from_bytes(data[pos + 5 : pos + 7], "big")
+            width = int.from_bytes(data[pos + 7 : pos + 9], "big")
+            return width, height
+        else:
+            pos += 2 + int.from_bytes(data[pos + 2 : pos + 4], "big")
+    return None
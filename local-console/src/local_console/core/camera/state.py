@@ -32,6 +32,8 @@ from local_console.core.commands.deploy import single_module_manifest_setup
 from local_console.core.commands.deploy import verify_report
 from local_console.core.commands.ota_deploy import get_package_hash
 from local_console.gui.enums import ApplicationConfiguration
+from local_console.servers.shared_webserver import SharedWebserver
+from local_console.utils.retention import StoragePool
 from local_console.utils.tracking import TrackingVariable
 from local_console.utils.validation import validate_imx500_model_file
 from trio import CancelScope
@@ -62,9 +64,11 @@ class CameraState(MQTTMixin, StreamingMixin):
         self,
         message_send_channel: MemorySendChannel[MessageType],
         trio_token: TrioToken,
+        webserver: Optional[SharedWebserver] = None,
+        storage_pool: Optional[StoragePool] = None,
     ) -> None:
         MQTTMixin.__init__(self)
-        StreamingMixin.__init__(self)
+        StreamingMixin.__init__(self, webserver, storage_pool)
 
         self.message_send_channel = message_send_channel
         self.trio_token: TrioToken = trio_token
@@ -203,6 +207,8 @@ class CameraState(MQTTMixin, StreamingMixin):
         logger.debug(f"Device on port {self.mqtt_port.value} shut down")
 
     def shutdown(self) -> None:
+        if self.storage_pool:
+            self.storage_pool.leave(self.total_dir_watcher)
         if self._started.is_set():
             assert self._cancel_scope
             self.dir_monitor.stop()
@@ -13,13 +13,30 @@
 # limitations under the License.
 #
 # SPDX-License-Identifier: Apache-2.0
-from collections import defaultdict
+import logging
+import time
+from collections import deque
+from collections import OrderedDict
+from collections.abc import Iterable
 from collections.abc import Iterator
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import timedelta
+from enum import Enum
+from pathlib import Path
 from pathlib import PurePath
-from queue import Empty
-from queue import Queue
 from typing import Any
+from typing import Callable
+from typing import Optional
 
+import trio
+from local_console.core.camera.enums import FramePolicy
+from local_console.core.camera.flatbuffers import InferenceResult
+from local_console.core.camera.latency import FrameTrace
+from local_console.core.camera.preview import FramePixels
+from local_console.gui.drawer.drawer import Overlay
+
+logger = logging.getLogger(__name__)
 
 FileGroup = dict[str, Any]
 
@@ -30,6 +47,43 @@ class FileGroupingError(Exception):
     """
 
 
+class OrphanReason(Enum):
+    # Its other files did not arrive within the time limit
+    EXPIRED = "expired"
+    # Too many groups were waiting for their other files
+    OVERFLOW = "overflow"
+
+
+OnOrphanCallable = Callable[[str, FileGroup, OrphanReason], None]
+
+
+@dataclass
+class GroupingStats:
+    """
+    Counters of the groups that got completed and of those that
+    were evicted before that, by the reason of their eviction.
+    """
+
+    completed: int = 0
+    expired: int = 0
+    overflowed: int = 0
+
+    @property
+    def orphaned(self) -> int:
+        return self.expired + self.overflowed
+
+    @property
+    def orphan_rate(self) -> float:
+        total = self.completed + self.orphaned
+        return self.orphaned / total if total else 0.0
+
+
+@dataclass
+class _PendingGroup:
+    files: FileGroup = field(default_factory=dict)
+    created: float = 0.0
+
+
 class FileGrouping:
     """
     This class assembles groups of files that have the same
@@ -47,12 +101,32 @@ class FileGrouping:
     When a group contains a specified set of parent keys,
     it will be available for popping out of the dictionary,
     so that its data gets consumed elsewhere.
+
+    Groups that remain incomplete, such as when a file gets lost
+    on its way, are evicted once they are older than `max_age`, or
+    when more than `max_pending` of them are waiting, the oldest
+    first. Evicted groups are handed to `on_orphan`, and counted
+    in `stats`. Expiry is checked whenever a file is registered.
+    This class is not thread-safe.
     """
 
-    def __init__(self, expected_extensions: set[str]) -> None:
+    def __init__(
+        self,
+        expected_extensions: set[str],
+        max_pending: Optional[int] = 256,
+        max_age: Optional[timedelta] = timedelta(seconds=30),
+        on_orphan: Optional[OnOrphanCallable] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
         self.extensions = expected_extensions
-        self._groups: dict[str, FileGroup] = defaultdict(dict)
-        self._queue: Queue[FileGroup] = Queue()
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.on_orphan = on_orphan
+        self.clock = clock
+        self.stats = GroupingStats()
+        # In the order they were started, so the oldest come first
+        self._groups: OrderedDict[str, _PendingGroup] = OrderedDict()
+        self._ready: deque[FileGroup] = deque()
 
     def register(self, file_name: PurePath, file_data: Any) -> None:
         """
@@ -67,15 +141,54 @@ class FileGrouping:
         if extension not in self.extensions:
             raise FileGroupingError(f"File {file_name} has unexpected parent")
 
+        now = self.clock()
+        self.evict_expired(now)
+
         stem = file_name.stem
-        self._groups[stem][extension] = file_data
-        if set(self._groups[stem]) == self.extensions:
-            self._queue.put(self._groups.pop(stem))
+        group = self._groups.get(stem)
+        if group is None:
+            group = self._groups[stem] = _PendingGroup(created=now)
+        group.files[extension] = file_data
+        if set(group.files) == self.extensions:
+            del self._groups[stem]
+            self._ready.append(group.files)
+            self.stats.completed += 1
+        elif self.max_pending is not None and len(self._groups) > self.max_pending:
+            self._evict_oldest(OrphanReason.OVERFLOW)
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """
+        Evicts the incomplete groups older than `max_age`,
+        returning how many were evicted.
+        """
+        if self.max_age is None:
+            return 0
+
+        deadline = (self.clock() if now is None else now) - self.max_age.total_seconds()
+        evicted = 0
+        while self._groups and next(iter(self._groups.values())).created < deadline:
+            self._evict_oldest(OrphanReason.EXPIRED)
+            evicted += 1
+        return evicted
+
+    @property
+    def pending(self) -> int:
+        return len(self._groups)
+
+    def _evict_oldest(self, reason: OrphanReason) -> None:
+        stem, group = self._groups.popitem(last=False)
+        if reason == OrphanReason.EXPIRED:
+            self.stats.expired += 1
+        else:
+            self.stats.overflowed += 1
+        logger.debug(f"Evicted incomplete file group {stem} ({reason.value})")
+        if self.on_orphan:
+            self.on_orphan(stem, group.files, reason)
 
     def __next__(self) -> FileGroup:
         try:
-            return self._queue.get_nowait()
-        except Empty:
+            return self._ready.popleft()
+        except IndexError:
             raise StopIteration
 
     def __iter__(self) -> Iterator[FileGroup]:
@@ -84,3 +197,129 @@ class FileGrouping:
                 yield next(self)
             except StopIteration:
                 break
+
+
+@dataclass
+class Frame:
+    """
+    An image and its matching inference, as they travel through
+    the stages of the streaming pipeline.
+    """
+
+    image: Path
+    # None for images whose inference never arrived
+    inference: Optional[Path]
+    # Text to display for the inference
+    inference_render: str = ""
+    # Inference data for the drawers to render, of the newest inference
+    inference_output: Any = None
+    # All the inferences in the file, from the oldest to the newest
+    inferences: list[InferenceResult] = field(default_factory=list)
+    # Contents of the files above, when uploads are kept in memory.
+    # Until they are stored, the files above do not exist.
+    image_data: Optional[bytes] = None
+    inference_data: Optional[bytes] = None
+    # Drawings for the GUI to lay over the image, when not drawn into it
+    overlay: Optional[Overlay] = None
+    # The image decoded for display, when the GUI is not to load it
+    pixels: Optional[FramePixels] = None
+    # Times at which the frame went through each stage
+    trace: FrameTrace = field(default_factory=FrameTrace)
+
+
+class FrameSelector:
+    """
+    Applies a backpressure policy onto the frames that are pending
+    processing, keeping count of the frames that it discards:
+
+    - FramePolicy.PROCESS_ALL keeps all frames.
+    - FramePolicy.LATEST_WINS keeps only the most recent pending frame.
+    - FramePolicy.EVERY_NTH keeps one out of every `nth` received frames.
+    """
+
+    def __init__(self, policy: FramePolicy = FramePolicy.PROCESS_ALL, nth: int = 1):
+        self.policy = policy
+        self.nth = nth
+        self.received = 0
+        self.dropped = 0
+
+    def select(self, pending: list[Any]) -> list[Any]:
+        if self.policy == FramePolicy.LATEST_WINS:
+            kept = pending[-1:]
+        elif self.policy == FramePolicy.EVERY_NTH:
+            nth = max(self.nth, 1)
+            kept = [
+                item
+                for index, item in enumerate(pending, start=self.received)
+                if index % nth == 0
+            ]
+        else:
+            kept = pending
+
+        self.received += len(pending)
+        self.dropped += len(pending) - len(kept)
+        return kept
+
+
+StageWork = Callable[[Any], Iterable[Any]]
+
+
+async def run_stage(
+    name: str,
+    work: StageWork,
+    receive_channel: trio.MemoryReceiveChannel[Any],
+    send_channel: Optional[trio.MemorySendChannel[Any]] = None,
+    limiter: Optional[trio.CapacityLimiter] = None,
+    batch: bool = False,
+) -> None:
+    """
+    Runs a stage of a pipeline made of tasks linked by memory channels.
+    Each item received is passed to `work`, and the items it yields are
+    sent onto the next stage. Items are processed one at a time, so that
+    their order is preserved across stages.
+
+    Args:
+        name (str): stage name, for logging purposes
+        work (StageWork): processing function, returning the outgoing items
+        receive_channel (MemoryReceiveChannel): incoming items
+        send_channel (MemorySendChannel, optional): outgoing items. If not
+            given, this is the last stage of the pipeline.
+        limiter (CapacityLimiter, optional): when given, `work` is run in
+            a worker thread borrowed from this limiter, instead of the
+            Trio thread.
+        batch (bool, optional): when set, `work` is passed the list of
+            all items waiting in `receive_channel`, instead of one item.
+    """
+
+    def process(item: Any) -> list[Any]:
+        return list(work(item))
+
+    async with receive_channel:
+        async for item in receive_channel:
+            if batch:
+                item = [item, *_drain(receive_channel)]
+            try:
+                if limiter:
+                    outgoing = await trio.to_thread.run_sync(
+                        process, item, limiter=limiter
+                    )
+                else:
+                    outgoing = process(item)
+            except Exception as e:
+                logger.error(f"Error in the {name} stage of the pipeline: {e}")
+                continue
+
+            if send_channel:
+                for out in outgoing:
+                    await send_channel.send(out)
+
+    if send_channel:
+        await send_channel.aclose()
+
+
+def _drain(receive_channel: trio.MemoryReceiveChannel[Any]) -> Iterator[Any]:
+    while True:
+        try:
+            yield receive_channel.receive_nowait()
+        except (trio.WouldBlock, trio.EndOfChannel):
+            break
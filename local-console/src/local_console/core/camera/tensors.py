@@ -0,0 +1,338 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+"""
+Decoding of the outputs of the built-in classification and object detection
+applications straight into structured NumPy arrays.
+
+Instead of building a Python object per detected item, the FlatBuffer tables
+of all items are read at once, by gathering their fields over arrays of
+offsets. Payloads are recognized by the layout of their schema, which must
+match that of the schemas bundled in `assets/schemas`.
+"""
+from collections.abc import Mapping
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+import numpy as np
+from local_console.core.camera.fbs_reflection import FieldDef
+from local_console.core.camera.fbs_reflection import FLOAT_PRECISION
+from local_console.core.camera.fbs_reflection import Schema
+from local_console.core.camera.fbs_reflection import SchemaError
+from local_console.core.camera.fbs_reflection import TableDef
+from local_console.core.camera.labels import LabelTable
+from local_console.core.schemas.tasks.classification import Classification
+from local_console.core.schemas.tasks.objectdetection import ObjectDetection
+
+SCHEMAS_DIR = Path(__file__).parents[2] / "assets" / "schemas"
+
+CLASSIFICATION_DTYPE = np.dtype([("class_id", "<u4"), ("score", "<f4")])
+DETECTION_DTYPE = np.dtype(
+    [
+        ("class_id", "<u4"),
+        ("score", "<f4"),
+        ("left", "<i4"),
+        ("top", "<i4"),
+        ("right", "<i4"),
+        ("bottom", "<i4"),
+        ("bounding_box_type", "u1"),
+    ]
+)
+BOX_FIELDS = ["left", "top", "right", "bottom"]
+# Values of `bounding_box_type`. Only items of type BoundingBox2d have a box.
+BOUNDING_BOX_NONE = 0
+BOUNDING_BOX_2D = 1
+BOX_TYPE_NAMES = {BOUNDING_BOX_NONE: "NONE", BOUNDING_BOX_2D: "BoundingBox2d"}
+
+
+class TensorKind(Enum):
+    CLASSIFICATION = "classification.fbs"
+    DETECTION = "objectdetection.fbs"
+
+    @property
+    def list_name(self) -> str:
+        if self == TensorKind.CLASSIFICATION:
+            return "classification_list"
+        return "object_detection_list"
+
+    @property
+    def dtype(self) -> np.dtype:
+        if self == TensorKind.CLASSIFICATION:
+            return CLASSIFICATION_DTYPE
+        return DETECTION_DTYPE
+
+
+@dataclass
+class InferenceTensor:
+    """
+    Items of an inference output, as a structured array whose dtype
+    depends on `kind`, along with the names of their classes, if known.
+    """
+
+    kind: TensorKind
+    records: np.ndarray
+    class_names: Optional[np.ndarray] = None
+
+    def apply_labels(self, labels: Mapping[int, str]) -> None:
+        """
+        Names the classes of all items at once, as "Unknown"
+        for those whose class is not in `labels`.
+        """
+        self.class_names = LabelTable.of(labels).lookup(self.records["class_id"])
+
+    def labels(self) -> np.ndarray:
+        """
+        Text identifying the class of each item: its name, or its id.
+        """
+        ids = self.records["class_id"].astype(str).astype(object)
+        if self.class_names is None:
+            return ids
+        return np.where(self.class_names.astype(bool), self.class_names, ids)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Same object as decoded from the payload by `flatc --defaults-json`,
+        with class names if they have been applied.
+        """
+        records = self.records
+        scores = np.round(
+            records["score"].astype(np.float64), FLOAT_PRECISION["f"]
+        ).tolist()
+        class_ids = records["class_id"].tolist()
+        items: list[dict[str, Any]]
+        if self.kind == TensorKind.CLASSIFICATION:
+            items = [
+                {"class_id": class_id, "score": score}
+                for class_id, score in zip(class_ids, scores)
+            ]
+        else:
+            boxes = np.stack([records[name] for name in BOX_FIELDS], axis=1).tolist()
+            items = []
+            for class_id, box_type, box, score in zip(
+                class_ids, records["bounding_box_type"].tolist(), boxes, scores
+            ):
+                item = {
+                    "class_id": class_id,
+                    "bounding_box_type": BOX_TYPE_NAMES.get(box_type, box_type),
+                }
+                if box_type == BOUNDING_BOX_2D:
+                    item["bounding_box"] = dict(zip(BOX_FIELDS, box))
+                item["score"] = score
+                items.append(item)
+        if self.class_names is not None:
+            for item, name in zip(items, self.class_names.tolist()):
+                item["class_name"] = name
+        return {"perception": {self.kind.list_name: items}}
+
+    @classmethod
+    def from_dict(cls, kind: TensorKind, output: dict[str, Any]) -> "InferenceTensor":
+        """
+        Builds the arrays of an output that was decoded into Python objects.
+        """
+        records: np.ndarray
+        if kind == TensorKind.CLASSIFICATION:
+            classifications = Classification(**output).perception.classification_list
+            records = np.array(
+                [(item.class_id, item.score) for item in classifications],
+                dtype=CLASSIFICATION_DTYPE,
+            )
+            names = [item.class_name for item in classifications]
+        else:
+            detections = ObjectDetection(**output).perception.object_detection_list
+            rows = []
+            for item in detections:
+                box = item.bounding_box
+                if box is None:
+                    rows.append(
+                        (item.class_id, item.score, 0, 0, 0, 0, BOUNDING_BOX_NONE)
+                    )
+                else:
+                    rows.append(
+                        (
+                            item.class_id,
+                            item.score,
+                            box.left,
+                            box.top,
+                            box.right,
+                            box.bottom,
+                            BOUNDING_BOX_2D,
+                        )
+                    )
+            records = np.array(rows, dtype=DETECTION_DTYPE)
+            names = [item.class_name for item in detections]
+
+        class_names = None
+        if any(names):
+            class_names = np.array([name or "" for name in names], dtype=object)
+        return cls(kind, records, class_names)
+
+
+def as_tensor(kind: TensorKind, output: Any) -> InferenceTensor:
+    """
+    Arrays of an inference output of the given kind, whether it was
+    decoded into them or into Python objects.
+    """
+    if isinstance(output, InferenceTensor):
+        if output.kind != kind:
+            raise ValueError(f"Expected a {kind.name.lower()} output")
+        return output
+    return InferenceTensor.from_dict(kind, output)
+
+
+def match_schema(schema: Schema) -> Optional[TensorKind]:
+    """
+    Returns the kind of output that `schema` describes, if its layout
+    is that of one of the bundled schemas.
+    """
+    signature = _signature(schema, schema.root)
+    for kind, known in _known_signatures().items():
+        if signature == known:
+            return kind
+    return None
+
+
+_signatures: dict[TensorKind, tuple] = {}
+
+
+def _known_signatures() -> dict[TensorKind, tuple]:
+    if not _signatures:
+        for kind in TensorKind:
+            schema = Schema((SCHEMAS_DIR / kind.value).read_text())
+            _signatures[kind] = _signature(schema, schema.root)
+    return _signatures
+
+
+def _signature(
+    schema: Schema, table: TableDef, visiting: frozenset = frozenset()
+) -> tuple:
+    # Everything that determines how payloads are laid out, except names of types
+    if table.name in visiting:
+        # Recursive schemas cannot match any bundled one, but must not loop
+        return ("recursive",)
+    visiting = visiting | {table.name}
+    return tuple(_field_signature(schema, fd, visiting) for fd in table.fields)
+
+
+def _field_signature(schema: Schema, fd: FieldDef, visiting: frozenset) -> tuple:
+    nested: Any = None
+    if isinstance(fd.ref, TableDef):
+        nested = _signature(schema, fd.ref, visiting)
+    elif fd.ref is not None and fd.ref.members:
+        nested = tuple(
+            (value, _signature(schema, schema.tables[member], visiting))
+            for value, member in sorted(fd.ref.members.items())
+        )
+    return (
+        fd.name,
+        fd.kind.name,
+        fd.fmt,
+        fd.is_vector,
+        fd.voffset,
+        fd.default_value,
+        nested,
+    )
+
+
+def decode_tensor(kind: TensorKind, buf: bytes) -> InferenceTensor:
+    """
+    Decodes a raw-binary FlatBuffer laid out as the bundled schema of `kind`.
+    """
+    reader = _Reader(buf)
+    try:
+        root = reader.gather(np.zeros(1, np.int64), "<u4").astype(np.int64)
+        perception = reader.table_field(root, 4)
+        items = reader.vector_tables(perception, 4)
+        records = np.zeros(len(items), dtype=kind.dtype)
+        if kind == TensorKind.CLASSIFICATION:
+            records["class_id"] = reader.scalar_field(items, 4, "<u4")
+            records["score"] = reader.scalar_field(items, 6, "<f4")
+        else:
+            records["class_id"] = reader.scalar_field(items, 4, "<u4")
+            box_type = reader.scalar_field(items, 6, "u1")
+            records["bounding_box_type"] = box_type
+            records["score"] = reader.scalar_field(items, 10, "<f4")
+            # Items without a box of a known type get an empty one
+            boxed = box_type == BOUNDING_BOX_2D
+            boxes = reader.table_field(items[boxed], 8)
+            for index, name in enumerate(BOX_FIELDS):
+                records[name][boxed] = reader.scalar_field(boxes, 4 + 2 * index, "<i4")
+    except (IndexError, ValueError) as e:
+        raise SchemaError(f"Malformed payload: {e}")
+    return InferenceTensor(kind, records)
+
+
+class _Reader:
+    """
+    Reads FlatBuffer values at many positions at once. Positions are
+    arrays of offsets within the buffer, and absent tables are marked
+    by a negative position.
+    """
+
+    def __init__(self, buf: bytes) -> None:
+        self.buf = np.frombuffer(buf, dtype=np.uint8)
+
+    def gather(self, pos: np.ndarray, dtype: str) -> np.ndarray:
+        size = np.dtype(dtype).itemsize
+        if len(pos) and (pos.min() < 0 or pos.max() + size > len(self.buf)):
+            raise SchemaError("Malformed payload: offset out of bounds")
+        raw = self.buf[pos[:, None] + np.arange(size)]
+        return raw.view(dtype).reshape(len(pos))
+
+    def field_offsets(self, tables: np.ndarray, voffset: int) -> np.ndarray:
+        """
+        Offsets of a field within each table, which are 0 where absent.
+        """
+        vtables = tables - self.gather(tables, "<i4").astype(np.int64)
+        sizes = self.gather(vtables, "<u2")
+        offsets = np.zeros(len(tables), dtype=np.int64)
+        present = sizes > voffset
+        offsets[present] = self.gather(vtables[present] + voffset, "<u2")
+        return offsets
+
+    def scalar_field(self, tables: np.ndarray, voffset: int, dtype: str) -> np.ndarray:
+        offsets = self.field_offsets(tables, voffset)
+        values = np.zeros(len(tables), dtype=dtype)
+        present = offsets > 0
+        values[present] = self.gather(tables[present] + offsets[present], dtype)
+        return values
+
+    def table_field(self, tables: np.ndarray, voffset: int) -> np.ndarray:
+        offsets = self.field_offsets(tables, voffset)
+        if not offsets.all():
+            raise SchemaError("Malformed payload: missing table")
+        field_pos: np.ndarray = tables + offsets
+        positions: np.ndarray = field_pos + self.gather(field_pos, "<u4").astype(
+            np.int64
+        )
+        return positions
+
+    def vector_tables(self, tables: np.ndarray, voffset: int) -> np.ndarray:
+        """
+        Positions of the tables in a vector field of a single table.
+        """
+        offsets = self.field_offsets(tables, voffset)
+        if not offsets[0]:
+            return np.zeros(0, dtype=np.int64)
+        field_pos = tables + offsets
+        vector = field_pos + self.gather(field_pos, "<u4").astype(np.int64)
+        (length,) = self.gather(vector, "<u4")
+        start = int(vector[0]) + 4
+        if start + 4 * int(length) > len(self.buf):
+            raise SchemaError("Malformed payload: vector out of bounds")
+        elements = start + 4 * np.arange(length, dtype=np.int64)
+        return elements + self.gather(elements, "<u4").astype(np.int64)
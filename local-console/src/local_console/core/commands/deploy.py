@@ -31,9 +31,12 @@ from local_console.core.camera.enums import DeployStage
 from local_console.core.schemas.schemas import Deployment
 from local_console.core.schemas.schemas import DeploymentManifest
 from local_console.core.schemas.schemas import OnWireProtocol
+from local_console.servers.webserver import DownloadProgress
+from local_console.servers.webserver import log_download_progress
 from local_console.servers.webserver import SyncWebserver
 from local_console.utils.local_network import get_webserver_ip
 from local_console.utils.timing import TimeoutBehavior
+from trio.lowlevel import TrioToken
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +53,10 @@ class DeployFSM(ABC):
         self.deploy_fn = deploy_fn
         self.stage_callback = stage_callback
         self.webserver = SyncWebserver(
-            Path(), port=webserver_port, deploy=deploy_webserver
+            Path(),
+            port=webserver_port,
+            deploy=deploy_webserver,
+            on_download=self._on_download,
         )
         self.webserver.start()  # This secures a listening port for the webserver
 
@@ -60,6 +66,28 @@ class DeployFSM(ABC):
         self.errored: Optional[bool] = None
 
         self.stage: Optional[DeployStage] = None
+        # Latest progress of each module download, keyed by file name
+        self.downloads: dict[str, DownloadProgress] = {}
+        self._trio_token: Optional[TrioToken] = None
+
+    def _on_download(self, progress: DownloadProgress) -> None:
+        """
+        Called from the webserver threads while the device downloads modules.
+        """
+        if self._trio_token:
+            trio.from_thread.run_sync(
+                self._record_download, progress, trio_token=self._trio_token
+            )
+
+    def _record_download(self, progress: DownloadProgress) -> None:
+        log_download_progress(progress)
+        self.downloads[progress.path.name] = progress
+        # A module download that progresses keeps the deployment alive
+        self._timeout_handler.tap()
+
+    def _spawn_timeout_handler(self, nursery: trio.Nursery) -> None:
+        self._trio_token = trio.lowlevel.current_trio_token()
+        self._timeout_handler.spawn_in(nursery)
 
     async def _set_new_stage(self, new_stage: DeployStage) -> None:
         self.stage = new_stage
@@ -79,7 +107,7 @@ class DeployFSM(ABC):
         """
         To be called for performing actions at FSM entry, once the
         deployment manifest is set. It must:
-        - call spawn_in() of _timeout_handler
+        - call _spawn_timeout_handler()
         - await _set_new_stage() with initial stage
         """
 
@@ -160,7 +188,7 @@ class EVP2DeployFSM(DeployFSM):
         No further start actions required
         """
         assert self._to_deploy
-        self._timeout_handler.spawn_in(nursery)
+        self._spawn_timeout_handler(nursery)
         await self._set_new_stage(DeployStage.WaitFirstStatus)
 
     async def update(self, deploy_status: dict[str, Any]) -> None:
@@ -202,7 +230,7 @@ class EVP1DeployFSM(DeployFSM):
         assert self._to_deploy
         # Deploy immediately, without comparing with current status, to speed-up the process.
         logger.debug("Pushing manifest now.")
-        self._timeout_handler.spawn_in(nursery)
+        self._spawn_timeout_handler(nursery)
         await self._set_new_stage(DeployStage.WaitAppliedConfirmation)
         await self.deploy_fn(self._to_deploy)
 
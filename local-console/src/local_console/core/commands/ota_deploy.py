@@ -46,6 +46,7 @@ def configuration_spec(
     webserver_root: Path,
     webserver_port: int,
     webserver_host: str,
+    webserver_prefix: str = "",
 ) -> DnnOta:
     file_hash = get_package_hash(package_file)
     # version for ApFw and SensorFw are specified by the user
@@ -55,7 +56,7 @@ def configuration_spec(
         else ""
     )
     rel_path = PurePosixPath(package_file.relative_to(webserver_root))
-    url = f"http://{webserver_host}:{webserver_port}/{rel_path}"
+    url = f"http://{webserver_host}:{webserver_port}{webserver_prefix}/{rel_path}"
     return DnnOta(
         OTA=DnnOtaBody(
             UpdateModule=ota_type,
@@ -139,6 +139,15 @@ class Persist(BaseModel):
     vapp_schema_file: str | None = None
     vapp_config_file: str | None = None
     vapp_labels_file: str | None = None
+    frame_policy: str | None = None
+    frame_policy_nth: str | None = None
+    upload_mode: str | None = None
+    max_files: str | None = None
+    max_age_hours: str | None = None
+    archive_after_hours: str | None = None
+    archive_quality: str | None = None
+    show_orphan_images: str | None = None
+    overlay_inferences: str | None = None
 
 
 class DeviceConnection(BaseModel):
@@ -152,7 +161,17 @@ class EVPParams(BaseModel):
     iot_platform: str = Field(pattern=r"^[a-zA-Z][\w]*$")
 
 
+class StorageBudget(BaseModel, validate_assignment=True):
+    """
+    Limits shared by the storage of all devices
+    """
+
+    max_bytes: Optional[Annotated[int, Field(ge=0)]] = None
+    max_files: Optional[Annotated[int, Field(ge=0)]] = None
+
+
 class GlobalConfiguration(BaseModel):
     evp: EVPParams
     devices: list[DeviceConnection]
     active_device: int = IPPortNumber
+    storage: StorageBudget = StorageBudget()
@@ -28,7 +28,8 @@ class Bbox(BaseModel):
 class Detection(BaseModel):
     class_id: int
     bounding_box_type: str
-    bounding_box: Bbox
+    # Absent unless `bounding_box_type` is that of a box
+    bounding_box: Optional[Bbox] = None
     score: float
     class_name: Optional[str] = None
 
@@ -26,6 +26,8 @@ from local_console.core.config import config_obj
 from local_console.core.schemas.schemas import DeviceConnection
 from local_console.core.schemas.schemas import DeviceListItem
 from local_console.gui.model.camera_proxy import CameraStateProxy
+from local_console.servers.shared_webserver import SharedWebserver
+from local_console.utils.retention import StoragePool
 
 logger = logging.getLogger(__name__)
 
@@ -49,21 +51,37 @@ class DeviceManager:
         "vapp_schema_file",
         "vapp_config_file",
         "vapp_labels_file",
+        "frame_policy",
+        "frame_policy_nth",
+        "upload_mode",
     ]
     _STATE_TO_PROXY_PROPS = [
         "image_dir_path",
         "inference_dir_path",
     ]
+    # Settings of the state with no counterpart in the GUI
+    _STATE_PROPS = [
+        "max_files",
+        "max_age_hours",
+        "archive_after_hours",
+        "archive_quality",
+        "show_orphan_images",
+        "overlay_inferences",
+    ]
 
     def __init__(
         self,
         send_channel: trio.MemorySendChannel[MessageType],
         nursery: trio.Nursery,
         trio_token: trio.lowlevel.TrioToken,
+        webserver: Optional[SharedWebserver] = None,
+        storage_pool: Optional[StoragePool] = None,
     ) -> None:
         self.send_channel = send_channel
         self.nursery = nursery
         self.trio_token = trio_token
+        self.webserver = webserver
+        self.storage_pool = storage_pool
 
         self.active_device: DeviceListItem | None = None
         self.proxies_factory: dict[int, CameraStateProxy] = {}
@@ -116,7 +134,12 @@ class DeviceManager:
         """
         key = device_item.port
 
-        state = CameraState(self.send_channel.clone(), self.trio_token)
+        state = CameraState(
+            self.send_channel.clone(),
+            self.trio_token,
+            self.webserver,
+            self.storage_pool,
+        )
         proxy = CameraStateProxy()
 
         config = config_obj.get_config()
@@ -197,9 +220,13 @@ class DeviceManager:
         attributes change, their new values are saved to the persistent configuration.
         """
 
+        persisted = (
+            self._PROXY_TO_STATE_PROPS + self._STATE_TO_PROXY_PROPS + self._STATE_PROPS
+        )
+
         def save_configuration(attribute: str, current: Any, previous: Any) -> None:
             persist = config_obj.get_device_config(key).persist
-            for item in self._PROXY_TO_STATE_PROPS + self._STATE_TO_PROXY_PROPS:
+            for item in persisted:
                 if attribute == item:
                     setattr(persist, item, str(current))
 
@@ -207,7 +234,7 @@ class DeviceManager:
             config_obj.save_config()
 
         # Save configuration for any modification of relevant variables
-        for item in self._PROXY_TO_STATE_PROPS + self._STATE_TO_PROXY_PROPS:
+        for item in persisted:
             getattr(self.state_factory[key], item).subscribe(
                 partial(save_configuration, item)
             )
@@ -220,7 +247,7 @@ class DeviceManager:
         assert persist
 
         # Attributes with `bind_state_to_proxy` requires to update using `.value` to trigger the binding
-        for item in self._STATE_TO_PROXY_PROPS:
+        for item in self._STATE_TO_PROXY_PROPS + self._STATE_PROPS:
             if getattr(persist, item):
                 setattr(
                     getattr(self.state_factory[key], item),
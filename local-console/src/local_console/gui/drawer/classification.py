@@ -13,12 +13,15 @@
 # limitations under the License.
 #
 # SPDX-License-Identifier: Apache-2.0
-from pathlib import Path
 from typing import Any
+from typing import Union
 
 import cv2  # type: ignore
-from local_console.core.schemas.tasks.classification import Classification
+from local_console.core.camera.tensors import as_tensor
+from local_console.core.camera.tensors import InferenceTensor
+from local_console.core.camera.tensors import TensorKind
 from local_console.gui.drawer.drawer import Drawer
+from local_console.gui.drawer.drawer import Overlay
 
 # Maximum classes to draw
 TOPK = 5
@@ -26,20 +29,28 @@ TOPK = 5
 
 class ClassificationDrawer(Drawer):
     @staticmethod
-    def process_frame(image: Path, output_tensor: Any) -> None:
-        if not isinstance(output_tensor, dict):
-            return
+    def overlay(output_tensor: Union[dict, InferenceTensor]) -> Overlay:
+        tensor = as_tensor(TensorKind.CLASSIFICATION, output_tensor)
+        top = slice(0, TOPK)
+        scores = tensor.records["score"][top].tolist()
+        return Overlay(
+            captions=[
+                f"{label}: {score:.2f}"
+                for label, score in zip(tensor.labels()[top].tolist(), scores)
+            ]
+        )
 
-        img = cv2.imread(image)
-
-        obj = Classification(**output_tensor)
+    @staticmethod
+    def draw(img: Any, output_tensor: Union[dict, InferenceTensor]) -> Any:
+        texts = ClassificationDrawer.overlay(output_tensor).captions
 
         img_height = img.shape[0]
+        ClassificationDrawer.metrics.set_image_height(img_height)
         base_font_scale = 0.4
         font_scale = base_font_scale * (img_height / 300.0)
         font_thickness = int(font_scale * 2)
 
-        font = cv2.FONT_HERSHEY_SIMPLEX
+        font = ClassificationDrawer.metrics.font
         font_color = (255, 255, 255)
         line_type = cv2.LINE_AA
 
@@ -47,11 +58,10 @@ class ClassificationDrawer(Drawer):
         initial_y = 10
         padding = int(10 * font_scale)
 
-        for cls in obj.perception.classification_list[:TOPK]:
-            text = (
-                f"{cls.class_name if cls.class_name else cls.class_id}: {cls.score:.2f}"
+        for text in texts:
+            (w, h), b = ClassificationDrawer.metrics.text_size(
+                text, font_scale, font_thickness
             )
-            (w, h), b = cv2.getTextSize(text, font, font_scale, font_thickness)
 
             bot_left = (initial_x, initial_y + h + b)
 
@@ -73,4 +83,4 @@ class ClassificationDrawer(Drawer):
 
             initial_y += b + h + padding
 
-        cv2.imwrite(image, img)
+        return img
@@ -14,12 +14,112 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 from abc import abstractmethod
+from dataclasses import dataclass
+from dataclasses import field
 from pathlib import Path
 from typing import Any
+from typing import Optional
+from typing import Union
+
+import cv2  # type: ignore
+import numpy as np
+from local_console.core.camera.tensors import InferenceTensor
+from local_console.gui.drawer.text import TextMetrics
+
+
+@dataclass(frozen=True)
+class OverlayBox:
+    """
+    A box in pixels of the image, with a caption over its top left corner
+    """
+
+    left: int
+    top: int
+    right: int
+    bottom: int
+    caption: str = ""
+
+
+@dataclass(frozen=True)
+class Overlay:
+    """
+    Drawings of an inference output, to be laid over its image by the GUI
+    instead of drawn into it. Captions are listed from the top left corner.
+    """
+
+    boxes: list[OverlayBox] = field(default_factory=list)
+    captions: list[str] = field(default_factory=list)
+
+    def reduced(self, reduction: int) -> "Overlay":
+        """
+        The same drawings, for the image scaled down by `reduction`.
+        """
+        if reduction == 1:
+            return self
+        return Overlay(
+            boxes=[
+                OverlayBox(
+                    box.left // reduction,
+                    box.top // reduction,
+                    box.right // reduction,
+                    box.bottom // reduction,
+                    box.caption,
+                )
+                for box in self.boxes
+            ],
+            captions=self.captions,
+        )
 
 
 class Drawer:
+    # Sizes of the captions drawn, shared by all drawers
+    metrics = TextMetrics()
+
+    @classmethod
+    def process_frame(cls, image: Path, output_tensor: Any) -> None:
+        """
+        Draws the inference output onto the image file, in place.
+        """
+        if not isinstance(output_tensor, (dict, InferenceTensor)):
+            return
+
+        img = cv2.imread(image)
+        cv2.imwrite(image, cls.draw(img, output_tensor))
+
+    @classmethod
+    def process_buffer(
+        cls, image_data: bytes, output_tensor: Any, extension: str = ".jpg"
+    ) -> bytes:
+        """
+        Draws the inference output onto the encoded image, returning
+        it encoded in the format given by `extension`.
+        """
+        if not isinstance(output_tensor, (dict, InferenceTensor)):
+            return image_data
+
+        img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Image data could not be decoded")
+        success, encoded = cv2.imencode(extension, cls.draw(img, output_tensor))
+        if not success:
+            raise ValueError(f"Image could not be encoded as {extension}")
+        return bytes(encoded)
+
+    @classmethod
+    def process_overlay(cls, output_tensor: Any) -> Optional[Overlay]:
+        """
+        Lays out the drawings of the inference output, leaving the image as is.
+        """
+        if not isinstance(output_tensor, (dict, InferenceTensor)):
+            return None
+        return cls.overlay(output_tensor)
+
+    @staticmethod
+    @abstractmethod
+    def overlay(output_tensor: Union[dict, InferenceTensor]) -> Overlay:
+        """Not Implemented"""
+
     @staticmethod
     @abstractmethod
-    def process_frame(image: Path, output_tensor: Any) -> None:
+    def draw(img: Any, output_tensor: Union[dict, InferenceTensor]) -> Any:
         """Not Implemented"""
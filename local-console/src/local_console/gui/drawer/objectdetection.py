@@ -13,36 +13,70 @@
 # limitations under the License.
 #
 # SPDX-License-Identifier: Apache-2.0
-from pathlib import Path
 from typing import Any
+from typing import Union
 
 import cv2  # type: ignore
-from local_console.core.schemas.tasks.objectdetection import ObjectDetection
+import numpy as np
+from local_console.core.camera.tensors import as_tensor
+from local_console.core.camera.tensors import BOUNDING_BOX_2D
+from local_console.core.camera.tensors import BOX_FIELDS
+from local_console.core.camera.tensors import InferenceTensor
+from local_console.core.camera.tensors import TensorKind
 from local_console.gui.drawer.drawer import Drawer
+from local_console.gui.drawer.drawer import Overlay
+from local_console.gui.drawer.drawer import OverlayBox
+
+CAPTION_FONT_SCALE = 0.5
+CAPTION_THICKNESS = 1
 
 
 class DetectionDrawer(Drawer):
     @staticmethod
-    def process_frame(image: Path, output_tensor: Any) -> None:
-        if not isinstance(output_tensor, dict):
-            return
-
-        img = cv2.imread(image)
-
-        obj = ObjectDetection(**output_tensor)
-        for detection in obj.perception.object_detection_list:
-            bbox_2d = detection.bounding_box
-            xmin, xmax = bbox_2d.left, bbox_2d.right
-            ymax, ymin = bbox_2d.bottom, bbox_2d.top
+    def overlay(output_tensor: Union[dict, InferenceTensor]) -> Overlay:
+        tensor = as_tensor(TensorKind.DETECTION, output_tensor)
+        # Items without a box have nothing to draw
+        boxed = tensor.records["bounding_box_type"] == BOUNDING_BOX_2D
+        records = tensor.records[boxed]
+        boxes = np.stack([records[name] for name in BOX_FIELDS], axis=1).tolist()
+        scores = records["score"].tolist()
+        return Overlay(
+            boxes=[
+                OverlayBox(xmin, ymin, xmax, ymax, f"{label}: {score:.2f}")
+                for (xmin, ymin, xmax, ymax), label, score in zip(
+                    boxes, tensor.labels()[boxed].tolist(), scores
+                )
+            ]
+        )
 
-            img = cv2.rectangle(img, (xmin, ymin), (xmax, ymax), (0, 0, 255), 2)
+    @staticmethod
+    def draw(img: Any, output_tensor: Union[dict, InferenceTensor]) -> Any:
+        metrics = DetectionDrawer.metrics
+        img_height, img_width = img.shape[:2]
+        metrics.set_image_height(img_height)
+        for box in DetectionDrawer.overlay(output_tensor).boxes:
+            img = cv2.rectangle(
+                img, (box.left, box.top), (box.right, box.bottom), (0, 0, 255), 2
+            )
+            (w, h), b = metrics.text_size(
+                box.caption, CAPTION_FONT_SCALE, CAPTION_THICKNESS
+            )
+            # Captions entirely out of the image are not drawn
+            margin = CAPTION_THICKNESS + 1
+            if (
+                box.left + w + margin < 0
+                or box.left - margin >= img_width
+                or box.top + b + margin < 0
+                or box.top - h - margin >= img_height
+            ):
+                continue
             img = cv2.putText(
                 img,
-                f"{detection.class_name if detection.class_name else detection.class_id}: {detection.score:.2f}",
-                (xmin, ymin),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.5,
+                box.caption,
+                (box.left, box.top),
+                metrics.font,
+                CAPTION_FONT_SCALE,
                 (255, 255, 255),
-                1,
+                CAPTION_THICKNESS,
             )
-        cv2.imwrite(image, img)
+        return img
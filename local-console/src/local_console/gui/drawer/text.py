@@ -0,0 +1,73 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import cv2  # type: ignore
+
+# Texts are keyed by their contents, font scale and thickness. Captions
+# hold a label and a score rounded to hundredths, so that they repeat.
+TextKey = tuple[str, float, int]
+# Width and height of a text, and the distance from its baseline to its bottom
+TextSize = tuple[tuple[int, int], int]
+
+
+class TextMetrics:
+    """
+    Sizes of the texts that a drawer puts onto images, kept across frames.
+    As font scales may depend on the height of the images, all of them are
+    dropped whenever it changes. Up to `max_entries` sizes are kept,
+    dropping the least recently used.
+    """
+
+    def __init__(
+        self, font: int = cv2.FONT_HERSHEY_SIMPLEX, max_entries: int = 4096
+    ) -> None:
+        self.font = font
+        self.max_entries = max_entries
+        self._height: Optional[int] = None
+        self._sizes: OrderedDict[TextKey, TextSize] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def set_image_height(self, height: int) -> None:
+        with self._lock:
+            if height != self._height:
+                self._height = height
+                self._sizes.clear()
+
+    def text_size(self, text: str, scale: float, thickness: int) -> TextSize:
+        """
+        Same as `cv2.getTextSize` with the font of these metrics.
+        """
+        key = (text, scale, thickness)
+        with self._lock:
+            cached = self._sizes.get(key)
+            if cached is not None:
+                self._sizes.move_to_end(key)
+                return cached
+
+        (width, height), baseline = cv2.getTextSize(text, self.font, scale, thickness)
+        size = ((width, height), baseline)
+        if self.max_entries > 0:
+            with self._lock:
+                self._sizes[key] = size
+                while len(self._sizes) > self.max_entries:
+                    self._sizes.popitem(last=False)
+        return size
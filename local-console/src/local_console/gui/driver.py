@@ -14,12 +14,14 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 import logging
+from pathlib import Path
 from typing import Any
 from typing import Optional
 
 import trio
 from kivymd.app import MDApp
 from local_console.core.camera.axis_mapping import UnitROI
+from local_console.core.camera.latency import export_latency_report
 from local_console.core.camera.state import CameraState
 from local_console.core.camera.state import MessageType
 from local_console.core.config import config_obj
@@ -27,6 +29,8 @@ from local_console.gui.device_manager import DeviceManager
 from local_console.gui.utils.sync_async import AsyncFunc
 from local_console.gui.utils.sync_async import run_on_ui_thread
 from local_console.gui.utils.sync_async import SyncAsyncBridge
+from local_console.servers.shared_webserver import SharedWebserver
+from local_console.utils.retention import StoragePool
 from trio import CancelScope
 from trio import MemoryReceiveChannel
 
@@ -42,6 +46,8 @@ class Driver:
         self.receive_channel: trio.MemoryReceiveChannel[MessageType] | None = None
 
         self.device_manager: Optional[DeviceManager] = None
+        self.webserver = SharedWebserver()
+        self.storage_pool = StoragePool()
         self.camera_state: Optional[CameraState] = None
 
         self.bridge = SyncAsyncBridge()
@@ -51,6 +57,9 @@ class Driver:
         async with trio.open_nursery() as nursery:
             try:
                 nursery.start_soon(self.bridge.bridge_listener)
+                await nursery.start(self.webserver.serve)
+                budget = config_obj.get_config().storage
+                self.storage_pool.set_budget(budget.max_bytes, budget.max_files)
                 self.send_channel, self.receive_channel = trio.open_memory_channel(0)
                 channel_cs = CancelScope()
                 async with self.send_channel, self.receive_channel:
@@ -61,6 +70,8 @@ class Driver:
                         self.send_channel,
                         nursery,
                         trio.lowlevel.current_trio_token(),
+                        self.webserver,
+                        self.storage_pool,
                     )
                     await self.device_manager.init_devices(
                         config_obj.get_device_configs()
@@ -75,6 +86,22 @@ class Driver:
                 self.bridge.close_task_queue()
                 nursery.cancel_scope.cancel()
 
+    def report_latency(self, export_path: Optional[Path] = None) -> None:
+        """
+        Logs the latency histograms of the frames streamed from each
+        device, and saves them into `export_path`, if given.
+        """
+        if not self.device_manager:
+            return
+        trackers = {
+            str(key): state.latency
+            for key, state in self.device_manager.state_factory.items()
+        }
+        for key, tracker in trackers.items():
+            logger.info(f"Frame latency of device on port {key}:\n{tracker.summary()}")
+        if export_path:
+            export_latency_report(export_path, trackers)
+
     def from_sync(self, async_fn: AsyncFunc, *args: Any) -> None:
         self.bridge.enqueue_task(async_fn, *args)
 
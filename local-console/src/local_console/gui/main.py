@@ -44,6 +44,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 import logging
+from pathlib import Path
 from typing import Any
 from typing import Optional
 
@@ -66,12 +67,17 @@ logger = logging.getLogger(__name__)
 
 class LocalConsoleGUIAPP(MDApp):
     driver = None
+    # File into which to export the frame latency histograms on exit
+    latency_report: Optional[Path] = None
     mdl = ObjectProperty(CameraStateProxy, rebind=True)
     selected = StringProperty("")
 
     async def app_main(self) -> None:
         self.driver = Driver(self)
-        await self.driver.main()
+        try:
+            await self.driver.main()
+        finally:
+            self.driver.report_latency(self.latency_report)
 
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
@@ -15,15 +15,22 @@
 # SPDX-License-Identifier: Apache-2.0
 import json
 from pathlib import Path
+from typing import Optional
 
+from kivy.graphics.texture import Texture
 from kivy.properties import BooleanProperty
+from kivy.properties import ListProperty
+from kivy.properties import NumericProperty
 from kivy.properties import ObjectProperty
 from kivy.properties import StringProperty
 from local_console.core.camera.axis_mapping import DEFAULT_ROI
 from local_console.core.camera.enums import DeploymentType
 from local_console.core.camera.enums import DeployStage
+from local_console.core.camera.enums import FramePolicy
 from local_console.core.camera.enums import OTAUpdateModule
 from local_console.core.camera.enums import StreamStatus
+from local_console.core.camera.enums import UploadMode
+from local_console.core.camera.preview import FramePixels
 from local_console.core.camera.state import CameraState
 from local_console.core.schemas.edge_cloud_if_v1 import DeviceConfiguration
 from local_console.gui.enums import ApplicationType
@@ -77,11 +84,39 @@ class CameraStateProxy(CameraStateProxyBase):
     deploy_operation = ObjectProperty(DeploymentType, allownone=True)
 
     stream_image = StringProperty("")
+    stream_overlay = ObjectProperty(None, allownone=True)
+    # Dispatched on every frame, even though the texture is reused
+    stream_texture = ObjectProperty(None, allownone=True, force_dispatch=True)
+    stream_view_size = ListProperty([0, 0])
     inference_field = StringProperty("")
 
+    frame_policy = StringProperty(FramePolicy.PROCESS_ALL.value)
+    frame_policy_nth = StringProperty("2")
+    upload_mode = StringProperty(UploadMode.ON_DISK.value)
+    frames_dropped = NumericProperty(0)
+    frames_orphaned = NumericProperty(0)
+    frame_latency = StringProperty("")
+
     size = StringProperty("100")
     unit = StringProperty("MB")
 
+    def push_frame(self, pixels: Optional[FramePixels]) -> None:
+        """
+        Frame sink of the streaming pipeline, which uploads the decoded
+        pixels into stream_texture. The texture is only reallocated when
+        the resolution of the frames changes.
+        """
+        if pixels is None:
+            return
+
+        texture = self.stream_texture
+        if texture is None or tuple(texture.size) != pixels.size:
+            texture = Texture.create(size=pixels.size, colorfmt="rgb")
+            # Rows are given from the top one
+            texture.flip_vertical()
+        texture.blit_buffer(pixels.data, colorfmt="rgb", bufferfmt="ubyte")
+        self.stream_texture = texture
+
     def bind_connections(self, camera_state: CameraState) -> None:
         self.bind_state_to_proxy("mqtt_host", camera_state)
         self.bind_state_to_proxy("mqtt_port", camera_state, str)
@@ -157,9 +192,27 @@ class CameraStateProxy(CameraStateProxyBase):
         self.bind_proxy_to_state("module_file", camera_state, Path)
 
     def bind_streaming_and_inference(self, camera_state: CameraState) -> None:
+        self.bind_state_to_proxy("stream_overlay", camera_state)
         self.bind_state_to_proxy("stream_image", camera_state)
+        camera_state.stream_pixels.subscribe(
+            lambda current, previous: self.push_frame(current)
+        )
+        camera_state.decode_stream_pixels = True
+        self.bind_proxy_to_state(
+            "stream_view_size", camera_state, lambda size: tuple(map(int, size))
+        )
         self.bind_state_to_proxy("inference_field", camera_state)
 
+        # Proxy->State because we want the user to set these values via the GUI
+        self.bind_proxy_to_state("frame_policy", camera_state)
+        self.bind_proxy_to_state("frame_policy_nth", camera_state)
+        self.bind_proxy_to_state("upload_mode", camera_state)
+
+        # State->Proxy because this is computed by the streaming pipeline
+        self.bind_state_to_proxy("frames_dropped", camera_state)
+        self.bind_state_to_proxy("frames_orphaned", camera_state)
+        self.bind_state_to_proxy("frame_latency", camera_state)
+
 
 # Listing of model properties to move over into this class. It is
 # derived from the result of the following command, running
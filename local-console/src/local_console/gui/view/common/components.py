@@ -16,6 +16,7 @@
 import enum
 import logging
 import re
+from collections import OrderedDict
 from math import fabs
 from pathlib import Path
 from typing import Any
@@ -23,10 +24,13 @@ from typing import Callable
 from typing import Optional
 
 from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
 from kivy.core.window import Window
 from kivy.event import EventDispatcher
 from kivy.graphics import Color
+from kivy.graphics import InstructionGroup
 from kivy.graphics import Line
+from kivy.graphics import Rectangle
 from kivy.graphics.texture import Texture
 from kivy.input import MotionEvent
 from kivy.properties import ListProperty
@@ -50,12 +54,18 @@ from local_console.core.camera.axis_mapping import get_dead_zone_within_image
 from local_console.core.camera.axis_mapping import get_dead_zone_within_widget
 from local_console.core.camera.axis_mapping import get_normalized_center_subregion
 from local_console.core.camera.axis_mapping import snap_point_in_deadzone
+from local_console.core.camera.enums import FramePolicy
+from local_console.core.camera.enums import UploadMode
+from local_console.gui.drawer.drawer import Overlay
 from local_console.gui.enums import ApplicationType
 from local_console.gui.enums import FirmwareType
 from local_console.gui.view.common.behaviors import HoverBehavior
 
 logger = logging.getLogger(__name__)
 
+# Captions hold a label and a rounded score, so that few distinct ones repeat
+MAX_CAPTION_TEXTURES = 512
+
 
 class GoHomeButton(MDButton):
     """
@@ -76,8 +86,14 @@ class ImageWithROI(Image, HoverBehavior):
     roi = ObjectProperty(DEFAULT_ROI)
     state = ObjectProperty(ROIState.Disabled)
 
+    # Drawings laid over the image, as an Overlay
+    overlay = ObjectProperty(None, allownone=True)
+    # Texture updated in place with each streamed frame
+    frame_texture = ObjectProperty(None, allownone=True, force_dispatch=True)
+
     # Widget configuration properties
     dead_zone_px = NumericProperty(20)
+    overlay_font_size = NumericProperty("12sp")
 
     def __init__(self, **kwargs: str) -> None:
         super().__init__(**kwargs)
@@ -93,6 +109,17 @@ class ImageWithROI(Image, HoverBehavior):
         self.nocache = True
         self._dead_zone_in_image: list[tuple[float, float]] = [(0, 0), (0, 0)]
         self._dead_zone_in_widget: list[tuple[float, float]] = [(0, 0), (0, 0)]
+        self._overlay_group = InstructionGroup()
+        self.canvas.after.add(self._overlay_group)
+        # Rendered captions by their text and font size, least recent first
+        self._caption_textures: OrderedDict[tuple[str, float], Texture] = OrderedDict()
+        self.bind(
+            overlay=self.refresh_overlay,
+            texture=self.refresh_overlay,
+            size=self.refresh_overlay,
+            pos=self.refresh_overlay,
+            overlay_font_size=self._on_overlay_font_size,
+        )
 
     def start_roi_draw(self) -> None:
         if self.state == ROIState.Disabled:
@@ -346,6 +373,78 @@ class ImageWithROI(Image, HoverBehavior):
         self._dead_zone_in_widget = dead_subregion_w
         self._dead_zone_in_image = dead_subregion_i
 
+    def on_frame_texture(self, _instance: Any, texture: Optional[Texture]) -> None:
+        if texture is None:
+            return
+        self.texture = texture
+        # Its contents may have changed even if it is the same texture
+        self.canvas.ask_update()
+
+    def refresh_overlay(self, *_args: Any) -> None:
+        """
+        Draws the overlay over the image as displayed, mapping
+        its pixel coordinates to the area the image is fit into.
+        """
+        group = self._overlay_group
+        group.clear()
+        overlay: Optional[Overlay] = self.overlay
+        if not overlay or not self.texture or not all(self.texture.size):
+            return
+
+        to_canvas = self.image_to_canvas
+        group.add(Color(1, 0, 0, 1))
+        for box in overlay.boxes:
+            x0, y0 = to_canvas(box.left, box.bottom)
+            x1, y1 = to_canvas(box.right, box.top)
+            group.add(Line(rectangle=[x0, y0, x1 - x0, y1 - y0], width=1))
+        for box in overlay.boxes:
+            if box.caption:
+                texture = self._caption_texture(box.caption)
+                self._add_caption(texture, to_canvas(box.left, box.top))
+
+        # Listed downwards from the top left corner, over a dark background
+        x, y = to_canvas(0, 0)
+        for caption in overlay.captions:
+            texture = self._caption_texture(caption)
+            y -= texture.height
+            group.add(Color(0, 0, 0, 1))
+            group.add(Rectangle(pos=(x, y), size=texture.size))
+            self._add_caption(texture, (x, y))
+
+    def image_to_canvas(self, x: float, y: float) -> tuple[float, float]:
+        """
+        Maps pixel coordinates of the image, from its top left corner,
+        to the canvas, where the image is centered and y points upwards.
+        """
+        image_width, image_height = self.norm_image_size
+        scale = image_width / self.texture.size[0]
+        return (
+            self.center_x + x * scale - image_width / 2,
+            self.center_y - y * scale + image_height / 2,
+        )
+
+    def _caption_texture(self, text: str) -> Texture:
+        key = (text, self.overlay_font_size)
+        texture = self._caption_textures.get(key)
+        if texture is not None:
+            self._caption_textures.move_to_end(key)
+            return texture
+
+        label = CoreLabel(text=text, font_size=self.overlay_font_size, padding=2)
+        label.refresh()
+        self._caption_textures[key] = label.texture
+        if len(self._caption_textures) > MAX_CAPTION_TEXTURES:
+            self._caption_textures.popitem(last=False)
+        return label.texture
+
+    def _on_overlay_font_size(self, *_args: Any) -> None:
+        self._caption_textures.clear()
+        self.refresh_overlay()
+
+    def _add_caption(self, texture: Texture, pos: tuple[float, float]) -> None:
+        self._overlay_group.add(Color(1, 1, 1, 1))
+        self._overlay_group.add(Rectangle(texture=texture, pos=pos, size=texture.size))
+
     def point_is_in_subregion(self, pos: tuple[int, int]) -> bool:
         if all(coord == 0 for axis in self._active_subregion for coord in axis):
             return False
@@ -672,6 +771,32 @@ class AppTypeCombo(MDBoxLayout):
         """
 
 
+class FramePolicyCombo(AppTypeCombo):
+    """
+    Widget group that provides user-friendly input
+    of the frame policy of the streaming pipeline
+    """
+
+    _factors = [
+        FramePolicy.PROCESS_ALL.value,
+        FramePolicy.LATEST_WINS.value,
+        FramePolicy.EVERY_NTH.value,
+    ]
+
+
+class UploadModeCombo(AppTypeCombo):
+    """
+    Widget group that provides user-friendly input
+    of how the streaming pipeline receives uploads
+    """
+
+    _factors = [
+        UploadMode.ON_DISK.value,
+        UploadMode.IN_MEMORY.value,
+        UploadMode.IN_MEMORY_ONLY.value,
+    ]
+
+
 class CodeInputCustom(CodeInput):
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
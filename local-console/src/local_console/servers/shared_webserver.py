@@ -0,0 +1,160 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import logging
+from collections.abc import AsyncIterator
+from collections.abc import Iterator
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+from typing import TypeVar
+from uuid import uuid4
+
+import trio
+from local_console.servers.webserver import AsyncWebserver
+from local_console.servers.webserver import DownloadCallback
+from local_console.servers.webserver import DownloadRoute
+from local_console.servers.webserver import Incoming
+from local_console.servers.webserver import split_target
+from local_console.servers.webserver import UploadRoute
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+DEVICE_SEGMENT = "dev"
+ARTIFACT_SEGMENT = "artifacts"
+
+
+class SharedWebserver(AsyncWebserver):
+    """
+    A single webserver multiplexed among all devices, so that they
+    do not each need a server (and a port) of their own.
+
+    Uploads are routed by path prefix: files PUT under the prefix
+    returned by register_device() are written into that device's
+    directory, and their paths are sent onto that device's channel.
+    Devices may instead get their uploads kept in memory, as with the
+    `in_memory` flag of AsyncWebserver.
+    Files to be deployed onto devices are served under the prefix
+    returned by publish(), for as long as they remain published.
+    """
+
+    def __init__(self, port: int = 0) -> None:
+        super().__init__(Path(), port)
+        self._devices: dict[str, UploadRoute] = {}
+        self._artifacts: dict[str, DownloadRoute] = {}
+
+    def register_device(
+        self,
+        key: str,
+        directory: Path,
+        incoming: Optional[trio.MemorySendChannel[Incoming]] = None,
+        in_memory: bool = False,
+    ) -> str:
+        """
+        Routes uploads under the returned path prefix into `directory`.
+        """
+        if key in self._devices:
+            raise ValueError(f"Device {key} is already registered")
+        self._devices[key] = (directory, incoming, in_memory)
+        logger.debug(f"Routing uploads of device {key} into {directory}")
+        return f"/{DEVICE_SEGMENT}/{key}"
+
+    def unregister_device(self, key: str) -> None:
+        self._devices.pop(key, None)
+
+    def set_in_memory(self, key: str, in_memory: bool) -> None:
+        directory, incoming, _ = self._devices[key]
+        self._devices[key] = (directory, incoming, in_memory)
+
+    def publish(
+        self, directory: Path, on_download: Optional[DownloadCallback] = None
+    ) -> str:
+        """
+        Serves the files in `directory` under the returned path prefix.
+        """
+        token = uuid4().hex
+        self._artifacts[token] = (directory, on_download)
+        logger.debug(f"Publishing {directory} under token {token}")
+        return f"/{ARTIFACT_SEGMENT}/{token}"
+
+    def unpublish(self, prefix: str) -> None:
+        self._artifacts.pop(prefix.rsplit("/", 1)[-1], None)
+
+    @contextmanager
+    def published(
+        self, directory: Path, on_download: Optional[DownloadCallback] = None
+    ) -> Iterator[str]:
+        prefix = self.publish(directory, on_download)
+        try:
+            yield prefix
+        finally:
+            self.unpublish(prefix)
+
+    @property
+    def devices(self) -> list[str]:
+        return list(self._devices)
+
+    def _route_upload(self, target: str) -> Optional[UploadRoute]:
+        route = _lookup(self._devices, DEVICE_SEGMENT, target)
+        if not route:
+            return None
+        (directory, incoming, in_memory), parts = route
+        return directory.joinpath(*parts), incoming, in_memory
+
+    def _route_download(self, target: str) -> Optional[DownloadRoute]:
+        route = _lookup(self._artifacts, ARTIFACT_SEGMENT, target)
+        if not route:
+            return None
+        (directory, on_download), parts = route
+        return directory.joinpath(*parts), on_download
+
+
+@asynccontextmanager
+async def serve_directory(
+    webserver: Optional[SharedWebserver],
+    directory: Path,
+    port: int,
+    on_download: Optional[DownloadCallback] = None,
+) -> AsyncIterator[tuple[int, str]]:
+    """
+    Serves the files in `directory` for a device to download, yielding
+    the port and path prefix to reach them at. The webserver shared among
+    devices is used, unless a specific port is requested.
+    """
+    if webserver and not port:
+        with webserver.published(directory, on_download) as prefix:
+            yield webserver.port, prefix
+    else:
+        async with AsyncWebserver(
+            directory, port, None, True, on_download=on_download
+        ) as server:
+            yield server.port, ""
+
+
+def _lookup(
+    routes: dict[str, R], segment: str, target: str
+) -> Optional[tuple[R, list[str]]]:
+    """
+    Finds the route of a target of the form /<segment>/<key>/<file path>,
+    along with the segments of the file path within it.
+    """
+    parts = split_target(target)
+    if not parts or len(parts) < 3 or parts[0] != segment:
+        return None
+    route = routes.get(parts[1])
+    return (route, parts[2:]) if route is not None else None
@@ -13,60 +13,446 @@
 # limitations under the License.
 #
 # SPDX-License-Identifier: Apache-2.0
+import http.client
 import http.server
+import io
 import logging
+import mimetypes
+import mmap
+import os
 import socketserver
 import threading
+import time
 from abc import ABC
 from abc import abstractmethod
+from collections.abc import AsyncIterator
+from collections.abc import Iterable
+from collections.abc import Iterator
 from collections.abc import Sequence
+from contextlib import AsyncExitStack
+from contextlib import suppress
+from dataclasses import dataclass
+from email.message import Message
+from email.utils import formatdate
+from http import HTTPStatus
 from pathlib import Path
+from pathlib import PurePosixPath
 from types import TracebackType
 from typing import Any
+from typing import BinaryIO
 from typing import Callable
+from typing import IO
 from typing import Optional
+from typing import Union
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+from uuid import uuid4
 
+import trio
 from local_console.utils.fstools import check_and_create_directory
+from trio import TASK_STATUS_IGNORED
 
 logger = logging.getLogger(__name__)
 
+# Size of the reads from sockets and files
+CHUNK_SIZE = 64 * 1024
+# Upper bound to the size of the request line and headers
+MAX_HEAD_SIZE = 64 * 1024
+# Upper bound to the size of the lines of a chunked transfer encoding
+MAX_LINE_SIZE = 1024
+# Seconds an idle persistent connection is kept open for
+KEEP_ALIVE_TIMEOUT = 30.0
+# Size of the file segments sent between download progress reports
+SENDFILE_CHUNK_SIZE = 1024 * 1024
+# Upper bound to the size of uploads received in memory
+MAX_MEMORY_UPLOAD_SIZE = 32 * 1024 * 1024
+# Zero-copy transfers are not available on all platforms (e.g. Windows)
+HAS_SENDFILE = hasattr(os, "sendfile")
+
+
+def _is_chunked(headers: Message) -> bool:
+    return "chunked" in headers.get("Transfer-Encoding", "").lower()
+
+
+def _content_length(headers: Message) -> int:
+    length = headers["Content-Length"]
+    if length is None:
+        raise ValueError("Request has no Content-Length")
+    return int(length)
+
+
+def _parse_chunk_size(line: bytes) -> int:
+    """
+    Parses the size line that precedes each chunk of a chunked
+    transfer encoding, ignoring any chunk extensions.
+    """
+    if not line.endswith(b"\n"):
+        raise ValueError("Malformed chunk size line")
+    return int(line.split(b";", 1)[0].strip(), 16)
+
+
+def _iter_exactly(rfile: BinaryIO, size: int) -> Iterator[bytes]:
+    while size > 0:
+        chunk = rfile.read(min(size, CHUNK_SIZE))
+        if not chunk:
+            raise ValueError("Connection closed before the end of the body")
+        size -= len(chunk)
+        yield chunk
+
+
+def _partial_path(dest_path: Path) -> Path:
+    """
+    Returns the path at which an upload is written to, before being
+    renamed into its destination once complete. It is hidden, and
+    unique for concurrent uploads onto the same destination.
+    """
+    return dest_path.with_name(f".{dest_path.name}.{uuid4().hex}.part")
+
+
+def _write_atomically(dest_path: Path, chunks: Iterable[bytes]) -> int:
+    """
+    Writes the data chunks into a partial file, which is then renamed
+    into `dest_path`, so that the file never appears incomplete at
+    that path. Returns the amount of bytes written.
+    """
+    partial_path = _partial_path(dest_path)
+    size = 0
+    try:
+        with partial_path.open("wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(partial_path, dest_path)
+    finally:
+        partial_path.unlink(missing_ok=True)
+    return size
+
+
+class BodyTooLarge(ValueError):
+    """
+    Conveys that a request body exceeds the size it may have
+    """
+
+
+class InvalidTarget(ValueError):
+    """
+    Conveys that a request target does not map onto a file that may be written
+    """
+
+
+def upload_error_status(error: Exception) -> HTTPStatus:
+    """
+    Status to reply with to an upload that failed with `error`
+    """
+    if isinstance(error, BodyTooLarge):
+        return HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    if isinstance(error, InvalidTarget):
+        return HTTPStatus.FORBIDDEN
+    if isinstance(error, ValueError):
+        # Malformed or truncated request
+        return HTTPStatus.BAD_REQUEST
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+class RangeNotSatisfiable(Exception):
+    """
+    Conveys that the byte range requested lies outside the file
+    """
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Parses a `Range` request header into the [start, end) interval of
+    the file that must be sent. Returns None when the whole file must be
+    sent, which is the case when there is no header, or when it is not a
+    single byte range (as serving the whole file is a valid response).
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header.removeprefix("bytes=").strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, _, last = (part.strip() for part in spec.partition("-"))
+    try:
+        if not first:
+            # Suffix range, i.e. the last N bytes
+            start, end = max(size - int(last), 0), size
+        else:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+    except ValueError:
+        return None
+
+    if start >= size or start >= end:
+        raise RangeNotSatisfiable(f"Range {header} is outside of {size} bytes")
+    return start, end
+
+
+@dataclass(frozen=True)
+class DownloadProgress:
+    """
+    Progress of a file being served to a client, as reported to the
+    `on_download` callback of the webservers.
+    """
+
+    path: Path
+    # Offset of the file up to which it has been sent
+    position: int
+    # Size of the file
+    total: int
+    # Bytes sent in the current request, which may have started mid-file
+    transferred: int
+    # Seconds since the current request started
+    elapsed: float
+
+    @property
+    def percentage(self) -> int:
+        return 100 * self.position // self.total if self.total else 100
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second sent in the current request
+        """
+        return self.transferred / self.elapsed if self.elapsed > 0 else 0.0
+
+
+@dataclass(frozen=True)
+class InMemoryUpload:
+    """
+    An upload whose body is handed over as received, instead of being
+    written to `path`. Whether it gets written, and where, is up to
+    the receiver.
+    """
+
+    path: Path
+    data: bytes
+
+
+# Notifications of received uploads: either the path of the written
+# file, or the upload itself, when it is kept in memory.
+Incoming = Union[Path, InMemoryUpload]
+DownloadCallback = Callable[[DownloadProgress], None]
+# File to write an upload into, the channel to notify of it, and
+# whether it should be kept in memory instead of being written
+UploadRoute = tuple[Path, Optional[trio.MemorySendChannel[Incoming]], bool]
+# File to send for a download, and the callback to report its progress to
+DownloadRoute = tuple[Path, Optional[DownloadCallback]]
+
+
+class _DownloadTracker:
+    def __init__(
+        self, path: Path, start: int, total: int, callback: Optional[DownloadCallback]
+    ) -> None:
+        self.path = path
+        self.start = start
+        self.total = total
+        self.callback = callback
+        self.started_at = time.monotonic()
+
+    def report(self, position: int) -> None:
+        if not self.callback:
+            return
+        try:
+            self.callback(
+                DownloadProgress(
+                    self.path,
+                    position,
+                    self.total,
+                    position - self.start,
+                    time.monotonic() - self.started_at,
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error while reporting download progress: {e}")
+
+
+def log_download_progress(progress: DownloadProgress) -> None:
+    """
+    Convenience download callback for logging the progress
+    """
+    message = (
+        f"Served {progress.position}/{progress.total} bytes of "
+        f"{progress.path.name} at {progress.throughput / 1e6:.2f} MB/s"
+    )
+    if progress.position == progress.total:
+        logger.info(message)
+    else:
+        logger.debug(message)
+
+
+class ConnectionStats:
+    """
+    Counts the connections accepted by a webserver and the requests
+    served over them, so that reuse of persistent connections by the
+    clients can be confirmed. It is safe to update from many threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def request_served(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def requests_per_connection(self) -> float:
+        with self._lock:
+            return self.requests / self.connections if self.connections else 0.0
+
 
 class ThreadedHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
-    pass
+    # Do not wait for idle persistent connections when closing the server
+    daemon_threads = True
+    block_on_close = False
 
 
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Enables persistent connections
+    protocol_version = "HTTP/1.1"
+    # Idle persistent connections get closed after this many seconds
+    timeout = KEEP_ALIVE_TIMEOUT
+
     def __init__(
-        self, *args: Any, on_incoming: Optional[Callable] = None, **kwargs: Any
+        self,
+        *args: Any,
+        on_incoming: Optional[Callable] = None,
+        stats: Optional[ConnectionStats] = None,
+        on_download: Optional[DownloadCallback] = None,
+        **kwargs: Any,
     ):
         self.on_incoming = on_incoming
+        self.stats = stats or ConnectionStats()
+        self.on_download = on_download
+        self.requests_served = 0
         super().__init__(*args, **kwargs)
 
     def log_message(self, _format: str, *args: Sequence[str]) -> None:
         logger.debug(" ".join(str(arg) for arg in args))
 
+    def setup(self) -> None:
+        super().setup()
+        self.stats.connection_opened()
+
+    def parse_request(self) -> bool:
+        self.requests_served += 1
+        self.stats.request_served()
+        return super().parse_request()
+
+    def finish(self) -> None:
+        super().finish()
+        logger.debug(
+            f"Connection from {self.client_address[0]} closed "
+            f"after {self.requests_served} requests"
+        )
+
+    def do_GET(self) -> None:
+        file_path = Path(self.translate_path(self.path))
+        if file_path.is_file():
+            self._send_file(file_path, head_only=False)
+        else:
+            super().do_GET()
+
+    def do_HEAD(self) -> None:
+        file_path = Path(self.translate_path(self.path))
+        if file_path.is_file():
+            self._send_file(file_path, head_only=True)
+        else:
+            super().do_HEAD()
+
+    def _send_file(self, file_path: Path, head_only: bool) -> None:
+        """
+        Serves a file, or the byte range of it requested by the client,
+        copying the data from the file into the socket within the kernel.
+        """
+        try:
+            f = file_path.open("rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            try:
+                byte_range = parse_range(self.headers["Range"], size)
+            except RangeNotSatisfiable:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start, end = byte_range or (0, size)
+            if byte_range:
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+            else:
+                self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", self.guess_type(str(file_path)))
+            self.send_header("Content-Length", str(end - start))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            if head_only:
+                return
+
+            tracker = _DownloadTracker(file_path, start, size, self.on_download)
+            position = start
+            while position < end:
+                count = min(end - position, SENDFILE_CHUNK_SIZE)
+                sent = self.connection.sendfile(f, position, count)
+                if not sent:
+                    raise ValueError(f"File {file_path} got truncated while serving")
+                position += sent
+                tracker.report(position)
+
     def do_PUT(self) -> None:
-        data: Optional[bytes] = None
+        size = 0
+        status = HTTPStatus.OK
         try:
-            content_length = int(self.headers["Content-Length"])
-            data = self.rfile.read(content_length)
             check_and_create_directory(Path(self.directory))
             dest_path = Path(self.directory) / self.path.lstrip("/")
             self.log_message("", f"Webserver dest_path: {str(dest_path)}")
-            dest_path.write_bytes(data)
+            size = _write_atomically(dest_path, self._iter_body())
         except Exception as e:
             logger.error(f"Error while receiving data: {e}")
-        finally:
-            self.send_response(200)
-            self.end_headers()
+            status = upload_error_status(e)
+            # The rest of the body may be pending, so the connection is unusable
+            self.close_connection = True
 
-        # Notify of new file when the callback is set
-        if data and self.on_incoming:
+        # Notify of new file when the callback is set. This happens before
+        # responding, so that a slow consumer throttles the uploader.
+        if size and self.on_incoming:
             try:
                 self.on_incoming(dest_path)
             except Exception as e:
                 logger.error(f"Error while invoking callback: {e}")
 
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _iter_body(self) -> Iterator[bytes]:
+        """
+        Yields the request body in chunks of at most CHUNK_SIZE bytes,
+        for either a sized or a chunked transfer encoding.
+        """
+        if _is_chunked(self.headers):
+            while size := _parse_chunk_size(self.rfile.readline(MAX_LINE_SIZE)):
+                yield from _iter_exactly(self.rfile, size)
+                self.rfile.readline(MAX_LINE_SIZE)
+            # Skip the trailer section
+            while self.rfile.readline(MAX_LINE_SIZE).strip():
+                pass
+        else:
+            yield from _iter_exactly(self.rfile, _content_length(self.headers))
+
     do_POST = do_PUT
 
 
@@ -134,14 +520,22 @@ class SyncWebserver(GenericWebserver):
         port: int = 0,
         on_incoming: Optional[Callable] = None,
         deploy: bool = True,
+        on_download: Optional[DownloadCallback] = None,
     ) -> None:
         super().__init__(port, deploy)
         self.dir = directory
         self.on_incoming = on_incoming
+        self.on_download = on_download
+        self.stats = ConnectionStats()
 
     def handler(self, *args: Any, **kwargs: Any) -> CustomHTTPRequestHandler:
         return CustomHTTPRequestHandler(
-            *args, on_incoming=self.on_incoming, directory=str(self.dir), **kwargs
+            *args,
+            on_incoming=self.on_incoming,
+            stats=self.stats,
+            on_download=self.on_download,
+            directory=str(self.dir),
+            **kwargs,
         )
 
     def set_directory(self, directory: Path) -> None:
@@ -149,15 +543,61 @@ class SyncWebserver(GenericWebserver):
         self.dir = directory
 
 
-class AsyncWebserver(SyncWebserver):
+class AsyncWebserver:
     """
-    This class wraps the synchronous context manager methods
-    from SyncWebserver, as they are not really blocking. This
-    enables managing the webserver from async contexts.
+    HTTP file server running on Trio sockets, so that each connection
+    is served by a Trio task instead of an OS thread. It supports the
+    same GET and PUT operations as SyncWebserver.
+
+    It can be used as an async context manager, which runs the server
+    within its own nursery, or be started into an existing nursery by
+    means of its serve() method. Paths of uploaded files are sent onto
+    the `incoming` memory channel, when given. If `in_memory` is set,
+    uploads are not written, but sent as InMemoryUpload instances. The
+    progress of file downloads is reported to the `on_download` callback,
+    when given.
     """
 
-    async def __aenter__(self) -> "GenericWebserver":
-        return self.__enter__()
+    def __init__(
+        self,
+        directory: Path,
+        port: int = 0,
+        incoming: Optional[trio.MemorySendChannel[Incoming]] = None,
+        deploy: bool = True,
+        on_download: Optional[DownloadCallback] = None,
+        in_memory: bool = False,
+    ) -> None:
+        self.dir = directory
+        self.port = port
+        self.incoming = incoming
+        self.deploy = deploy
+        self.on_download = on_download
+        self.in_memory = in_memory
+        self.stats = ConnectionStats()
+        self._exit_stack = AsyncExitStack()
+
+    def set_directory(self, directory: Path) -> None:
+        assert directory.is_dir()
+        self.dir = directory
+
+    async def serve(self, *, task_status: Any = TASK_STATUS_IGNORED) -> None:
+        """
+        Listens for connections until cancelled. The port is known
+        once this task has signaled it has started.
+        """
+        listeners = await trio.open_tcp_listeners(self.port, host="0.0.0.0")
+        self.port = listeners[0].socket.getsockname()[1]
+        logger.debug("Serving at port %d", self.port)
+        async with trio.open_nursery() as nursery:
+            await nursery.start(trio.serve_listeners, self._serve_connection, listeners)
+            task_status.started()
+
+    async def __aenter__(self) -> "AsyncWebserver":
+        if self.deploy:
+            nursery = await self._exit_stack.enter_async_context(trio.open_nursery())
+            self._exit_stack.callback(nursery.cancel_scope.cancel)
+            await nursery.start(self.serve)
+        return self
 
     async def __aexit__(
         self,
@@ -165,4 +605,369 @@ class AsyncWebserver(SyncWebserver):
         exc_val: Optional[BaseException],
         exc_tb: Optional[TracebackType],
     ) -> None:
-        return self.__exit__(exc_type, exc_val, exc_tb)
+        if self.deploy:
+            logger.debug("Closing webserver at port %d", self.port)
+        await self._exit_stack.aclose()
+
+    async def _serve_connection(self, stream: trio.SocketStream) -> None:
+        self.stats.connection_opened()
+        reader = _RequestReader(stream)
+        requests_served = 0
+        async with stream:
+            try:
+                keep_alive = True
+                while keep_alive:
+                    request = None
+                    with trio.move_on_after(KEEP_ALIVE_TIMEOUT):
+                        request = await reader.receive_head()
+                    if request is None:
+                        # Either closed by the client, or idle for too long
+                        break
+                    requests_served += 1
+                    self.stats.request_served()
+                    keep_alive = await self._handle_request(reader, stream, *request)
+            except (trio.BrokenResourceError, trio.ClosedResourceError):
+                logger.debug("Connection closed by the client")
+            except Exception as e:
+                logger.error(f"Error while serving request: {e}")
+        logger.debug(f"Connection closed after {requests_served} requests")
+
+    async def _handle_request(
+        self,
+        reader: "_RequestReader",
+        stream: trio.SocketStream,
+        method: str,
+        target: str,
+        version: str,
+        headers: Message,
+    ) -> bool:
+        """
+        Serves a request, returning whether the connection may be
+        kept open for further requests.
+        """
+        logger.debug(f"{method} {target}")
+        keep_alive = _wants_keep_alive(version, headers)
+        if method in ("PUT", "POST"):
+            status = HTTPStatus.OK
+            try:
+                incoming, received = await self._receive_upload(reader, target, headers)
+                # Notifying before responding throttles the uploader
+                if incoming and received:
+                    await _notify_incoming(incoming, received)
+            except Exception as e:
+                logger.error(f"Error while receiving data: {e}")
+                status = upload_error_status(e)
+                # The rest of the body may be pending, so the connection is unusable
+                keep_alive = False
+            await _send_response(stream, status, keep_alive=keep_alive)
+        elif method in ("GET", "HEAD"):
+            await self._send_file(stream, target, headers, method == "HEAD", keep_alive)
+        else:
+            keep_alive = False
+            await _send_response(
+                stream, HTTPStatus.NOT_IMPLEMENTED, keep_alive=keep_alive
+            )
+        return keep_alive
+
+    def _route_upload(self, target: str) -> Optional[UploadRoute]:
+        """
+        Maps the target of an upload onto the file it must be written
+        to, the channel to notify of it, and whether to keep it in memory.
+        Returns None if the target is not valid.
+        """
+        dest_path = _translate_path(self.dir, target)
+        return (dest_path, self.incoming, self.in_memory) if dest_path else None
+
+    def _route_download(self, target: str) -> Optional[DownloadRoute]:
+        """
+        Maps the target of a download onto the file to be sent, and
+        the callback for reporting progress. Returns None if the target
+        is not valid.
+        """
+        file_path = _translate_path(self.dir, target)
+        return (file_path, self.on_download) if file_path else None
+
+    async def _receive_upload(
+        self, reader: "_RequestReader", target: str, headers: Message
+    ) -> tuple[Optional[trio.MemorySendChannel[Incoming]], Optional[Incoming]]:
+        """
+        Receives the body of an upload, returning the channel to notify
+        of it, and the notification. The latter is None for empty bodies.
+        """
+        route = self._route_upload(target)
+        if not route:
+            raise InvalidTarget(f"Invalid upload path {target}")
+        dest_path, incoming, in_memory = route
+        if in_memory:
+            data = await reader.receive_body(headers, MAX_MEMORY_UPLOAD_SIZE)
+            return incoming, InMemoryUpload(dest_path, data) if data else None
+
+        check_and_create_directory(dest_path.parent)
+        logger.debug(f"Webserver dest_path: {str(dest_path)}")
+        size = await self._write_atomically(dest_path, reader.iter_body(headers))
+        return incoming, dest_path if size else None
+
+    async def _write_atomically(
+        self, dest_path: Path, chunks: AsyncIterator[bytes]
+    ) -> int:
+        """
+        Async counterpart of _write_atomically(), so that the body
+        is never held in memory as a whole.
+        """
+        partial_path = trio.Path(_partial_path(dest_path))
+        size = 0
+        try:
+            async with await partial_path.open("wb") as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+                    size += len(chunk)
+            await partial_path.replace(dest_path)
+        finally:
+            with suppress(FileNotFoundError):
+                await partial_path.unlink()
+        return size
+
+    async def _send_file(
+        self,
+        stream: trio.SocketStream,
+        target: str,
+        headers: Message,
+        head_only: bool,
+        keep_alive: bool,
+    ) -> None:
+        """
+        Serves a file, or the byte range of it requested by the client.
+        """
+        route = self._route_download(target)
+        if not route or not route[0].is_file():
+            await _send_response(stream, HTTPStatus.NOT_FOUND, keep_alive=keep_alive)
+            return
+
+        file_path, on_download = route
+
+        f = await trio.to_thread.run_sync(file_path.open, "rb")
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            try:
+                byte_range = parse_range(headers["Range"], size)
+            except RangeNotSatisfiable:
+                await _send_response(
+                    stream,
+                    HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                    headers={"Content-Range": f"bytes */{size}"},
+                    keep_alive=keep_alive,
+                )
+                return
+
+            start, end = byte_range or (0, size)
+            content_type = mimetypes.guess_type(file_path.name)[0]
+            response_headers = {
+                "Content-Type": content_type or "application/octet-stream",
+                "Accept-Ranges": "bytes",
+            }
+            status = HTTPStatus.OK
+            if byte_range:
+                status = HTTPStatus.PARTIAL_CONTENT
+                response_headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+            await _send_response(
+                stream, status, end - start, response_headers, keep_alive
+            )
+            if head_only:
+                return
+
+            tracker = _DownloadTracker(file_path, start, size, on_download)
+            if HAS_SENDFILE:
+                await _sendfile(stream, f, start, end, tracker)
+            else:
+                await _send_mapped(stream, f, start, end, tracker)
+
+
+async def _sendfile(
+    stream: trio.SocketStream,
+    f: IO[bytes],
+    start: int,
+    end: int,
+    tracker: _DownloadTracker,
+) -> None:
+    """
+    Copies the file into the socket within the kernel. The copy is
+    done in a worker thread, as reading the file may block, and the
+    Trio thread is shared with the GUI.
+    """
+    sock_fd = stream.socket.fileno()
+    position = start
+    while position < end:
+        await trio.lowlevel.wait_writable(sock_fd)
+        count = min(end - position, SENDFILE_CHUNK_SIZE)
+        try:
+            sent = await trio.to_thread.run_sync(
+                os.sendfile, sock_fd, f.fileno(), position, count
+            )
+        except BlockingIOError:
+            continue
+        if not sent:
+            raise ValueError(f"File {tracker.path} got truncated while serving")
+        position += sent
+        tracker.report(position)
+
+
+async def _send_mapped(
+    stream: trio.SocketStream,
+    f: IO[bytes],
+    start: int,
+    end: int,
+    tracker: _DownloadTracker,
+) -> None:
+    """
+    Fallback for platforms without sendfile, which sends the file from a
+    memory mapping of it, avoiding copies into intermediate buffers.
+    """
+    with (
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+        memoryview(mapped) as view,
+    ):
+        position = start
+        while position < end:
+            count = min(end - position, SENDFILE_CHUNK_SIZE)
+            with view[position : position + count] as segment:
+                await stream.send_all(segment)
+            position += count
+            tracker.report(position)
+
+
+class _RequestReader:
+    """
+    Buffers the bytes received from a connection, for parsing
+    the HTTP requests sent over it.
+    """
+
+    def __init__(self, stream: trio.abc.ReceiveStream) -> None:
+        self._stream = stream
+        self._buffer = bytearray()
+
+    async def _fill(self) -> bool:
+        data = await self._stream.receive_some(CHUNK_SIZE)
+        self._buffer += data
+        return bool(data)
+
+    async def receive_head(self) -> Optional[tuple[str, str, str, Message]]:
+        """
+        Returns the method, target, HTTP version and headers of the next
+        request, or None if the connection gets closed before it starts.
+        """
+        while (end := self._buffer.find(b"\r\n\r\n")) < 0:
+            if len(self._buffer) > MAX_HEAD_SIZE:
+                raise ValueError("Request head is too large")
+            if not await self._fill():
+                if self._buffer:
+                    raise ValueError("Connection closed within request head")
+                return None
+
+        head = bytes(self._buffer[: end + 4])
+        del self._buffer[: end + 4]
+        request_line, _, header_lines = head.partition(b"\r\n")
+        method, target, version = request_line.decode("latin-1").split()
+        headers = http.client.parse_headers(io.BytesIO(header_lines))
+        return method, target, version, headers
+
+    async def receive_line(self) -> bytes:
+        while (end := self._buffer.find(b"\n")) < 0:
+            if len(self._buffer) > MAX_LINE_SIZE:
+                raise ValueError("Line is too long")
+            if not await self._fill():
+                raise ValueError("Connection closed within a line")
+        line = bytes(self._buffer[: end + 1])
+        del self._buffer[: end + 1]
+        return line
+
+    async def iter_exactly(self, size: int) -> AsyncIterator[bytes]:
+        while size > 0:
+            if not self._buffer and not await self._fill():
+                raise ValueError("Connection closed before the end of the body")
+            chunk = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            size -= len(chunk)
+            yield chunk
+
+    async def iter_body(self, headers: Message) -> AsyncIterator[bytes]:
+        """
+        Yields the request body in chunks of at most CHUNK_SIZE bytes,
+        for either a sized or a chunked transfer encoding.
+        """
+        if _is_chunked(headers):
+            while size := _parse_chunk_size(await self.receive_line()):
+                async for chunk in self.iter_exactly(size):
+                    yield chunk
+                await self.receive_line()
+            # Skip the trailer section
+            while (await self.receive_line()).strip():
+                pass
+        else:
+            async for chunk in self.iter_exactly(_content_length(headers)):
+                yield chunk
+
+    async def receive_body(self, headers: Message, max_size: int) -> bytes:
+        """
+        Returns the request body as a whole, as long as it does not
+        exceed `max_size` bytes.
+        """
+        body = bytearray()
+        async for chunk in self.iter_body(headers):
+            body += chunk
+            if len(body) > max_size:
+                raise BodyTooLarge(f"Body exceeds {max_size} bytes")
+        return bytes(body)
+
+
+def _wants_keep_alive(version: str, headers: Message) -> bool:
+    connection = headers.get("Connection", "").lower()
+    if version == "HTTP/1.1":
+        return connection != "close"
+    return connection == "keep-alive"
+
+
+async def _send_response(
+    stream: trio.SocketStream,
+    status: HTTPStatus,
+    content_length: int = 0,
+    headers: Optional[dict[str, str]] = None,
+    keep_alive: bool = False,
+) -> None:
+    lines = [
+        f"HTTP/1.1 {status.value} {status.phrase}",
+        f"Date: {formatdate(usegmt=True)}",
+        f"Content-Length: {content_length}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+    await stream.send_all(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+
+async def _notify_incoming(
+    incoming: trio.MemorySendChannel[Incoming], received: Incoming
+) -> None:
+    try:
+        await incoming.send(received)
+    except (trio.BrokenResourceError, trio.ClosedResourceError):
+        logger.debug(f"Incoming channel is closed. Dropping {received}")
+
+
+def split_target(target: str) -> Optional[list[str]]:
+    """
+    Splits the path of a request target into its segments, returning
+    None if there are none, or if any would refer to a parent directory.
+    """
+    url_path = unquote(urlsplit(target).path)
+    parts = [part for part in PurePosixPath(url_path).parts if part != "/"]
+    if not parts or any(part in (".", "..") for part in parts):
+        return None
+    return parts
+
+
+def _translate_path(root: Path, target: str) -> Optional[Path]:
+    """
+    Maps a request target onto a file under `root`, returning
+    None if the target would escape that directory.
+    """
+    parts = split_target(target)
+    return root.joinpath(*parts) if parts else None
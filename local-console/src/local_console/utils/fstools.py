@@ -15,15 +15,33 @@
 # SPDX-License-Identifier: Apache-2.0
 import contextlib
 import enum
+import itertools
 import logging
+import math
 import os
+import posixpath
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable
 from collections.abc import Iterator
 from dataclasses import dataclass
+from dataclasses import field
+from datetime import timedelta
 from pathlib import Path
 from typing import Callable
 from typing import Optional
 
+from sortedcontainers import SortedDict
 from watchdog.events import DirDeletedEvent
+from watchdog.events import EVENT_TYPE_CLOSED
+from watchdog.events import EVENT_TYPE_CREATED
+from watchdog.events import EVENT_TYPE_DELETED
+from watchdog.events import EVENT_TYPE_MODIFIED
+from watchdog.events import EVENT_TYPE_MOVED
+from watchdog.events import FileSystemEvent
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 from watchdog.observers.api import ObservedWatch
@@ -31,25 +49,195 @@ from watchdog.observers.api import ObservedWatch
 
 logger = logging.getLogger(__name__)
 
+# Kept in a subdirectory, so that saving it does not modify the watched one
+INDEX_DIR_NAME = ".local_console"
+INDEX_FILE_NAME = "storage_index.sqlite"
+INDEX_VERSION = 1
+
 
 @dataclass
 class FileInfo:
     age: int
     path: Path
     size: int
+    # Modification time last seen, which follows rewrites in place while
+    # the age is kept, so that they do not reorder the entry
+    mtime: int = -1
+
+    def __post_init__(self) -> None:
+        if self.mtime < 0:
+            self.mtime = self.age
 
 
 class WatchException(Exception):
     pass
 
 
+@dataclass
+class RetentionPolicy:
+    """
+    Limits on the files kept by a StorageSizeWatcher, whose oldest files
+    are pruned while any of them is exceeded. None means no limit.
+    """
+
+    max_bytes: Optional[int] = None
+    max_files: Optional[int] = None
+    max_age: Optional[timedelta] = None
+
+
+@dataclass
+class DeletionReport:
+    """
+    Outcome of a batch of deletions made by a BackgroundDeleter
+    """
+
+    deleted: int = 0
+    # Already removed by someone else
+    missing: int = 0
+    # Rewritten since being pruned, so kept and tracked again
+    replaced: int = 0
+    failed: list[tuple[Path, OSError]] = field(default_factory=list)
+    pending: int = 0
+
+
+OnDeletionReportCallable = Callable[[DeletionReport], None]
+OnReplacedCallable = Callable[[list[FileInfo]], None]
+
+
+def delete_entry(entry: FileInfo) -> Optional[bool]:
+    """
+    Deletes the file of a pruned entry, unless it has been written anew
+    since, as its name may be reused. Returns whether it was deleted, or
+    None if it was already removed.
+    """
+    try:
+        if os.stat(entry.path).st_mtime_ns != entry.mtime:
+            return False
+        entry.path.unlink()
+        return True
+    except FileNotFoundError:
+        logger.warning(f"File {entry.path} was already removed")
+        return None
+
+
+class BackgroundDeleter:
+    """
+    Deletes the files pruned by a StorageSizeWatcher in a worker thread,
+    so that pruning never blocks on the filesystem. Files are taken from
+    the queue in batches, after each of which a report is issued. Files
+    written anew since being pruned are kept, and handed to the
+    `on_replaced` callback given along with them.
+    """
+
+    def __init__(
+        self,
+        on_report: Optional[OnDeletionReportCallable] = None,
+        batch_size: int = 256,
+    ) -> None:
+        self.on_report = on_report
+        self.batch_size = batch_size
+        self._queue: queue.Queue[Optional[tuple[FileInfo, OnReplacedCallable]]] = (
+            queue.Queue()
+        )
+        self._pending: set[Path] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def delete(
+        self,
+        entries: list[FileInfo],
+        on_replaced: OnReplacedCallable = lambda entries: None,
+    ) -> None:
+        if not entries:
+            return
+
+        with self._lock:
+            self._pending.update(entry.path for entry in entries)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="BackgroundDeleter", daemon=True
+                )
+                self._thread.start()
+        for entry in entries:
+            self._queue.put((entry, on_replaced))
+
+    def is_pending(self, path: Path) -> bool:
+        with self._lock:
+            return path in self._pending
+
+    def flush(self) -> None:
+        """
+        Blocks until all queued files have been processed.
+        """
+        self._queue.join()
+
+    def stop(self) -> None:
+        """
+        Processes the files already queued, then stops the worker thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self) -> None:
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            items = [item for item in batch if item is not None]
+            running = len(items) == len(batch)
+            if items:
+                self._delete_batch(items)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _delete_batch(self, items: list[tuple[FileInfo, OnReplacedCallable]]) -> None:
+        report = DeletionReport()
+        replaced: dict[OnReplacedCallable, list[FileInfo]] = defaultdict(list)
+        for entry, on_replaced in items:
+            try:
+                deleted = delete_entry(entry)
+            except OSError as e:
+                logger.warning(f"Could not delete {entry.path}: {e}")
+                report.failed.append((entry.path, e))
+                continue
+            if deleted is None:
+                report.missing += 1
+            elif deleted:
+                report.deleted += 1
+            else:
+                report.replaced += 1
+                replaced[on_replaced].append(entry)
+
+        with self._lock:
+            self._pending.difference_update(entry.path for entry, _ in items)
+        # Once no longer pending, so that they are not skipped
+        for on_replaced, entries in replaced.items():
+            on_replaced(entries)
+        report.pending = self._queue.qsize()
+        logger.debug(f"Deletion batch done: {report}")
+        if self.on_report:
+            self.on_report(report)
+
+
 class StorageSizeWatcher:
     class State(enum.Enum):
         Start = enum.auto()
         Accumulating = enum.auto()
         Checking = enum.auto()
 
-    def __init__(self, check_frequency: int = 50) -> None:
+    def __init__(
+        self,
+        check_frequency: Optional[int] = 50,
+        deleter: Optional[BackgroundDeleter] = None,
+    ) -> None:
         """
         Class for watching a directory for incoming files while maintaining
         the total storage usage within the directory under a given limit size,
@@ -57,165 +245,438 @@ class StorageSizeWatcher:
 
         Bookkeeping is made in-memory for it to remain fast, however consistency
         is checked against the filesystem once every given number of incoming
-        files.
+        files. Entries are kept sorted by age, and indexed by path, so that
+        registering, unregistering, updating and pruning files take
+        logarithmic time regardless of how many files are kept.
+
+        When filesystem events are fed through `on_file_event`, the
+        bookkeeping is kept up to date incrementally, so the periodic check
+        can be disabled and replaced by an occasional `reconcile`.
+
+        This class is thread-safe. Its lock only guards the bookkeeping,
+        while filesystem operations such as getting file stats, scanning
+        directories and deleting files are made without holding it, so
+        that files keep being registered from several threads while
+        pruning or a reconciliation (the Checking state) is in progress.
 
         Args:
-                check_frequency (int, optional): check consistency after this many new files. Defaults to 50.
+                check_frequency (int, optional): check consistency after this many new files. Defaults to 50. None disables the check.
+                deleter (BackgroundDeleter, optional): deletes the pruned files in the background, instead of right away.
         """
         self.check_frequency = check_frequency
+        self.deleter = deleter
+        self._lock = threading.RLock()
         self._paths: set[Path] = set()
+        # Watched directories as they were given, by their resolved path
+        self._roots: dict[Path, Path] = {}
         self.state = self.State.Start
-        self._size_limit: Optional[int] = None
-        self.content: list[FileInfo] = []
+        self.policy = RetentionPolicy()
+        # Entries keyed by (age, sequence number), the latter breaking ties
+        self._by_age: SortedDict = SortedDict()
+        self._keys: dict[Path, tuple[int, int]] = {}
+        self._sequence = itertools.count()
         self.storage_usage = 0
-        self._remaining_before_check = self.check_frequency
+        self._remaining_before_check = self.check_frequency or 0
 
     def set_path(self, path: Path) -> None:
         assert path.is_dir()
 
         p = path.resolve()
-        if p in self._paths:
-            return
-        self._paths.add(p)
+        with self._lock:
+            if p in self._paths:
+                return
+            self._paths.add(p)
+            self._roots[p] = path
 
         # Execute regardless of current state
         self._build_content_list(path)
 
     def unwatch_path(self, path: Path) -> None:
         assert path.is_dir()
-        self._paths.discard(path.resolve())
+        p = path.resolve()
+        with self._lock:
+            self._paths.discard(p)
+            root = self._roots.pop(p, None)
+        if root:
+            self.save_index(root)
 
     def set_storage_limit(self, limit: int) -> None:
         logger.debug(f"Setting storage limit to {limit} bytes")
         assert limit >= 0
 
-        self._size_limit = limit
-        if self.state == self.State.Accumulating:
-            self._prune()
+        with self._lock:
+            self.policy.max_bytes = limit
+        self._prune()
+
+    def set_file_limit(self, limit: Optional[int]) -> None:
+        logger.debug(f"Setting file count limit to {limit}")
+        assert limit is None or limit >= 0
+
+        with self._lock:
+            self.policy.max_files = limit
+        self._prune()
+
+    def set_age_limit(self, limit: Optional[timedelta]) -> None:
+        logger.debug(f"Setting file age limit to {limit}")
+        with self._lock:
+            self.policy.max_age = limit
+        self._prune()
+
+    def apply_retention(self) -> None:
+        """
+        Prunes the files that exceed the policy, which only happens without
+        new files arriving when files get older than the age limit.
+        """
+        self._prune()
+
+    def evict_oldest(self) -> Optional[FileInfo]:
+        """
+        Prunes the oldest file regardless of the policy, for enforcing
+        limits shared with other watchers.
+        """
+        with self._lock:
+            if not self._by_age:
+                return None
+            entry = self._pop_oldest()
+        self._discard([entry])
+        return entry
+
+    @property
+    def file_count(self) -> int:
+        return len(self._keys)
 
     def incoming(self, path: Path) -> None:
         assert path.is_file()
 
-        if not self._paths:
+        paths = self._watched_paths()
+        if not paths:
             return
 
-        if not any(path.resolve().is_relative_to(root) for root in self._paths):
+        if not any(path.resolve().is_relative_to(root) for root in paths):
             raise WatchException(
-                f"Incoming file {path} does not belong to either of {self._paths}"
+                f"Incoming file {path} does not belong to either of {paths}"
             )
 
-        if self.state == self.State.Accumulating:
-            self._register_file(path)
+        try:
+            entry = walk_entry(path)
+        except FileNotFoundError:
+            # Registered by a concurrent reconciliation, then pruned already
+            logger.debug(f"Incoming file {path} was removed before registering")
+            return
+        check = False
+        with self._lock:
+            if self.state == self.State.Start:
+                logger.warning(
+                    f"Deferring update of size statistic for incoming file {path} during state {self.state}"
+                )
+                return
 
-            self._remaining_before_check -= 1
-            if self._remaining_before_check == 0:
-                self._consistency_check()
-                self._remaining_before_check = self.check_frequency
+            self._add_entry(entry)
+            if self.check_frequency:
+                self._remaining_before_check -= 1
+                if self._remaining_before_check == 0:
+                    check = True
+                    self._remaining_before_check = self.check_frequency
 
-            self._prune()
-        else:
-            logger.warning(
-                f"Deferring update of size statistic for incoming file {path} during state {self.state}"
-            )
+        if check:
+            self._consistency_check()
+        self._prune()
+
+    def on_file_event(self, event: FileSystemEvent) -> None:
+        """
+        Updates the bookkeeping after a change reported by a filesystem
+        observer, without rescanning the watched directories.
+        """
+        if self.state == self.State.Start:
+            return
+
+        src = Path(os.fsdecode(event.src_path))
+        if event.event_type == EVENT_TYPE_MOVED:
+            self._forget(src, event.is_directory)
+            self._track(Path(os.fsdecode(event.dest_path)), event.is_directory)
+        elif event.event_type == EVENT_TYPE_DELETED:
+            self._forget(src, event.is_directory)
+        elif not event.is_directory:
+            self._track(src, False)
+
+    def _track(self, path: Path, is_directory: bool) -> None:
+        if is_index_file(path) or not self._is_watched(path):
+            return
+        if not is_directory and self._is_pending_deletion(path):
+            return
+
+        try:
+            entries = list(walk_files(path)) if is_directory else [walk_entry(path)]
+        except FileNotFoundError:
+            # Removed before getting here, the deletion event will follow
+            return
+
+        with self._lock:
+            for entry in entries:
+                key = self._keys.get(entry.path)
+                if key is None:
+                    self._add_entry(entry)
+                else:
+                    # Keep the age, so that rewrites do not reorder the entry
+                    tracked: FileInfo = self._by_age[key]
+                    self.storage_usage += entry.size - tracked.size
+                    tracked.size = entry.size
+                    tracked.mtime = entry.mtime
+        self._prune()
+
+    def _forget(self, path: Path, is_directory: bool) -> None:
+        with self._lock:
+            if not is_directory:
+                self._unregister_file(path)
+                return
+            for tracked in [p for p in self._keys if p.is_relative_to(path)]:
+                self._unregister_file(tracked)
+
+    def _is_pending_deletion(self, path: Path) -> bool:
+        return self.deleter is not None and self.deleter.is_pending(path)
+
+    def _watched_paths(self) -> tuple[Path, ...]:
+        with self._lock:
+            return tuple(self._paths)
+
+    def _is_watched(self, path: Path) -> bool:
+        resolved = path.resolve()
+        return any(resolved.is_relative_to(root) for root in self._watched_paths())
 
     def update_file_size(self, path: Path) -> None:
-        # TODO: Optimize. Assumption: updates on files are for the newest ones.
-        curr = len(self.content)
-        while curr > 0:
-            if self.content[curr - 1].path == path:
-                entry = walk_entry(path)
-                self.storage_usage -= self.content[curr - 1].size
-                self.storage_usage += entry.size
-                self.content[curr - 1].size = entry.size
+        if path not in self._keys:
+            logger.warning(f"Requested update of the size of {path} but does not exist")
+            return
+        current = walk_entry(path)
+        with self._lock:
+            key = self._keys.get(path)
+            if key is None:
                 return
-            curr -= 1
-        logger.warning(f"Requested update of the size of {path} but does not exist")
+            entry: FileInfo = self._by_age[key]
+            self.storage_usage += current.size - entry.size
+            entry.size = current.size
+            entry.mtime = current.mtime
 
     def get_oldest(self) -> Optional[FileInfo]:
-        if self.content:
-            return self.content[0]
-        else:
-            return None
+        with self._lock:
+            if self._by_age:
+                oldest: FileInfo = self._by_age.peekitem(0)[1]
+                return oldest
+            else:
+                return None
 
-    def _register_file(self, path: Path) -> None:
-        entry = walk_entry(path)
+    @property
+    def content(self) -> list[FileInfo]:
+        """
+        Snapshot of the entries, from the oldest to the newest.
+        """
+        with self._lock:
+            return list(self._by_age.values())
+
+    def entries_under(self, root: Path) -> list[FileInfo]:
+        with self._lock:
+            entries = list(self._by_age.values())
+        return [entry for entry in entries if entry.path.is_relative_to(root)]
+
+    def entries_before(
+        self,
+        age: int,
+        root: Path,
+        limit: int,
+        exclude: Callable[[Path], bool] = lambda path: False,
+    ) -> list[FileInfo]:
+        """
+        Oldest entries under `root` which are older than `age`, taken from
+        the start of the age index, so that only those are visited.
+        """
+        entries: list[FileInfo] = []
+        with self._lock:
+            for entry in self._by_age.values():
+                if entry.age >= age or len(entries) == limit:
+                    break
+                if entry.path.is_relative_to(root) and not exclude(entry.path):
+                    entries.append(entry)
+        return entries
+
+    def replace_entries(self, entries: list[FileInfo], path: Optional[Path]) -> None:
+        """
+        Accounts for the files in `entries` having been merged into `path`,
+        or just removed if there is none.
+        """
+        merged = walk_entry(path) if path else None
+        with self._lock:
+            for entry in entries:
+                self._unregister_file(entry.path)
+            if merged:
+                self._add_entry(merged)
+        self._prune()
+
+    def save_index(self, root: Path) -> None:
+        """
+        Persists the entries under `root`, for `set_path` to load them
+        instead of scanning the whole directory on the next session.
+        """
+        index = StorageIndex(root)
+        index.save(index.directory_times(), self.entries_under(root))
+
+    def _add_entry(self, entry: FileInfo) -> None:
+        # A file that is registered anew replaces its previous entry
+        self._unregister_file(entry.path)
+        key = (entry.age, next(self._sequence))
+        self._by_age[key] = entry
+        self._keys[entry.path] = key
         self.storage_usage += entry.size
-        curr = len(self.content)
-        while curr > 0:
-            if self.content[curr - 1].age < entry.age:
-                self.content.insert(curr, entry)
-                return
-            curr -= 1
-
-        # if older than all elements
-        self.content.insert(0, entry)
 
-    def _unregister_file(self, path: Path) -> None:
-        new_content = []
-        for entry in self.content:
-            if entry.path == path:
-                self.storage_usage -= entry.size
-            else:
-                new_content.append(entry)
-        self.content = new_content
+    def _unregister_file(self, path: Path) -> Optional[FileInfo]:
+        key = self._keys.pop(path, None)
+        if key is None:
+            return None
+        entry: FileInfo = self._by_age.pop(key)
+        self.storage_usage -= entry.size
+        return entry
 
     def _build_content_list(self, root: Path) -> None:
         """
         Adds to `self.content` the FileInfo of files under `root` directory.
         """
         assert self._paths
-        self.state = self.State.Accumulating
-
-        new_files = list(walk_files(root))
 
-        self.content = sorted(
-            new_files + self.content,
-            key=lambda e: e.age,
-        )
-        self.storage_usage += sum(e.size for e in new_files)
+        entries: Optional[Iterable[FileInfo]] = StorageIndex(root).load()
+        if entries is None:
+            entries = list(walk_files(root))
+        with self._lock:
+            if self.state == self.State.Start:
+                self.state = self.State.Accumulating
+            for entry in entries:
+                self._add_entry(entry)
 
     def _prune(self) -> None:
-        if self._size_limit is None:
-            return
-
-        # In order to make this class thread-safe,
-        # the following would be required:
-        # self.state == self.State.Checking
-        while self.storage_usage > self._size_limit:
-            try:
-                entry = self.content.pop(0)
-                entry.path.unlink()
-                self.storage_usage -= entry.size
-            except FileNotFoundError:
-                logger.warning(f"File {entry.path} was already removed")
-            except KeyError:
-                break
+        """
+        Chooses the files to prune while holding the lock, which is quick,
+        then deletes them without holding it.
+        """
+        with self._lock:
+            if self.state == self.State.Start:
+                return
+            pruned = self._select_pruned()
+        self._discard(pruned)
+
+    def _select_pruned(self) -> list[FileInfo]:
+        policy = self.policy
+        max_bytes = math.inf if policy.max_bytes is None else policy.max_bytes
+        max_files = math.inf if policy.max_files is None else policy.max_files
+        # Files are kept sorted by age, so that expired ones come first
+        expiry = -math.inf
+        if policy.max_age is not None:
+            expiry = time.time_ns() - policy.max_age // timedelta(microseconds=1) * 1000
+
+        pruned = []
+        while self._by_age and (
+            self.storage_usage > max_bytes
+            or len(self._keys) > max_files
+            or self._by_age.peekitem(0)[1].age < expiry
+        ):
+            pruned.append(self._pop_oldest())
+        return pruned
+
+    def _pop_oldest(self) -> FileInfo:
+        entry: FileInfo
+        _, entry = self._by_age.popitem(0)
+        del self._keys[entry.path]
+        self.storage_usage -= entry.size
+        return entry
+
+    def _discard(self, pruned: list[FileInfo]) -> None:
+        if self.deleter:
+            self.deleter.delete(pruned, self._track_replaced)
+        else:
+            replaced = [entry for entry in pruned if delete_entry(entry) is False]
+            if replaced:
+                self._track_replaced(replaced)
 
-        # In order to make this class thread-safe,
-        # the following would be required:
-        # self.state == self.State.Accumulating
+    def _track_replaced(self, entries: list[FileInfo]) -> None:
+        """
+        Registers again the pruned files that were written anew before
+        getting deleted, as new files of the same name.
+        """
+        logger.debug(f"Keeping {len(entries)} files written anew since pruned")
+        fresh = []
+        for entry in entries:
+            if self._is_watched(entry.path):
+                with contextlib.suppress(FileNotFoundError):
+                    fresh.append(walk_entry(entry.path))
+        with self._lock:
+            for entry in fresh:
+                # Unless registered meanwhile
+                if entry.path not in self._keys:
+                    self._add_entry(entry)
+
+    @property
+    def roots(self) -> list[Path]:
+        with self._lock:
+            return list(self._roots.values())
 
     def _consistency_check(self) -> bool:
         assert self._paths
-        in_memory = {k.path for k in self.content}
-        in_storage = {p.path for root in self._paths for p in walk_files(root)}
+        return self.reconcile()
 
-        difference = in_storage - in_memory
+    def reconcile(self, in_storage: Optional[set[Path]] = None) -> bool:
+        """
+        Corrects the bookkeeping against the files found on storage, which
+        are collected by `scan_files` over `roots` unless given. This runs
+        in the Checking state, while files keep arriving, so only files that
+        are still present are registered, and only files that are really
+        gone are unregistered. Returns whether no correction was needed.
+        """
+        with self._lock:
+            if self.state != self.State.Accumulating:
+                logger.debug(f"Skipping reconciliation during state {self.state}")
+                return True
+            self.state = self.State.Checking
+        try:
+            if in_storage is None:
+                in_storage = scan_files(self.roots)
+            return self._reconcile(in_storage)
+        finally:
+            with self._lock:
+                self.state = self.State.Accumulating
+
+    def _reconcile(self, in_storage: set[Path]) -> bool:
+        with self._lock:
+            in_memory = set(self._keys)
+
+        difference = {
+            path
+            for path in in_storage - in_memory
+            if path.exists()
+            and self._is_watched(path)
+            and not self._is_pending_deletion(path)
+        }
         if difference:
             logger.warning(
                 f"File bookkeeping inconsistency: new files on disk are: {difference}"
             )
+            entries = []
             for path in difference:
-                self._register_file(path)
+                with contextlib.suppress(FileNotFoundError):
+                    entries.append(walk_entry(path))
+            with self._lock:
+                for entry in entries:
+                    # Unless registered meanwhile
+                    if entry.path not in self._keys:
+                        self._add_entry(entry)
             return False
 
-        difference = in_memory - in_storage
+        difference = {path for path in in_memory - in_storage if not path.exists()}
         if difference:
             logger.warning(
                 f"File bookkeeping inconsistency: files unexpectedly removed: {difference}"
             )
-            for path in difference:
-                self._unregister_file(path)
+            with self._lock:
+                for path in difference:
+                    # Unless written anew meanwhile
+                    if not path.exists():
+                        self._unregister_file(path)
             return False
 
         return True
@@ -233,12 +694,155 @@ def walk_files(root: Path) -> Iterator[FileInfo]:
     # without additional system calls in most of the cases
     for entry in os.scandir(root):
         if entry.is_file():
-            stat = entry.stat()
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # Pruned while scanning
+                continue
             yield FileInfo(stat.st_mtime_ns, Path(entry.path), stat.st_size)
-        elif entry.is_dir():
+        elif entry.is_dir() and entry.name != INDEX_DIR_NAME:
             yield from walk_files(Path(entry.path))
 
 
+def scan_files(roots: list[Path]) -> set[Path]:
+    return {p.path for root in roots for p in walk_files(root)}
+
+
+def is_index_file(path: Path) -> bool:
+    return INDEX_DIR_NAME in path.parts
+
+
+class StorageIndex:
+    """
+    Persists the bookkeeping of a StorageSizeWatcher for a directory, into
+    a SQLite database stored in a subdirectory of it. Along with the files, it records
+    the modification time of every subdirectory, which changes whenever a
+    file is added, removed or renamed within. Loading the index thus only
+    rescans the subdirectories that changed since it was saved, although
+    files rewritten in place keep their recorded size until reconciled.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.location = root / INDEX_DIR_NAME / INDEX_FILE_NAME
+
+    def load(self) -> Optional[list[FileInfo]]:
+        if not self.location.is_file():
+            return None
+        try:
+            with contextlib.closing(sqlite3.connect(self.location)) as conn:
+                (version,) = conn.execute("PRAGMA user_version").fetchone()
+                if version != INDEX_VERSION:
+                    logger.warning(f"Ignoring outdated storage index {self.location}")
+                    return None
+                files = conn.execute("SELECT directory, name, age, size FROM files")
+                by_directory = defaultdict(list)
+                for directory, name, age, size in files:
+                    by_directory[directory].append((name, age, size))
+                directories = dict(
+                    conn.execute("SELECT directory, mtime FROM directories")
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Ignoring unreadable storage index {self.location}: {e}")
+            return None
+
+        children = defaultdict(list)
+        for directory in directories:
+            if directory:
+                children[posixpath.dirname(directory)].append(directory)
+
+        entries: list[FileInfo] = []
+        rescanned = 0
+        pending = [""]
+        while pending:
+            directory = pending.pop()
+            path = self.root / directory
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                if directories.get(directory) == mtime:
+                    entries.extend(
+                        FileInfo(age, path / name, size)
+                        for name, age, size in by_directory[directory]
+                    )
+                    pending.extend(children[directory])
+                else:
+                    rescanned += 1
+                    entries.extend(self._scan_directory(path, directory, pending))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+        logger.debug(
+            f"Loaded storage index of {self.root}, rescanning {rescanned} directories"
+        )
+        return entries
+
+    @staticmethod
+    def _scan_directory(
+        path: Path, directory: str, pending: list[str]
+    ) -> Iterator[FileInfo]:
+        for entry in os.scandir(path):
+            if entry.is_dir():
+                if entry.name != INDEX_DIR_NAME:
+                    pending.append(posixpath.join(directory, entry.name))
+            elif entry.is_file():
+                stat = entry.stat()
+                yield FileInfo(stat.st_mtime_ns, Path(entry.path), stat.st_size)
+
+    def directory_times(self) -> dict[str, int]:
+        """
+        Modification times of the root and its subdirectories, to be taken
+        before the entries to save, so that files added meanwhile are found
+        on loading.
+        """
+        # Created beforehand, as creating it modifies the root
+        with contextlib.suppress(OSError):
+            self.location.parent.mkdir(exist_ok=True)
+
+        times = {}
+        pending = [""]
+        while pending:
+            directory = pending.pop()
+            try:
+                times[directory] = os.stat(self.root / directory).st_mtime_ns
+                for entry in os.scandir(self.root / directory):
+                    if entry.is_dir() and entry.name != INDEX_DIR_NAME:
+                        pending.append(posixpath.join(directory, entry.name))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return times
+
+    def save(self, directories: dict[str, int], entries: Iterable[FileInfo]) -> None:
+        rows = []
+        for entry in entries:
+            if entry.path.is_relative_to(self.root):
+                relative = entry.path.relative_to(self.root).as_posix()
+                rows.append((*posixpath.split(relative), entry.age, entry.size))
+
+        # Written aside, so that an interrupted save leaves no partial index
+        staging = self.location.with_name(f"{INDEX_FILE_NAME}.new")
+        try:
+            self.location.parent.mkdir(exist_ok=True)
+            staging.unlink(missing_ok=True)
+            with contextlib.closing(sqlite3.connect(staging)) as conn:
+                with conn:
+                    conn.execute(
+                        "CREATE TABLE files ("
+                        "directory TEXT, name TEXT, age INTEGER, size INTEGER)"
+                    )
+                    conn.execute(
+                        "CREATE TABLE directories ("
+                        "directory TEXT PRIMARY KEY, mtime INTEGER)"
+                    )
+                    conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", rows)
+                    conn.executemany(
+                        "INSERT INTO directories VALUES (?, ?)", directories.items()
+                    )
+                    conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+            os.replace(staging, self.location)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not save storage index {self.location}: {e}")
+
+
 def check_and_create_directory(directory: Path) -> None:
     if not directory.exists():
         logger.warning(f"{directory} does not exist. Creating directory...")
@@ -248,6 +852,15 @@ def check_and_create_directory(directory: Path) -> None:
 
 
 OnDeleteCallable = Callable[[Path], None]
+OnFileEventCallable = Callable[[FileSystemEvent], None]
+
+FILE_EVENT_TYPES = {
+    EVENT_TYPE_CREATED,
+    EVENT_TYPE_MODIFIED,
+    EVENT_TYPE_CLOSED,
+    EVENT_TYPE_DELETED,
+    EVENT_TYPE_MOVED,
+}
 
 
 class DirectoryMonitor:
@@ -260,14 +873,33 @@ class DirectoryMonitor:
             if event.is_directory:
                 self._on_delete_cb(event)
 
+    class FileEventHandler(FileSystemEventHandler):
+        def __init__(self, on_event_cb: OnFileEventCallable) -> None:
+            self._on_event_cb = on_event_cb
+
+        def on_any_event(self, event: FileSystemEvent) -> None:
+            if event.event_type in FILE_EVENT_TYPES:
+                self._on_event_cb(event)
+
     def __init__(self) -> None:
         self._obs = Observer()
         self._watches: dict[Path, ObservedWatch] = dict()
+        self._file_watches: dict[Path, ObservedWatch] = dict()
 
     def start(self) -> None:
         self._obs.start()
 
-    def watch(self, directory: Path, on_delete_cb: OnDeleteCallable) -> None:
+    def watch(
+        self,
+        directory: Path,
+        on_delete_cb: OnDeleteCallable,
+        on_file_event: Optional[OnFileEventCallable] = None,
+    ) -> None:
+        """
+        Reports the deletion of `directory`, and if `on_file_event` is given,
+        changes to the files in the whole tree under it. The latter are
+        reported with paths under `directory` as given, not resolved.
+        """
         assert directory.is_dir()
         resolved = directory.resolve()
         handler = self.EventHandler(self._watch_decorator(on_delete_cb))
@@ -277,8 +909,19 @@ class DirectoryMonitor:
         )
         self._watches[resolved] = watch
 
+        if on_file_event:
+            self._file_watches[resolved] = self._obs.schedule(
+                self.FileEventHandler(on_file_event),
+                str(directory),
+                recursive=True,
+            )
+
     def _on_delete_action(self, path: Path) -> None:
         resolved = path.resolve()
+        file_watch = self._file_watches.pop(resolved, None)
+        if file_watch:
+            with contextlib.suppress(KeyError):
+                self._obs.unschedule(file_watch)
         watch = self._watches.pop(resolved)
         self._obs.unschedule(watch)
 
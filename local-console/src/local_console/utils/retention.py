@@ -0,0 +1,98 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import logging
+import threading
+from operator import attrgetter
+from typing import Optional
+
+from local_console.utils.fstools import StorageSizeWatcher
+
+logger = logging.getLogger(__name__)
+
+
+class StoragePool:
+    """
+    Storage budget shared among several StorageSizeWatcher, such as those
+    of all the cameras writing into the same volume. Each watcher keeps its
+    own retention policy, which acts as a per-device quota, while the pool
+    limits the total of them all.
+
+    Eviction is fair: files are evicted from whichever member uses the
+    most, so that a busy device cannot starve the others out of the shared
+    space. Totals are taken from the watchers' running counters, so that
+    enforcing the budget never requires scanning their files. Watchers are
+    thread-safe, so evicting from them does not hold up their ingestion.
+    """
+
+    def __init__(
+        self, max_bytes: Optional[int] = None, max_files: Optional[int] = None
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        # In joining order, which breaks ties among the largest users
+        self._members: list[StorageSizeWatcher] = []
+        self._lock = threading.Lock()
+
+    def join(self, watcher: StorageSizeWatcher) -> None:
+        with self._lock:
+            if watcher not in self._members:
+                self._members.append(watcher)
+
+    def leave(self, watcher: StorageSizeWatcher) -> None:
+        with self._lock:
+            if watcher in self._members:
+                self._members.remove(watcher)
+
+    def set_budget(self, max_bytes: Optional[int], max_files: Optional[int]) -> None:
+        logger.debug(f"Setting shared budget to {max_bytes} bytes, {max_files} files")
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.rebalance()
+
+    @property
+    def storage_usage(self) -> int:
+        return sum(watcher.storage_usage for watcher in self._members)
+
+    @property
+    def file_count(self) -> int:
+        return sum(watcher.file_count for watcher in self._members)
+
+    def rebalance(self) -> int:
+        """
+        Evicts files until the members fit within the budget. Returns the
+        number of evicted files.
+        """
+        evicted = 0
+        with self._lock:
+            while victim := self._select_victim():
+                if victim.evict_oldest() is None:
+                    break
+                evicted += 1
+
+        if evicted:
+            logger.debug(f"Evicted {evicted} files to fit the shared budget")
+        return evicted
+
+    def _select_victim(self) -> Optional[StorageSizeWatcher]:
+        # Counters read while members are ingesting may be slightly
+        # outdated, which only delays the eviction
+        if self.max_bytes is not None and self.storage_usage > self.max_bytes:
+            usage = attrgetter("storage_usage")
+        elif self.max_files is not None and self.file_count > self.max_files:
+            usage = attrgetter("file_count")
+        else:
+            return None
+        return max(self._members, key=usage)
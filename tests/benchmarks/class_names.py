@@ -0,0 +1,108 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+"""
+Compares naming the classes of object detection outputs by walking the
+whole decoded object recursively, to doing so over the compiled label
+table, visiting only the `class_id` fields laid out by the schema.
+
+Run from the repository root with:
+
+    python -m tests.benchmarks.class_names
+"""
+import argparse
+import time
+from collections.abc import Callable
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+
+from local_console.core.camera.flatbuffers import add_class_names
+from local_console.core.camera.flatbuffers import FlatbufferDecoder
+from local_console.core.camera.labels import LabelTable
+from local_console.core.camera.labels import load_label_table
+from local_console.core.camera.tensors import SCHEMAS_DIR
+
+# As many classes as in COCO
+N_CLASSES = 80
+
+
+def detections(n_items: int) -> dict[str, Any]:
+    return {
+        "perception": {
+            "object_detection_list": [
+                {
+                    "class_id": index % (N_CLASSES + 10),
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"left": 1, "top": 2, "right": 3, "bottom": 4},
+                    "score": 0.5,
+                }
+                for index in range(n_items)
+            ]
+        }
+    }
+
+
+def per_call(operation: Callable[[], None], n_calls: int) -> float:
+    """
+    Average duration of `operation` in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        operation()
+    return (time.perf_counter() - start) / n_calls * 1e6
+
+
+def measure(n_items: int, n_calls: int, labels_file: Path) -> dict[str, float]:
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / "objectdetection.fbs")
+    labels = {index: f"class {index}" for index in range(N_CLASSES)}
+    table = load_label_table(labels_file)
+    # Naming is idempotent, so the same output is named over and over
+    output = detections(n_items)
+
+    return {
+        "recursive": per_call(lambda: add_class_names(output, labels), n_calls),
+        "compiled": per_call(lambda: decoder.add_class_names([output], table), n_calls),
+        "load labels": per_call(lambda: load_label_table(labels_file), n_calls),
+        "compile labels": per_call(
+            lambda: LabelTable.from_lines(labels_file.read_text().splitlines()),
+            n_calls,
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1_000, 10_000]
+    )
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temporary:
+        labels_file = Path(temporary) / "labels.txt"
+        labels_file.write_text("\n".join(f"class {i}" for i in range(N_CLASSES)))
+        rows = {
+            n_items: measure(n_items, args.calls, labels_file) for n_items in args.sizes
+        }
+
+    operations = list(next(iter(rows.values())))
+    print(f"{'items':>10}" + "".join(f"{op:>16}" for op in operations) + "  (us/call)")
+    for n_items, results in rows.items():
+        print(f"{n_items:>10}" + "".join(f"{results[op]:>16.2f}" for op in operations))
+
+
+if __name__ == "__main__":
+    main()
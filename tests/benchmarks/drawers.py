@@ -0,0 +1,129 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+"""
+Measures the cost per frame of drawing inference outputs onto images, and
+of measuring their captions, with the text metrics shared by the drawers
+kept across frames or not. Drawing the captions themselves is shown for
+comparison.
+
+Run from the repository root with:
+
+    python -m tests.benchmarks.drawers
+"""
+import argparse
+import time
+from collections.abc import Callable
+
+import cv2  # type: ignore
+import numpy as np
+from local_console.core.camera.tensors import BOUNDING_BOX_2D
+from local_console.core.camera.tensors import InferenceTensor
+from local_console.core.camera.tensors import TensorKind
+from local_console.gui.drawer.classification import ClassificationDrawer
+from local_console.gui.drawer.drawer import Drawer
+from local_console.gui.drawer.objectdetection import DetectionDrawer
+from local_console.gui.drawer.text import TextMetrics
+
+# As many classes as in COCO
+N_CLASSES = 80
+
+
+def tensor(kind: TensorKind, n_items: int) -> InferenceTensor:
+    rng = np.random.default_rng(0)
+    records = np.zeros(n_items, dtype=kind.dtype)
+    records["class_id"] = rng.integers(0, N_CLASSES, n_items)
+    records["score"] = rng.random(n_items)
+    if kind == TensorKind.DETECTION:
+        records["left"] = rng.integers(0, 560, n_items)
+        records["top"] = rng.integers(20, 400, n_items)
+        records["right"] = records["left"] + 80
+        records["bottom"] = records["top"] + 60
+        records["bounding_box_type"] = BOUNDING_BOX_2D
+    names = np.array([f"class {i}" for i in records["class_id"]], dtype=object)
+    return InferenceTensor(kind, records, names)
+
+
+def per_frame(draw: Callable[[], None], n_frames: int) -> float:
+    """
+    Average duration of `draw` in microseconds, once it has been called.
+    """
+    draw()
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        draw()
+    return (time.perf_counter() - start) / n_frames * 1e6
+
+
+def measure(n_items: int, n_frames: int) -> dict[str, float]:
+    img = np.zeros((480, 640, 3), dtype=np.uint8)
+    detections = tensor(TensorKind.DETECTION, n_items)
+    classifications = tensor(TensorKind.CLASSIFICATION, n_items)
+    captions = [box.caption for box in DetectionDrawer.overlay(detections).boxes]
+
+    def detect() -> None:
+        DetectionDrawer.draw(img, detections)
+
+    def classify() -> None:
+        ClassificationDrawer.draw(img, classifications)
+
+    def measure_captions(metrics: TextMetrics) -> None:
+        metrics.set_image_height(img.shape[0])
+        for caption in captions:
+            metrics.text_size(caption, 0.5, 1)
+
+    cached = Drawer.metrics
+    results = {
+        "detection": per_frame(detect, n_frames),
+        "classification": per_frame(classify, n_frames),
+        "sizes cached": per_frame(lambda: measure_captions(cached), n_frames),
+    }
+    Drawer.metrics = TextMetrics(max_entries=0)
+    try:
+        results["detect. uncached"] = per_frame(detect, n_frames)
+        results["classif. uncached"] = per_frame(classify, n_frames)
+        results["sizes uncached"] = per_frame(
+            lambda: measure_captions(Drawer.metrics), n_frames
+        )
+    finally:
+        Drawer.metrics = cached
+    results["putText"] = per_frame(
+        lambda: [
+            cv2.putText(
+                img, caption, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1
+            )
+            for caption in captions
+        ],
+        n_frames,
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = {n_items: measure(n_items, args.frames) for n_items in args.sizes}
+
+    operations = list(next(iter(rows.values())))
+    print(f"{'items':>10}" + "".join(f"{op:>19}" for op in operations) + "  (us/frame)")
+    for n_items, results in rows.items():
+        print(f"{n_items:>10}" + "".join(f"{results[op]:>19.1f}" for op in operations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+"""
+Measures the cost of the StorageSizeWatcher bookkeeping operations as the
+number of watched files grows, which should remain about constant.
+
+Run from the repository root with:
+
+    python -m tests.benchmarks.storage_watcher
+"""
+import argparse
+import time
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import patch
+
+from local_console.utils.fstools import FileInfo
+from local_console.utils.fstools import StorageSizeWatcher
+
+ROOT = Path("/benchmark")
+
+
+def watcher_with(n_files: int) -> StorageSizeWatcher:
+    watcher = StorageSizeWatcher()
+    for index in range(n_files):
+        watcher._add_entry(FileInfo(index, ROOT / f"{index}.jpg", 1))
+    return watcher
+
+
+def per_operation(operation: Callable[[int], None], n_ops: int) -> float:
+    """
+    Average duration of `operation` in microseconds.
+    """
+    start = time.perf_counter()
+    for index in range(n_ops):
+        operation(index)
+    return (time.perf_counter() - start) / n_ops * 1e6
+
+
+def measure(n_files: int, n_ops: int) -> dict[str, float]:
+    # Each operation touches a distinct file
+    n_ops = min(n_ops, n_files // 2)
+    watcher = watcher_with(n_files)
+    newest = n_files
+
+    def register(index: int) -> None:
+        watcher._add_entry(FileInfo(newest + index, ROOT / f"new{index}.jpg", 1))
+
+    def update_size(index: int) -> None:
+        watcher.update_file_size(ROOT / f"{n_files - 1 - index}.jpg")
+
+    def unregister(index: int) -> None:
+        watcher._unregister_file(ROOT / f"new{index}.jpg")
+
+    def prune_oldest(index: int) -> None:
+        watcher.set_storage_limit(watcher.storage_usage - 1)
+
+    results = {"register": per_operation(register, n_ops)}
+    with patch(
+        "local_console.utils.fstools.walk_entry",
+        side_effect=lambda path: FileInfo(0, path, 1),
+    ):
+        results["update size"] = per_operation(update_size, n_ops)
+    results["unregister"] = per_operation(unregister, n_ops)
+    watcher.state = StorageSizeWatcher.State.Accumulating
+    with patch.object(Path, "unlink"):
+        results["prune oldest"] = per_operation(prune_oldest, n_ops)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 300_000]
+    )
+    parser.add_argument("--ops", type=int, default=2_000)
+    args = parser.parse_args()
+
+    rows = {n_files: measure(n_files, args.ops) for n_files in args.sizes}
+    operations = list(next(iter(rows.values())))
+    print(f"{'files':>10}" + "".join(f"{op:>14}" for op in operations) + "  (us/op)")
+    for n_files, results in rows.items():
+        print(f"{n_files:>10}" + "".join(f"{results[op]:>14.2f}" for op in operations))
+
+
+if __name__ == "__main__":
+    main()
@@ -50,6 +50,21 @@ def test_config_setget_command_evp():
         assert "tb" == config_obj.get_config().evp.iot_platform
 
 
+def test_config_setget_command_storage():
+    with patch.object(config_obj, "save_config"):
+        runner.invoke(app, [GetCommands.SET.value, "storage.max_bytes", "1000"])
+        result = runner.invoke(app, [GetCommands.GET.value, "storage"])
+        assert json.loads(result.stdout)["max_bytes"] == 1000
+        assert config_obj.get_config().storage.max_bytes == 1000
+
+        result = runner.invoke(app, [GetCommands.SET.value, "storage.max_files", "-1"])
+        assert result.exit_code != 0
+        assert config_obj.get_config().storage.max_files is None
+
+        runner.invoke(app, [GetCommands.UNSET.value, "storage.max_bytes"])
+        assert config_obj.get_config().storage.max_bytes is None
+
+
 def test_config_get_command_active_device():
     result = runner.invoke(app, [GetCommands.GET.value, "active_device"])
 
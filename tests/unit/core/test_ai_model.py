@@ -89,7 +89,7 @@ async def test_deploy_step(tmp_path, network_id, update_status: str, cs_init):
         patch.object(camera_state, "device_config") as mock_config,
         patch.object(camera_state, "ota_event") as mock_ota_event,
         patch(
-            "local_console.core.camera.ai_model.AsyncWebserver",
+            "local_console.servers.shared_webserver.AsyncWebserver",
             return_value=mock_server,
         ),
         patch(
@@ -14,30 +14,50 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 import json
+import logging
 from base64 import b64encode
+from datetime import timedelta
 from pathlib import Path
 from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 from unittest.mock import Mock
 from unittest.mock import patch
 
+import cv2
 import hypothesis.strategies as st
+import numpy as np
 import pytest
 import trio
 from hypothesis import given
+from local_console.core.camera.cold_storage import is_archive
 from local_console.core.camera.enums import DeploymentType
+from local_console.core.camera.enums import FramePolicy
 from local_console.core.camera.enums import MQTTTopics
 from local_console.core.camera.enums import StreamStatus
+from local_console.core.camera.enums import UploadMode
+from local_console.core.camera.flatbuffers import InferenceResult
 from local_console.core.camera.mixin_mqtt import DEPLOY_STATUS_TOPIC
 from local_console.core.camera.mixin_mqtt import EA_STATE_TOPIC
 from local_console.core.camera.mixin_mqtt import SYSINFO_TOPIC
 from local_console.core.camera.qr import get_qr_object
 from local_console.core.camera.qr import qr_string
+from local_console.core.camera.state import CameraState
+from local_console.core.camera.streaming import Frame
+from local_console.core.camera.tensors import SCHEMAS_DIR
+from local_console.core.camera.tensors import TensorKind
 from local_console.core.schemas.edge_cloud_if_v1 import DeviceConfiguration
 from local_console.core.schemas.schemas import OnWireProtocol
 from local_console.gui.drawer.classification import ClassificationDrawer
+from local_console.gui.drawer.drawer import Overlay
+from local_console.gui.drawer.drawer import OverlayBox
+from local_console.gui.drawer.objectdetection import DetectionDrawer
 from local_console.gui.enums import ApplicationConfiguration
 from local_console.gui.enums import ApplicationType
+from local_console.servers.shared_webserver import SharedWebserver
+from local_console.servers.webserver import InMemoryUpload
+from local_console.utils.fstools import DeletionReport
+from local_console.utils.fstools import StorageIndex
+from local_console.utils.retention import StoragePool
 from local_console.utils.tracking import TrackingVariable
 
 from tests.fixtures.camera import cs_init
@@ -48,6 +68,7 @@ from tests.strategies.configs import generate_random_characters
 from tests.strategies.configs import generate_valid_device_configuration
 from tests.strategies.configs import generate_valid_ip
 from tests.strategies.configs import generate_valid_port_number
+from tests.unit.core.test_flatbuffers import build_detection_payload
 from tests.unit.gui.test_driver import create_new
 
 
@@ -500,7 +521,7 @@ async def test_save_into_inferences_directory_already_exists(tmp_path, cs_init)
 
 
 @pytest.mark.trio
-async def test_process_camera_upload_image(tmp_path_factory, cs_init) -> None:
+async def test_ingest_upload_image(tmp_path_factory, cs_init) -> None:
     root = tmp_path_factory.getbasetemp()
     inferences_dir = tmp_path_factory.mktemp("inferences")
     images_dir = tmp_path_factory.mktemp("images")
@@ -515,15 +536,32 @@ async def test_process_camera_upload_image(tmp_path_factory, cs_init) -> None:
         ) as mock_save,
     ):
         file = root / "images/a.jpg"
-        camera_state._process_camera_upload(file)
-        mock_save.assert_called()
+        assert list(camera_state._ingest_upload(file)) == [Path("/tmp/a.jpg")]
+        mock_save.assert_called_once_with(file, images_dir)
+
+        # Unknown files are not ingested
+        assert list(camera_state._ingest_upload(root / "videos/a.mkv")) == []
+        mock_save.assert_called_once()
+
+
+def run_frame_stages(camera_state, final_file: Path) -> list[Frame]:
+    """
+    Runs the stages of the streaming pipeline after ingestion,
+    over the calling thread.
+    """
+    published = []
+    for frame in camera_state._pair_upload(final_file):
+        for decoded in camera_state._decode_frame(frame):
+            for drawn in camera_state._draw_frame(decoded):
+                for stored in camera_state._store_frame(drawn):
+                    published += list(camera_state._publish_frame(stored))
+    return published
 
 
 @pytest.mark.trio
 async def test_process_camera_upload_inferences_with_schema(
     tmp_path_factory, cs_init
 ) -> None:
-    root = tmp_path_factory.getbasetemp()
     inferences_dir = tmp_path_factory.mktemp("inferences")
     images_dir = tmp_path_factory.mktemp("images")
 
@@ -534,58 +572,77 @@ async def test_process_camera_upload_inferences_with_schema(
     mock_storage = MagicMock()
     camera_state.total_dir_watcher = mock_storage
 
+    results = [InferenceResult("20240326110151928", b"0"), InferenceResult(None, b"1")]
     with (
         patch.object(
-            camera_state, "_save_into_input_directory", return_value=Path("/tmp/a.jpg")
-        ) as mock_save,
-        patch.object(
-            camera_state, "_get_flatbuffers_inference_data", return_value={"a": 3}
+            camera_state,
+            "_get_flatbuffers_inference_data",
+            return_value=[{"a": 2}, {"a": 3}],
         ) as mock_get_flatbuffers_inference_data,
         patch(
-            "local_console.core.camera.mixin_streaming.get_output_from_inference_results"
-        ) as mock_get_output_from_inference_results,
+            "local_console.core.camera.mixin_streaming.get_inference_results",
+            return_value=results,
+        ) as mock_get_inference_results,
         patch(
             "local_console.core.camera.mixin_streaming.Path.read_bytes",
             return_value=b"boo",
         ),
-        patch(
-            "local_console.core.camera.mixin_streaming.Path.read_text",
-            return_value="boo",
-        ),
         patch.object(ClassificationDrawer, "process_frame"),
     ):
         camera_state.vapp_type = TrackingVariable(ApplicationType.CLASSIFICATION.value)
         camera_state.vapp_schema_file.value = Path("objectdetection.fbs")
 
-        image_file_in = root / "images/a.jpg"
-        image_file_saved = images_dir / image_file_in.name
-        mock_save.return_value = image_file_saved
-        camera_state._process_camera_upload(image_file_in)
-        mock_save.assert_called_with(image_file_in, images_dir)
+        image_file_saved = images_dir / "a.jpg"
+        assert run_frame_stages(camera_state, image_file_saved) == []
         mock_storage.update_file_size.assert_not_called()
 
         # A pair has not been formed yet
         ClassificationDrawer.process_frame.assert_not_called()
 
-        inference_file_in = root / "inferences/a.txt"
-        inference_file_saved = inferences_dir / inference_file_in.name
-        mock_save.return_value = inference_file_saved
-        camera_state._process_camera_upload(inference_file_in)
-        mock_save.assert_called_with(inference_file_in, inferences_dir)
+        inference_file_saved = inferences_dir / "a.txt"
+        published = run_frame_stages(camera_state, inference_file_saved)
+        assert len(published) == 1
 
-        mock_get_output_from_inference_results.assert_called_once_with(b"boo")
+        mock_get_inference_results.assert_called_once_with(b"boo")
+        # All inferences are decoded at once, and the newest one is drawn
+        mock_get_flatbuffers_inference_data.assert_called_once_with([b"0", b"1"])
         ClassificationDrawer.process_frame.assert_called_once_with(
-            image_file_saved,
-            mock_get_flatbuffers_inference_data.return_value,
+            image_file_saved, {"a": 3}
         )
+        assert [result.decoded for result in published[0].inferences] == [
+            {"a": 2},
+            {"a": 3},
+        ]
         mock_storage.update_file_size.assert_called_once_with(image_file_saved)
 
+        assert camera_state.stream_image.value == str(image_file_saved)
+        assert json.loads(camera_state.inference_field.value) == {"a": 3}
+
+        # The frame was traced up to its publication
+        assert camera_state.latency.histograms["pipeline"].count == 1
+        assert camera_state.frame_latency.value.startswith("Latency (pipeline)")
+
+
+@pytest.mark.trio
+async def test_get_flatbuffers_inference_data_tensors(cs_init) -> None:
+    camera_state = cs_init
+    camera_state.vapp_schema_file.value = str(SCHEMAS_DIR / "objectdetection.fbs")
+    camera_state.vapp_labels_map.value = {3: "cat"}
+    payloads = [
+        build_detection_payload([(3, (1, 2, 3, 4), 0.8)]),
+        build_detection_payload([(0, (5, 6, 7, 8), 0.1)]),
+    ]
+
+    # Outputs of the built-in applications are decoded into arrays
+    tensors = camera_state._get_flatbuffers_inference_data(payloads)
+    assert [tensor.kind for tensor in tensors] == [TensorKind.DETECTION] * 2
+    assert [tensor.labels().tolist() for tensor in tensors] == [["cat"], ["Unknown"]]
+
 
 @pytest.mark.trio
 async def test_process_camera_upload_inferences_missing_schema(
     tmp_path_factory, cs_init
 ) -> None:
-    root = tmp_path_factory.getbasetemp()
     inferences_dir = tmp_path_factory.mktemp("inferences")
     images_dir = tmp_path_factory.mktemp("images")
 
@@ -594,41 +651,512 @@ async def test_process_camera_upload_inferences_missing_schema(
     camera_state.image_dir_path.value = images_dir
 
     with (
-        patch.object(camera_state, "_save_into_input_directory") as mock_save,
         patch.object(camera_state, "_get_flatbuffers_inference_data"),
         patch(
-            "local_console.core.camera.mixin_streaming.get_output_from_inference_results"
-        ) as mock_get_output_from_inference_results,
+            "local_console.core.camera.mixin_streaming.get_inference_results",
+            return_value=[InferenceResult("20240326110151928", b"output")],
+        ) as mock_get_inference_results,
         patch(
             "local_console.core.camera.mixin_streaming.Path.read_bytes",
             return_value=b"boo",
         ),
-        patch(
-            "local_console.core.camera.mixin_streaming.Path.read_text",
-            return_value="boo",
-        ),
         patch.object(ClassificationDrawer, "process_frame"),
-        patch.object(Path, "read_text", return_value=""),
     ):
         camera_state.vapp_type = TrackingVariable(ApplicationType.CLASSIFICATION.value)
 
-        inference_file_in = root / "inferences/a.txt"
-        inference_file_saved = inferences_dir / inference_file_in.name
-        mock_save.return_value = inference_file_saved
-        camera_state._process_camera_upload(inference_file_in)
-        mock_save.assert_called_with(inference_file_in, inferences_dir)
+        inference_file_saved = inferences_dir / "a.txt"
+        assert run_frame_stages(camera_state, inference_file_saved) == []
 
         # A pair has not been formed yet
         ClassificationDrawer.process_frame.assert_not_called()
 
-        image_file_in = root / "images/a.jpg"
-        image_file_saved = images_dir / image_file_in.name
-        mock_save.return_value = image_file_saved
-        camera_state._process_camera_upload(image_file_in)
-        mock_save.assert_called_with(image_file_in, images_dir)
+        image_file_saved = images_dir / "a.jpg"
+        run_frame_stages(camera_state, image_file_saved)
 
-        mock_get_output_from_inference_results.assert_called_once_with(b"boo")
+        mock_get_inference_results.assert_called_once_with(b"boo")
         ClassificationDrawer.process_frame.assert_called_once_with(
-            image_file_saved,
-            mock_get_output_from_inference_results.return_value,
+            image_file_saved, b"output"
         )
+        assert camera_state.inference_field.value == "boo"
+
+
+@pytest.mark.trio
+async def test_process_camera_upload_empty_inferences(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    camera_state.vapp_type = TrackingVariable(ApplicationType.DETECTION.value)
+    camera_state.vapp_schema_file.value = str(SCHEMAS_DIR / "objectdetection.fbs")
+    camera_state.overlay_inferences.value = "true"
+    payload = b'{"DeviceID": "Aid-1", "Inferences": []}'
+
+    inference = tmp_path / "a.txt"
+    inference.write_bytes(payload)
+    image = tmp_path / "a.jpg"
+    image.write_bytes(b"jpg")
+
+    # The image is shown without drawings
+    assert run_frame_stages(camera_state, inference) == []
+    (frame,) = run_frame_stages(camera_state, image)
+    assert frame.inferences == []
+    assert frame.inference_output is None
+    assert frame.overlay is None
+    assert camera_state.stream_image.value == str(image)
+    assert camera_state.inference_field.value == payload.decode()
+
+
+@pytest.mark.trio
+async def test_streaming_pipeline(tmp_path_factory, cs_init) -> None:
+    upload_dir = tmp_path_factory.mktemp("uploads")
+    inferences_dir = tmp_path_factory.mktemp("inferences")
+    images_dir = tmp_path_factory.mktemp("images")
+
+    camera_state = cs_init
+    camera_state.inference_dir_path.value = inferences_dir
+    camera_state.image_dir_path.value = images_dir
+
+    n_frames = 5
+    uploads = []
+    for index in range(n_frames):
+        image = upload_dir / f"{index}.jpg"
+        image.write_bytes(b"jpg")
+        inference = upload_dir / f"{index}.txt"
+        inference.write_text(
+            json.dumps(
+                {"Inferences": [{"T": str(index), "O": b64encode(b"x").decode()}]}
+            )
+        )
+        uploads += [inference, image]
+
+    with patch.object(camera_state, "_update_stream_views") as mock_publish:
+        send_channel, receive_channel = trio.open_memory_channel(0)
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(camera_state.streaming_pipeline_task, receive_channel)
+            async with send_channel:
+                for upload in uploads:
+                    await send_channel.send(upload)
+
+    # Frames are published in the order they were received
+    published = [call.args[0] for call in mock_publish.call_args_list]
+    assert [frame.image for frame in published] == [
+        images_dir / f"{index}.jpg" for index in range(n_frames)
+    ]
+    assert all(frame.inference_output == b"x" for frame in published)
+    assert not any(upload_dir.iterdir())
+
+
+@pytest.mark.parametrize(
+    "mode", [UploadMode.IN_MEMORY.value, UploadMode.IN_MEMORY_ONLY.value]
+)
+@pytest.mark.trio
+async def test_streaming_pipeline_in_memory(mode, tmp_path_factory, cs_init) -> None:
+    upload_dir = tmp_path_factory.mktemp("uploads")
+    inferences_dir = tmp_path_factory.mktemp("inferences")
+    images_dir = tmp_path_factory.mktemp("images")
+
+    camera_state = cs_init
+    camera_state.inference_dir_path.value = inferences_dir
+    camera_state.image_dir_path.value = images_dir
+    camera_state.upload_mode.value = mode
+    camera_state._preview_dir = upload_dir / "preview"
+
+    n_frames = 4
+    uploads = []
+    for index in range(n_frames):
+        inference = json.dumps(
+            {"Inferences": [{"T": str(index), "O": b64encode(b"x").decode()}]}
+        ).encode()
+        uploads += [
+            InMemoryUpload(upload_dir / f"{index}.txt", inference),
+            InMemoryUpload(upload_dir / f"{index}.jpg", b"jpg"),
+        ]
+
+    with (
+        patch.object(camera_state, "_update_stream_views") as mock_publish,
+        patch("local_console.core.camera.mixin_streaming.Path.read_bytes") as mock_read,
+    ):
+        send_channel, receive_channel = trio.open_memory_channel(0)
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(camera_state.streaming_pipeline_task, receive_channel)
+            async with send_channel:
+                for upload in uploads:
+                    await send_channel.send(upload)
+
+    # Uploads are processed from memory
+    mock_read.assert_not_called()
+    published = [call.args[0] for call in mock_publish.call_args_list]
+    assert all(frame.inference_output == b"x" for frame in published)
+    assert len(published) == n_frames
+
+    stored_images = sorted(path.name for path in images_dir.iterdir())
+    stored_inferences = sorted(path.name for path in inferences_dir.iterdir())
+    if mode == UploadMode.IN_MEMORY:
+        assert [frame.image for frame in published] == [
+            images_dir / f"{index}.jpg" for index in range(n_frames)
+        ]
+        assert stored_images == [f"{index}.jpg" for index in range(n_frames)]
+        assert stored_inferences == [f"{index}.txt" for index in range(n_frames)]
+    else:
+        # Only the latest previews are kept, for display
+        assert [frame.image for frame in published] == [
+            upload_dir / "preview" / f"{index}.jpg" for index in range(n_frames)
+        ]
+        previews = sorted(path.name for path in (upload_dir / "preview").iterdir())
+        assert previews == ["2.jpg", "3.jpg"]
+        assert stored_images == stored_inferences == []
+
+
+@pytest.mark.parametrize(
+    "policy", [FramePolicy.LATEST_WINS.value, FramePolicy.EVERY_NTH.value]
+)
+@pytest.mark.trio
+async def test_skipped_frames_stored_in_memory(
+    policy, tmp_path_factory, cs_init
+) -> None:
+    upload_dir = tmp_path_factory.mktemp("uploads")
+    inferences_dir = tmp_path_factory.mktemp("inferences")
+    images_dir = tmp_path_factory.mktemp("images")
+
+    camera_state = cs_init
+    camera_state.inference_dir_path.value = inferences_dir
+    camera_state.image_dir_path.value = images_dir
+    camera_state.upload_mode.value = UploadMode.IN_MEMORY.value
+    camera_state.frame_policy.value = policy
+    camera_state.frame_policy_nth.value = "2"
+
+    n_frames = 6
+    uploads = []
+    for index in range(n_frames):
+        inference = json.dumps(
+            {"Inferences": [{"T": str(index), "O": b64encode(b"x").decode()}]}
+        ).encode()
+        uploads += [
+            InMemoryUpload(upload_dir / f"{index}.txt", inference),
+            InMemoryUpload(upload_dir / f"{index}.jpg", b"jpg"),
+        ]
+
+    # All frames are pending selection at once
+    pending = []
+    for upload in uploads:
+        for ingested in camera_state._ingest_upload(upload):
+            pending += list(camera_state._pair_upload(ingested))
+    assert len(pending) == n_frames
+
+    processed = []
+    for frame in camera_state._select_frames(pending):
+        for stored in camera_state._store_frame(frame):
+            processed.append(stored)
+
+    # Skipped frames are not processed, yet all uploads are stored
+    n_processed = len(processed)
+    assert n_processed < n_frames
+    assert camera_state.frames_dropped.value == n_frames - n_processed
+    assert sorted(path.name for path in images_dir.iterdir()) == [
+        f"{index}.jpg" for index in range(n_frames)
+    ]
+    assert sorted(path.name for path in inferences_dir.iterdir()) == [
+        f"{index}.txt" for index in range(n_frames)
+    ]
+
+
+@pytest.mark.parametrize(
+    "policy, nth, kept",
+    [
+        (FramePolicy.PROCESS_ALL.value, "2", [0, 1, 2, 3]),
+        (FramePolicy.LATEST_WINS.value, "2", [3]),
+        (FramePolicy.EVERY_NTH.value, "2", [0, 2]),
+        (FramePolicy.EVERY_NTH.value, "", [0, 1, 2, 3]),
+    ],
+)
+@pytest.mark.trio
+async def test_select_frames(policy, nth, kept, cs_init, caplog) -> None:
+    camera_state = cs_init
+    camera_state.frame_policy.value = policy
+    camera_state.frame_policy_nth.value = nth
+    frames = [Frame(Path(f"{i}.jpg"), Path(f"{i}.txt")) for i in range(4)]
+
+    with caplog.at_level(logging.INFO):
+        selected = list(camera_state._select_frames(frames))
+
+    assert selected == [frames[i] for i in kept]
+    n_dropped = len(frames) - len(kept)
+    assert camera_state.frames_dropped.value == n_dropped
+    if n_dropped:
+        assert f"Dropped {n_dropped} out of 4 frames under the '{policy}'" in (
+            caplog.text
+        )
+
+
+@pytest.mark.trio
+async def test_select_frames_invalid_policy(cs_init, caplog) -> None:
+    camera_state = cs_init
+    camera_state.frame_policy.value = "bogus"
+    frames = [Frame(Path(f"{i}.jpg"), Path(f"{i}.txt")) for i in range(4)]
+
+    assert list(camera_state._select_frames(frames)) == frames
+    assert list(camera_state._select_frames(frames)) == frames
+    assert caplog.text.count("Invalid frame policy 'bogus'") == 1
+    assert camera_state.frames_dropped.value == 0
+
+
+@pytest.mark.trio
+async def test_orphan_images(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    # Incomplete groups get evicted right away
+    camera_state._grouper.max_pending = 0
+
+    # Unmatched images are not displayed by default
+    assert run_frame_stages(camera_state, tmp_path / "a.jpg") == []
+    assert camera_state.frames_orphaned.value == 1
+
+    camera_state.show_orphan_images.value = "true"
+    (frame,) = run_frame_stages(camera_state, tmp_path / "b.jpg")
+    assert frame.inference is None
+    assert camera_state.stream_image.value == str(tmp_path / "b.jpg")
+    assert camera_state.inference_field.value == ""
+
+    # Unmatched inferences have nothing to display
+    assert run_frame_stages(camera_state, tmp_path / "c.txt") == []
+    assert camera_state.frames_orphaned.value == 3
+
+
+@pytest.mark.parametrize(
+    "mode", [UploadMode.IN_MEMORY.value, UploadMode.IN_MEMORY_ONLY.value]
+)
+@pytest.mark.trio
+async def test_orphans_in_memory(mode, tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    camera_state.upload_mode.value = mode
+    camera_state._preview_dir = tmp_path / "preview"
+    camera_state.show_orphan_images.value = "true"
+    # Incomplete groups get evicted right away
+    camera_state._grouper.max_pending = 0
+
+    image = tmp_path / "images" / "a.jpg"
+    (frame,) = run_frame_stages(camera_state, InMemoryUpload(image, b"jpg"))
+    inference = tmp_path / "inferences" / "b.txt"
+    assert run_frame_stages(camera_state, InMemoryUpload(inference, b"{}")) == []
+    assert camera_state.frames_orphaned.value == 2
+
+    if mode == UploadMode.IN_MEMORY:
+        # Stored as if they had been matched, and only once
+        assert image.read_bytes() == b"jpg"
+        assert inference.read_bytes() == b"{}"
+        assert frame.image == image
+        assert frame.image_data is None
+    else:
+        assert not image.exists()
+        assert not inference.exists()
+        assert frame.image_data == b"jpg"
+
+
+@pytest.mark.trio
+async def test_overlay_inferences(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    camera_state.inference_dir_path.value = tmp_path / "inferences"
+    camera_state.image_dir_path.value = tmp_path / "images"
+    camera_state.total_dir_watcher = MagicMock()
+    camera_state.vapp_type = TrackingVariable(ApplicationType.DETECTION.value)
+    camera_state.overlay_inferences.value = "true"
+
+    output = {
+        "perception": {
+            "object_detection_list": [
+                {
+                    "class_id": 1,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"left": 1, "top": 2, "right": 3, "bottom": 4},
+                    "score": 0.5,
+                    "class_name": "dog",
+                }
+            ]
+        }
+    }
+    with (
+        patch(
+            "local_console.core.camera.mixin_streaming.get_inference_results",
+            return_value=[InferenceResult(None, output)],
+        ),
+        patch(
+            "local_console.core.camera.mixin_streaming.Path.read_bytes",
+            return_value=b"boo",
+        ),
+        patch.object(DetectionDrawer, "process_frame") as mock_process_frame,
+    ):
+        run_frame_stages(camera_state, tmp_path / "images/a.jpg")
+        (frame,) = run_frame_stages(camera_state, tmp_path / "inferences/a.txt")
+
+        # The image is left as is, for the GUI to lay the drawings over it
+        mock_process_frame.assert_not_called()
+        camera_state.total_dir_watcher.update_file_size.assert_not_called()
+        assert frame.overlay == Overlay(boxes=[OverlayBox(1, 2, 3, 4, "dog: 0.50")])
+        assert camera_state.stream_overlay.value == frame.overlay
+        assert camera_state.stream_image.value == str(tmp_path / "images/a.jpg")
+
+        camera_state.overlay_inferences.value = ""
+        run_frame_stages(camera_state, tmp_path / "images/b.jpg")
+        run_frame_stages(camera_state, tmp_path / "inferences/b.txt")
+        mock_process_frame.assert_called_once()
+        assert camera_state.stream_overlay.value is None
+
+
+@pytest.mark.trio
+async def test_decode_stream_pixels(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    camera_state.decode_stream_pixels = True
+    camera_state.upload_mode.value = UploadMode.IN_MEMORY_ONLY
+    camera_state._preview_dir = tmp_path / "preview"
+    camera_state.show_orphan_images.value = "true"
+    camera_state._grouper.max_pending = 0
+
+    image = cv2.imencode(".jpg", np.zeros((4, 6, 3), dtype=np.uint8))[1].tobytes()
+    (frame,) = run_frame_stages(camera_state, InMemoryUpload(tmp_path / "a.jpg", image))
+
+    # Frames are displayed from their pixels, without any file to load
+    assert frame.pixels.size == (6, 4)
+    assert camera_state.stream_pixels.value == frame.pixels
+    assert camera_state.stream_image.value == ""
+    assert not camera_state._preview_dir.exists()
+
+    # Frames are decoded at no larger a scale than the view needs
+    camera_state.stream_view_size.value = (2, 2)
+    (frame,) = run_frame_stages(camera_state, InMemoryUpload(tmp_path / "c.jpg", image))
+    assert (frame.pixels.size, frame.pixels.reduction) == ((3, 2), 2)
+
+    # Images that cannot be decoded are still displayed from their files
+    (frame,) = run_frame_stages(
+        camera_state, InMemoryUpload(tmp_path / "b.jpg", b"jpg")
+    )
+    assert frame.pixels is None
+    assert camera_state.stream_image.value == str(camera_state._preview_dir / "b.jpg")
+
+
+@pytest.mark.trio
+async def test_upload_route_task_shared(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    camera_state.mqtt_port.value = 1883
+    camera_state.webserver = SharedWebserver(port=8000)
+    send_channel, _ = trio.open_memory_channel(0)
+
+    async with trio.open_nursery() as nursery:
+        await nursery.start(camera_state.upload_route_task, tmp_path, send_channel)
+        assert camera_state.upload_port == 8000
+        assert camera_state.upload_prefix == "/dev/1883"
+        assert camera_state.webserver.devices == ["1883"]
+
+        # Changes of upload mode apply to the device route
+        route = camera_state.webserver._route_upload("/dev/1883/images/a.jpg")
+        assert route == (tmp_path / "images" / "a.jpg", send_channel, False)
+        camera_state.upload_mode.value = UploadMode.IN_MEMORY.value
+        route = camera_state.webserver._route_upload("/dev/1883/images/a.jpg")
+        assert route == (tmp_path / "images" / "a.jpg", send_channel, True)
+        nursery.cancel_scope.cancel()
+
+    assert camera_state.webserver.devices == []
+
+
+@pytest.mark.trio
+async def test_upload_route_task_own_server(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    send_channel, _ = trio.open_memory_channel(0)
+
+    async with trio.open_nursery() as nursery:
+        await nursery.start(camera_state.upload_route_task, tmp_path, send_channel)
+        assert camera_state.upload_port
+        assert camera_state.upload_prefix == ""
+        assert not camera_state._upload_server.in_memory
+        camera_state.upload_mode.value = UploadMode.IN_MEMORY_ONLY.value
+        assert camera_state._upload_server.in_memory
+        nursery.cancel_scope.cancel()
+
+
+@pytest.mark.trio
+async def test_reconcile_storage(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    camera_state.image_dir_path.value = tmp_path
+    watcher = camera_state.total_dir_watcher
+    assert watcher.check_frequency is None
+
+    # A file the directory monitor did not report
+    unreported = create_new(tmp_path)
+    assert watcher.storage_usage == 0
+
+    await trio.to_thread.run_sync(camera_state._reconcile_storage)
+    assert unreported in {entry.path for entry in watcher.content}
+    assert watcher.storage_usage == unreported.stat().st_size
+
+
+@pytest.mark.trio
+async def test_persist_storage_index(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    camera_state.image_dir_path.value = tmp_path
+    stored = create_new(tmp_path)
+    camera_state.total_dir_watcher.incoming(stored)
+
+    await trio.to_thread.run_sync(camera_state._persist_storage_index)
+    entries = StorageIndex(tmp_path).load()
+    assert [entry.path for entry in entries] == [stored]
+
+
+@pytest.mark.trio
+async def test_deletion_failures_are_reported(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    with patch.object(camera_state, "send_message_sync") as mock_send:
+        camera_state._on_deletion_report(DeletionReport(deleted=3))
+        mock_send.assert_not_called()
+
+        failure = (tmp_path / "file", PermissionError("denied"))
+        camera_state._on_deletion_report(DeletionReport(failed=[failure]))
+        mock_send.assert_called_once()
+        assert "Could not delete 1 old files" in mock_send.call_args.args[1]
+
+
+@pytest.mark.trio
+async def test_retention_settings(cs_init) -> None:
+    camera_state = cs_init
+    policy = camera_state.total_dir_watcher.policy
+
+    camera_state.max_files.value = "100"
+    camera_state.max_age_hours.value = "1.5"
+    assert policy.max_files == 100
+    assert policy.max_age == timedelta(hours=1.5)
+
+    camera_state.max_files.value = "many"
+    camera_state.max_age_hours.value = ""
+    assert policy.max_files is None
+    assert policy.max_age is None
+
+
+@pytest.mark.trio
+async def test_storage_pool_membership(tmp_path) -> None:
+    pool = StoragePool(max_files=1)
+    send_channel, _ = trio.open_memory_channel(0)
+    camera_state = CameraState(
+        send_channel, trio.lowlevel.current_trio_token(), storage_pool=pool
+    )
+    camera_state.image_dir_path.value = tmp_path
+    for _ in range(3):
+        camera_state._write_into_input_directory(create_new(tmp_path), b"0")
+    assert pool.file_count == 1
+
+    camera_state.shutdown()
+    assert pool.file_count == 0
+
+
+@pytest.mark.trio
+async def test_compact_storage(tmp_path, cs_init) -> None:
+    camera_state = cs_init
+    camera_state.image_dir_path.value = tmp_path
+    watcher = camera_state.total_dir_watcher
+    for _ in range(3):
+        watcher.incoming(create_new(tmp_path))
+
+    # Disabled by default
+    await trio.to_thread.run_sync(camera_state._compact_storage)
+    assert watcher.file_count == 3
+
+    camera_state.archive_after_hours.value = "0"
+    with patch("local_console.core.camera.mixin_streaming.ARCHIVE_MAX_FILES", 2):
+        await trio.to_thread.run_sync(camera_state._compact_storage)
+    archives = [entry.path for entry in watcher.content]
+    assert len(archives) == 2 and all(is_archive(path) for path in archives)
+    assert watcher.storage_usage == sum(path.stat().st_size for path in archives)
+    assert watcher._consistency_check()
@@ -0,0 +1,106 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import os
+import zipfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from local_console.core.camera.cold_storage import ArchiveIndex
+from local_console.core.camera.cold_storage import ColdStorage
+from local_console.core.camera.cold_storage import is_archive
+from local_console.core.camera.cold_storage import recompress_jpeg
+from local_console.utils.fstools import FileInfo
+from local_console.utils.fstools import walk_entry
+
+
+def jpeg(quality: int = 100) -> bytes:
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    _, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return bytes(encoded)
+
+
+@pytest.fixture
+def frames(tmp_path) -> list[FileInfo]:
+    entries = []
+    (tmp_path / "sub").mkdir()
+    for index, name in enumerate(["1.jpg", "1.txt", "sub/2.jpg"]):
+        path = tmp_path / name
+        path.write_bytes(jpeg() if name.endswith(".jpg") else b"inference " * 10)
+        age = (index + 1) * 10**18
+        os.utime(path, ns=(age, age))
+        entries.append(walk_entry(path))
+    return entries
+
+
+def test_pack_and_fetch(tmp_path, frames):
+    contents = {entry.path: entry.path.read_bytes() for entry in frames}
+    storage = ColdStorage()
+
+    archive = storage.pack(tmp_path, frames)
+    assert archive.parent == tmp_path and is_archive(archive)
+    assert not any(entry.path.exists() for entry in frames)
+    # Dated as its newest file
+    assert archive.stat().st_mtime_ns == frames[-1].age
+
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.getinfo("1.jpg").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("1.txt").compress_type == zipfile.ZIP_DEFLATED
+    for entry in frames:
+        name = entry.path.relative_to(tmp_path).as_posix()
+        assert storage.fetch(tmp_path, name) == contents[entry.path]
+    assert storage.fetch(tmp_path, "unknown.jpg") is None
+
+
+def test_pack_skips_removed_files(tmp_path, frames):
+    storage = ColdStorage()
+    frames[0].path.unlink()
+
+    archive = storage.pack(tmp_path, frames)
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.namelist() == ["1.txt", "sub/2.jpg"]
+
+    assert storage.pack(tmp_path, frames) is None
+    assert storage.pack(tmp_path, []) is None
+    assert [path for path in tmp_path.iterdir() if is_archive(path)] == [archive]
+
+
+def test_fetch_from_pruned_archive(tmp_path, frames):
+    storage = ColdStorage()
+    archive = storage.pack(tmp_path, frames)
+    archive.unlink()
+
+    assert storage.fetch(tmp_path, "1.jpg") is None
+    assert ArchiveIndex(tmp_path).locate("1.jpg") is None
+
+
+def test_pack_recompressed(tmp_path, frames):
+    storage = ColdStorage(quality=30)
+    original = frames[0].path.read_bytes()
+
+    storage.pack(tmp_path, frames)
+    packed = storage.fetch(tmp_path, "1.jpg")
+    assert len(packed) < len(original)
+    assert cv2.imdecode(np.frombuffer(packed, np.uint8), cv2.IMREAD_COLOR) is not None
+    assert storage.fetch(tmp_path, "1.txt") == b"inference " * 10
+
+
+def test_recompress_keeps_smaller_original():
+    small = jpeg(quality=10)
+    assert recompress_jpeg(small, 90) == small
+    assert recompress_jpeg(b"not an image", 10) == b"not an image"
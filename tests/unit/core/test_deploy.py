@@ -23,6 +23,7 @@ from unittest.mock import patch
 
 import hypothesis.strategies as st
 import pytest
+import requests
 import trio
 from hypothesis import given
 from local_console.core.camera.enums import DeployStage
@@ -106,6 +107,36 @@ async def test_evp2_stage_transitions(
             nursery.cancel_scope.cancel()
 
 
+@pytest.mark.trio
+async def test_download_progress_is_recorded(tmp_path) -> None:
+    module = tmp_path / "module.wasm"
+    module.write_bytes(b"wasm" * 1000)
+
+    deploy_fsm = DeployFSM.instantiate(OnWireProtocol.EVP2, AsyncMock(), AsyncMock())
+    deploy_fsm.webserver.set_directory(tmp_path)
+    deploy_fsm.set_manifest(Mock())
+    try:
+        async with trio.open_nursery() as nursery:
+            with patch.object(deploy_fsm._timeout_handler, "tap") as mock_tap:
+                await deploy_fsm.start(nursery)
+                url = f"http://localhost:{deploy_fsm.webserver.port}/{module.name}"
+                response = await trio.to_thread.run_sync(requests.get, url)
+                assert response.content == module.read_bytes()
+
+                # The last report may arrive after the client got all data
+                with trio.fail_after(5):
+                    while module.name not in deploy_fsm.downloads:
+                        await trio.sleep(0.01)
+                mock_tap.assert_called()
+            nursery.cancel_scope.cancel()
+    finally:
+        deploy_fsm.stop()
+
+    progress = deploy_fsm.downloads[module.name]
+    assert progress.position == progress.total == 4000
+    assert progress.percentage == 100
+
+
 def test_deployment_setup(tmpdir):
     origin = Path(tmpdir.join("a_module_file"))
     contents = str(uuid.uuid4())
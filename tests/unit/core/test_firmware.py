@@ -70,6 +70,24 @@ def device_config(UpdateProgress, UpdateStatus):
     )
 
 
+def test_download_progress_checkpoint(tmp_path):
+    from local_console.core.camera.firmware import download_progress_checkpoint
+    from local_console.core.camera.firmware import progress_update_checkpoint
+    from local_console.core.camera.firmware import TransientStatus
+    from local_console.servers.webserver import DownloadProgress
+
+    indicator = TransientStatus()
+    progress = DownloadProgress(tmp_path / "fw.bin", 50, 200, 50, 1.0)
+    download_progress_checkpoint(progress, indicator)
+    assert indicator.progress_download == 25
+
+    # Lagging reports from the camera do not move the progress back
+    progress_update_checkpoint(device_config(10, "Downloading"), indicator)
+    assert indicator.progress_download == 25
+    progress_update_checkpoint(device_config(40, "Downloading"), indicator)
+    assert indicator.progress_download == 40
+
+
 @pytest.mark.trio
 async def test_select_path(driver_set, tmp_path, cs_init) -> None:
     """
@@ -314,7 +332,7 @@ async def test_update_firmware_task_valid(tmp_path, cs_init, ota_type) -> None:
         patch.object(camera_state, "ota_event") as mock_ota_event,
         patch("local_console.core.camera.firmware.Agent", return_value=mock_agent),
         patch(
-            "local_console.core.camera.firmware.AsyncWebserver",
+            "local_console.servers.shared_webserver.AsyncWebserver",
             return_value=mock_server,
         ),
         patch(
@@ -14,26 +14,38 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 import json
+import os
 import subprocess
 from base64 import b64decode
+from base64 import b64encode
 from io import StringIO
 from pathlib import Path
+from typing import Optional
 from unittest.mock import ANY
 from unittest.mock import Mock
 from unittest.mock import patch
 
+import flatbuffers
+import local_console.assets
 import pytest
 from hypothesis import given
 from local_console.core.camera.flatbuffers import add_class_names
 from local_console.core.camera.flatbuffers import conform_flatbuffer_schema
+from local_console.core.camera.flatbuffers import flatbuffer_binaries_to_json
 from local_console.core.camera.flatbuffers import flatbuffer_binary_to_json
+from local_console.core.camera.flatbuffers import FlatbufferDecoder
 from local_console.core.camera.flatbuffers import FlatbufferError
+from local_console.core.camera.flatbuffers import get_flatbuffer_decoder
 from local_console.core.camera.flatbuffers import get_flatc
-from local_console.core.camera.flatbuffers import get_output_from_inference_results
+from local_console.core.camera.flatbuffers import get_inference_results
+from local_console.core.camera.flatbuffers import InferenceResult
 from local_console.core.camera.flatbuffers import map_class_id_to_name
+from local_console.core.schemas.tasks.objectdetection import ObjectDetection
 
 from tests.strategies.configs import generate_text
 
+SCHEMAS_DIR = Path(local_console.assets.__file__).parent / "schemas"
+
 
 def test_add_class_names() -> None:
     class_id_to_name = {
@@ -154,22 +166,49 @@ def test_flatc_conform_file_not_found_error():
         conform_flatbuffer_schema(path)
 
 
-def test_get_output_from_inference_results(tmp_path):
-    fb_encoded = "AACQvgAAmD4AAJA+AAAAvQAAQD4AAMC+AAAkvwAABD8AALA+AADwvg=="
+def test_get_inference_results():
     device_payload = json.dumps(
         {
             "DeviceID": "Aid-00010001-0000-2000-9002-0000000001d1",
-            "ModelID": "0300009999990100",
-            "Image": True,
             "Inferences": [
-                {
-                    "T": "20240326110151928",
-                    "O": fb_encoded,
-                }
+                {"T": "20240326110152028", "O": b64encode(b"second").decode()},
+                {"T": "20240326110151928", "O": b64encode(b"first").decode()},
             ],
         }
     )
-    assert get_output_from_inference_results(device_payload) == b64decode(fb_encoded)
+    results = get_inference_results(device_payload.encode())
+
+    # Sorted by their timestamps, from the oldest to the newest
+    assert results == [
+        InferenceResult("20240326110151928", b"first"),
+        InferenceResult("20240326110152028", b"second"),
+    ]
+
+
+def test_flatbuffer_binaries_to_json(tmp_path):
+    def run_flatc(args, **kwargs):
+        output_area = Path(args[args.index("-o") + 1])
+        inputs = args[args.index("--") + 1 :]
+        for input_file in inputs:
+            payload = Path(input_file).read_bytes().decode()
+            (output_area / Path(input_file).with_suffix(".json").name).write_text(
+                json.dumps({"payload": payload})
+            )
+
+    with (
+        patch("local_console.core.camera.flatbuffers.get_flatc"),
+        patch(
+            "local_console.core.camera.flatbuffers.subprocess.run",
+            side_effect=run_flatc,
+        ) as mock_run,
+    ):
+        decoded = flatbuffer_binaries_to_json(
+            tmp_path / "myschema", [f"p{index}".encode() for index in range(12)]
+        )
+
+    # A single run of flatc, whose outputs are kept in order
+    mock_run.assert_called_once()
+    assert decoded == [{"payload": f"p{index}"} for index in range(12)]
 
 
 def test_flatbuffer_binary_to_json(tmp_path):
@@ -217,3 +256,237 @@ def test_flatbuffer_binary_to_json_error(tmp_path):
     path_txt.write_text("{}")
     with pytest.raises(FlatbufferError):
         flatbuffer_binary_to_json(tmp_path / "myschema", b"payload")
+
+
+def build_detection_payload(
+    detections: list[tuple[int, Optional[tuple], float]]
+) -> bytes:
+    # Detections without a box get a bounding box of type NONE
+    builder = flatbuffers.Builder(0)
+    objects = []
+    for class_id, box, score in detections:
+        if box:
+            left, top, right, bottom = box
+            builder.StartObject(4)
+            builder.PrependInt32Slot(0, left, 0)
+            builder.PrependInt32Slot(1, top, 0)
+            builder.PrependInt32Slot(2, right, 0)
+            builder.PrependInt32Slot(3, bottom, 0)
+            bbox = builder.EndObject()
+
+        builder.StartObject(4)
+        builder.PrependUint32Slot(0, class_id, 0)
+        if box:
+            builder.PrependUint8Slot(1, 1, 0)
+            builder.PrependUOffsetTRelativeSlot(2, bbox, 0)
+        builder.PrependFloat32Slot(3, score, 0)
+        objects.append(builder.EndObject())
+
+    builder.StartVector(4, len(objects), 4)
+    for obj in reversed(objects):
+        builder.PrependUOffsetTRelative(obj)
+    vector = builder.EndVector()
+
+    builder.StartObject(1)
+    builder.PrependUOffsetTRelativeSlot(0, vector, 0)
+    data = builder.EndObject()
+    builder.StartObject(1)
+    builder.PrependUOffsetTRelativeSlot(0, data, 0)
+    builder.Finish(builder.EndObject())
+    return bytes(builder.Output())
+
+
+def test_decoder_in_process_detection():
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / "objectdetection.fbs")
+    assert decoder.in_process
+
+    payload = build_detection_payload([(3, (1, 2, 3, 4), 0.8), (0, (5, 6, 7, 8), 0.1)])
+    with patch("local_console.core.camera.flatbuffers.subprocess.run") as mock_run:
+        decoded = decoder.decode(payload)
+        mock_run.assert_not_called()
+
+    assert decoded == {
+        "perception": {
+            "object_detection_list": [
+                {
+                    "class_id": 3,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"left": 1, "top": 2, "right": 3, "bottom": 4},
+                    "score": 0.8,
+                },
+                {
+                    # Default value output, as with `flatc --defaults-json`
+                    "class_id": 0,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"left": 5, "top": 6, "right": 7, "bottom": 8},
+                    "score": 0.1,
+                },
+            ]
+        }
+    }
+    ObjectDetection(**decoded)
+
+
+def test_decoder_in_process_classification():
+    builder = flatbuffers.Builder(0)
+    builder.StartObject(2)
+    builder.PrependUint32Slot(0, 7, 0)
+    builder.PrependFloat32Slot(1, 0.929688, 0)
+    item = builder.EndObject()
+    builder.StartVector(4, 1, 4)
+    builder.PrependUOffsetTRelative(item)
+    vector = builder.EndVector()
+    builder.StartObject(1)
+    builder.PrependUOffsetTRelativeSlot(0, vector, 0)
+    data = builder.EndObject()
+    builder.StartObject(1)
+    builder.PrependUOffsetTRelativeSlot(0, data, 0)
+    builder.Finish(builder.EndObject())
+
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / "classification.fbs")
+    assert decoder.decode(bytes(builder.Output())) == {
+        "perception": {"classification_list": [{"class_id": 7, "score": 0.929688}]}
+    }
+
+
+def test_decoder_schema_features(tmp_path):
+    schema = tmp_path / "features.fbs"
+    schema.write_text(
+        """
+        // Exercise the schema features handled in-process
+        namespace sample.types;
+        attribute "custom";
+        enum Color : byte { Red = 1, Green, Blue = 8 }
+        struct Vec2 { x:short; y:float; }
+        table Info (custom) {
+          name:string (id: 1);
+          tags:[string] (id: 2);
+          count:ushort = 5 (id: 0);
+          color:Color = Green (id: 4);
+          points:[Vec2] (id: 3);
+          old:int (deprecated, id: 5);
+          maybe:int = null (id: 6);
+          flag:bool (id: 7);
+          colors:[Color] (id: 8);
+          ratio:double = 0.5 (id: 9);
+        }
+        root_type Info;
+        """
+    )
+    builder = flatbuffers.Builder(0)
+    name = builder.CreateString("camera")
+    tags = [builder.CreateString(t) for t in ("a", "bc")]
+    builder.StartVector(4, len(tags), 4)
+    for t in reversed(tags):
+        builder.PrependUOffsetTRelative(t)
+    tags_vec = builder.EndVector()
+    builder.StartVector(8, 2, 4)
+    for x, y in reversed([(1, 0.5), (-2, 1.25)]):
+        builder.Prep(4, 8)
+        builder.PrependFloat32(y)
+        builder.Pad(2)
+        builder.PrependInt16(x)
+    points = builder.EndVector()
+    builder.StartVector(1, 2, 1)
+    builder.PrependInt8(8)
+    builder.PrependInt8(7)
+    colors = builder.EndVector()
+
+    builder.StartObject(10)
+    builder.PrependUOffsetTRelativeSlot(1, name, 0)
+    builder.PrependUOffsetTRelativeSlot(2, tags_vec, 0)
+    builder.PrependUOffsetTRelativeSlot(3, points, 0)
+    builder.PrependInt32Slot(5, 99, 0)
+    builder.PrependUOffsetTRelativeSlot(8, colors, 0)
+    builder.Finish(builder.EndObject())
+
+    decoded = FlatbufferDecoder(schema).decode(bytes(builder.Output()))
+    assert decoded == {
+        "count": 5,
+        "name": "camera",
+        "tags": ["a", "bc"],
+        "points": [{"x": 1, "y": 0.5}, {"x": -2, "y": 1.25}],
+        "color": "Green",
+        "flag": False,
+        "colors": [7, "Blue"],
+        "ratio": 0.5,
+    }
+    # Fields are given in the order in which flatc prints them
+    assert list(decoded) == [
+        "count",
+        "name",
+        "tags",
+        "points",
+        "color",
+        "flag",
+        "colors",
+        "ratio",
+    ]
+
+
+@pytest.mark.parametrize(
+    "schema_text",
+    [
+        'include "other.fbs"; table A { a:int; } root_type A;',
+        "struct S { a:[int:3]; } table A { s:S; } root_type A;",
+        "enum F : ubyte (bit_flags) { X, Y } table A { f:F; } root_type A;",
+        'table A { n:[ubyte] (nested_flatbuffer: "B"); } root_type A;',
+        "table A { a:int",
+    ],
+)
+def test_decoder_falls_back_to_flatc(tmp_path, schema_text):
+    schema = tmp_path / "unsupported.fbs"
+    schema.write_text(schema_text)
+    decoder = FlatbufferDecoder(schema)
+    assert not decoder.in_process
+
+    with patch(
+        "local_console.core.camera.flatbuffers.flatbuffer_binary_to_json",
+        return_value={"a": 1},
+    ) as mock_flatc:
+        assert decoder.decode(b"payload") == {"a": 1}
+        mock_flatc.assert_called_once_with(schema, b"payload")
+
+
+def test_decoder_batch(tmp_path):
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / "objectdetection.fbs")
+    payloads = [
+        build_detection_payload([(index, (1, 2, 3, 4), 0.5)]) for index in range(3)
+    ]
+    assert decoder.decode_batch(payloads) == [
+        decoder.decode(payload) for payload in payloads
+    ]
+
+    schema = tmp_path / "unsupported.fbs"
+    schema.write_text("table A { a:int")
+    with patch(
+        "local_console.core.camera.flatbuffers.flatbuffer_binaries_to_json",
+        return_value=[{"a": 1}, {"a": 2}],
+    ) as mock_flatc:
+        assert FlatbufferDecoder(schema).decode_batch([b"1", b"2"]) == [
+            {"a": 1},
+            {"a": 2},
+        ]
+        mock_flatc.assert_called_once_with(schema, [b"1", b"2"])
+
+
+def test_decoder_malformed_payload():
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / "classification.fbs")
+    with pytest.raises(FlatbufferError, match="Unexpected error decoding"):
+        decoder.decode(b"\x10\x00")
+
+
+def test_get_flatbuffer_decoder_cache(tmp_path):
+    schema = tmp_path / "schema.fbs"
+    schema.write_text("table A { a:int; } root_type A;")
+
+    decoder = get_flatbuffer_decoder(schema)
+    assert get_flatbuffer_decoder(schema) is decoder
+
+    # A modified schema file is reloaded
+    schema.write_text("table A { a:int; b:int; } root_type A;")
+    os.utime(schema, ns=(0, 0))
+    assert get_flatbuffer_decoder(schema) is not decoder
+
+    with pytest.raises(FlatbufferError):
+        get_flatbuffer_decoder(tmp_path / "missing.fbs")
@@ -0,0 +1,152 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import copy
+import os
+from unittest.mock import patch
+
+import numpy as np
+from local_console.core.camera.fbs_reflection import Schema
+from local_console.core.camera.flatbuffers import add_class_names
+from local_console.core.camera.flatbuffers import FlatbufferDecoder
+from local_console.core.camera.labels import ClassNameAnnotator
+from local_console.core.camera.labels import LabelTable
+from local_console.core.camera.labels import load_label_table
+
+from tests.unit.core.test_flatbuffers import build_detection_payload
+from tests.unit.core.test_flatbuffers import SCHEMAS_DIR
+
+
+def test_label_table():
+    table = LabelTable({0: "person", 2: "", 5: "dog", -1: "none"})
+
+    assert table == {0: "person", 2: "", 5: "dog", -1: "none"}
+    assert repr(table) == repr({0: "person", 2: "", 5: "dog", -1: "none"})
+    assert [table.name_of(i) for i in (0, 1, 2, 5, 6, -1)] == [
+        "person",
+        "Unknown",
+        "",
+        "dog",
+        "Unknown",
+        "none",
+    ]
+    assert table.name_of(np.uint32(5)) == "dog"
+    assert table.name_of("Red") == "Unknown"
+
+    class_ids = np.array([5, 1, 0, 7, 2], dtype=np.uint32)
+    assert table.lookup(class_ids).tolist() == [
+        "dog",
+        "Unknown",
+        "person",
+        "Unknown",
+        "",
+    ]
+    assert LabelTable({}).lookup(class_ids).tolist() == ["Unknown"] * 5
+    assert LabelTable.of(table) is table
+
+
+def test_load_label_table_cache(tmp_path):
+    labels_file = tmp_path / "labels.txt"
+    labels_file.write_text("Apple\nBanana")
+    table = load_label_table(labels_file)
+    assert table == {0: "Apple", 1: "Banana"}
+
+    # Not read again while unchanged
+    with patch("pathlib.Path.read_bytes") as mock_read:
+        assert load_label_table(labels_file) is table
+        mock_read.assert_not_called()
+
+    # Touched but with the same contents, the table is kept
+    stat = labels_file.stat()
+    os.utime(labels_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_label_table(labels_file) is table
+
+    labels_file.write_text("Apple\nCherry")
+    os.utime(labels_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    assert load_label_table(labels_file) == {0: "Apple", 1: "Cherry"}
+
+
+def test_annotator_matches_recursive_walk():
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / "objectdetection.fbs")
+    annotator = ClassNameAnnotator.for_schema(Schema(decoder.fbs.read_text()))
+    assert annotator
+    assert annotator.paths == {
+        "perception": {"object_detection_list": {"class_id": None}}
+    }
+
+    labels = LabelTable({3: "cat"})
+    decoded = decoder.decode(
+        build_detection_payload([(3, (1, 2, 3, 4), 0.8), (0, (5, 6, 7, 8), 0.1)])
+    )
+    expected = copy.deepcopy(decoded)
+    add_class_names(expected, labels)
+    annotator.annotate(decoded, labels)
+    assert decoded == expected
+    assert [
+        item["class_name"] for item in decoded["perception"]["object_detection_list"]
+    ] == ["cat", "Unknown"]
+
+
+def test_annotator_paths():
+    schema = Schema(
+        """
+        struct Box { class_id:int; x:float; }
+        table Cat { class_id:uint; }
+        table Dog { box:Box; size:int; }
+        table Other { name:string; }
+        union Animal { Cat, Dog, Other }
+        table Root { animal:Animal; plain:Other; boxes:[Box]; }
+        root_type Root;
+        """
+    )
+    annotator = ClassNameAnnotator.for_schema(schema)
+    assert annotator
+    assert annotator.paths == {
+        "animal": {"class_id": None, "box": {"class_id": None}},
+        "boxes": {"class_id": None},
+    }
+
+    data = {
+        "animal_type": "Dog",
+        "animal": {"box": {"class_id": 0, "x": 1.0}},
+        "plain": {"name": "class_id"},
+        "boxes": [{"class_id": 1, "x": 0.0}],
+    }
+    annotator.annotate(data, LabelTable({0: "zero"}))
+    assert data == {
+        "animal_type": "Dog",
+        "animal": {"box": {"class_id": 0, "x": 1.0, "class_name": "zero"}},
+        "plain": {"name": "class_id"},
+        "boxes": [{"class_id": 1, "x": 0.0, "class_name": "Unknown"}],
+    }
+
+
+def test_annotator_recursive_schema(tmp_path):
+    schema_file = tmp_path / "node.fbs"
+    schema_file.write_text(
+        "table Node { class_id:int; children:[Node]; } root_type Node;"
+    )
+    assert ClassNameAnnotator.for_schema(Schema(schema_file.read_text())) is None
+
+    # The decoder falls back to walking the whole object
+    decoder = FlatbufferDecoder(schema_file)
+    assert decoder.tensor_kind is None
+    data = {"class_id": 0, "children": [{"class_id": 1, "children": []}]}
+    decoder.add_class_names([data], {1: "one"})
+    assert data == {
+        "class_id": 0,
+        "children": [{"class_id": 1, "children": [], "class_name": "one"}],
+        "class_name": "Unknown",
+    }
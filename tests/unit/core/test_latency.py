@@ -0,0 +1,125 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import json
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+from local_console.core.camera.latency import DECODE
+from local_console.core.camera.latency import DRAW
+from local_console.core.camera.latency import export_latency_report
+from local_console.core.camera.latency import FrameTrace
+from local_console.core.camera.latency import LatencyHistogram
+from local_console.core.camera.latency import LatencyTracker
+from local_console.core.camera.latency import PAIR
+from local_console.core.camera.latency import parse_camera_time
+from local_console.core.camera.latency import PUBLISH
+from local_console.core.camera.latency import RECEIVE
+from local_console.core.camera.latency import STORE
+
+
+@pytest.mark.parametrize(
+    "timestamp, expected",
+    [
+        (
+            "20240326110151928",
+            datetime(2024, 3, 26, 11, 1, 51, 928000, timezone.utc).timestamp(),
+        ),
+        ("20241332110151928", None),
+        ("0", None),
+        ("boo", None),
+    ],
+)
+def test_parse_camera_time(timestamp, expected):
+    assert parse_camera_time(timestamp) == expected
+
+
+def make_trace(camera_time: float) -> FrameTrace:
+    trace = FrameTrace(camera_time=camera_time)
+    for offset, point in enumerate((RECEIVE, PAIR, DECODE, DRAW, STORE, PUBLISH)):
+        trace.mark(point, 100.0 + offset * 0.01)
+    return trace
+
+
+def test_frame_trace_spans():
+    spans = make_trace(99.9).spans()
+    assert spans.keys() == {
+        "upload",
+        "pair",
+        "decode",
+        "draw",
+        "store",
+        "publish",
+        "pipeline",
+        "total",
+    }
+    assert spans["upload"] == pytest.approx(100)
+    assert spans["decode"] == pytest.approx(10)
+    assert spans["pipeline"] == pytest.approx(50)
+    assert spans["total"] == pytest.approx(150)
+
+    # A camera clock ahead of the host's leaves its spans out
+    assert "upload" not in make_trace(100.01).spans()
+    assert "total" in make_trace(100.01).spans()
+
+    # Spans whose ends were not reached are left out
+    trace = FrameTrace()
+    trace.mark(RECEIVE, 1.0)
+    trace.mark(PAIR, 1.5)
+    assert trace.spans() == {"pair": 500.0}
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.5) == 0.0
+
+    for value in [0.5] * 50 + [30] * 45 + [20000] * 5:
+        histogram.add(value)
+
+    assert histogram.count == 100
+    assert histogram.percentile(0.5) == 1
+    assert histogram.percentile(0.95) == 50
+    assert histogram.percentile(0.99) == 20000
+    assert histogram.min == 0.5
+    assert histogram.max == 20000
+
+    stats = histogram.to_dict()
+    assert stats["buckets_ms"]["<=1"] == 50
+    assert stats["buckets_ms"]["<=50"] == 45
+    assert stats["buckets_ms"][">10000"] == 5
+    assert sum(stats["buckets_ms"].values()) == 100
+
+
+def test_latency_tracker(tmp_path):
+    tracker = LatencyTracker()
+    assert tracker.headline() == ""
+
+    trace = make_trace(camera_time=None)
+    tracker.record(trace)
+    assert tracker.headline() == "Latency (pipeline) p50/p95: 50/50 ms"
+
+    tracker.record(make_trace(camera_time=99.9))
+    assert tracker.headline() == "Latency (total) p50/p95: 150/150 ms"
+    assert "pipeline         2" in tracker.summary()
+
+    report_path = tmp_path / "latency.json"
+    export_latency_report(report_path, {"1883": tracker})
+    report = json.loads(report_path.read_text())
+    assert report["1883"]["pipeline"]["count"] == 2
+    assert report["1883"]["total"]["count"] == 1
+
+    tracker.reset()
+    assert tracker.to_dict() == {}
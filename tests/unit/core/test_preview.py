@@ -0,0 +1,86 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import cv2
+import numpy as np
+import pytest
+from local_console.core.camera.preview import decode_pixels
+from local_console.core.camera.preview import jpeg_size
+from local_console.core.camera.preview import preview_reduction
+
+
+def test_decode_pixels(tmp_path):
+    img = np.zeros((2, 3, 3), dtype=np.uint8)
+    # Blue in BGR, at the top left corner
+    img[0, 0] = (255, 0, 0)
+    image = tmp_path / "a.png"
+    image.write_bytes(cv2.imencode(".png", img)[1].tobytes())
+
+    pixels = decode_pixels(image)
+    assert pixels.size == (3, 2)
+    assert pixels.data[:6] == bytes([0, 0, 255, 0, 0, 0])
+    assert len(pixels.data) == 3 * 2 * 3
+
+    # Data kept in memory is decoded instead of the file
+    assert decode_pixels(tmp_path / "missing.png", image.read_bytes()) == pixels
+
+
+def test_decode_pixels_failure(tmp_path):
+    assert decode_pixels(tmp_path / "missing.jpg") is None
+    assert decode_pixels(tmp_path / "a.jpg", b"not an image") is None
+
+
+def test_jpeg_size():
+    jpeg = cv2.imencode(".jpg", np.zeros((30, 40, 3), dtype=np.uint8))[1].tobytes()
+    assert jpeg_size(jpeg) == (40, 30)
+
+    png = cv2.imencode(".png", np.zeros((30, 40, 3), dtype=np.uint8))[1].tobytes()
+    assert jpeg_size(png) is None
+    assert jpeg_size(jpeg[:20]) is None
+    assert jpeg_size(b"") is None
+
+
+@pytest.mark.parametrize(
+    "image_size, view_size, reduction",
+    [
+        ((4056, 3040), (700, 500), 4),
+        ((4056, 3040), (500, 700), 8),
+        ((4056, 3040), (2028, 2000), 2),
+        ((4056, 3040), (2100, 2000), 1),
+        ((640, 480), (2000, 2000), 1),
+        ((640, 480), (0, 0), 1),
+    ],
+)
+def test_preview_reduction(image_size, view_size, reduction):
+    assert preview_reduction(image_size, view_size) == reduction
+
+
+def test_decode_pixels_reduced(tmp_path):
+    img = np.zeros((64, 96, 3), dtype=np.uint8)
+    jpeg = cv2.imencode(".jpg", img)[1].tobytes()
+
+    pixels = decode_pixels(tmp_path / "a.jpg", jpeg, (24, 24))
+    assert pixels.reduction == 4
+    assert pixels.size == (24, 16)
+    assert len(pixels.data) == 24 * 16 * 3
+
+    # Full resolution when the view is not known or large enough
+    assert decode_pixels(tmp_path / "a.jpg", jpeg).size == (96, 64)
+    assert decode_pixels(tmp_path / "a.jpg", jpeg, (200, 200)).size == (96, 64)
+
+    # Only JPEG images can be decoded at a reduced scale
+    png = cv2.imencode(".png", img)[1].tobytes()
+    pixels = decode_pixels(tmp_path / "a.png", png, (24, 24))
+    assert (pixels.size, pixels.reduction) == ((96, 64), 1)
@@ -13,11 +13,18 @@
 # limitations under the License.
 #
 # SPDX-License-Identifier: Apache-2.0
+from datetime import timedelta
 from pathlib import Path
 
 import pytest
+import trio
+from local_console.core.camera.enums import FramePolicy
 from local_console.core.camera.streaming import FileGrouping
 from local_console.core.camera.streaming import FileGroupingError
+from local_console.core.camera.streaming import FrameSelector
+from local_console.core.camera.streaming import GroupingStats
+from local_console.core.camera.streaming import OrphanReason
+from local_console.core.camera.streaming import run_stage
 
 
 def test_file_grouping():
@@ -60,3 +67,113 @@ def test_file_grouping_unknown_parent():
 
     with pytest.raises(FileGroupingError):
         fg.register(Path("videos/somename.mkv"), None)
+
+
+def test_file_grouping_expiry():
+    now = 0.0
+    orphans = []
+    fg = FileGrouping(
+        {"jpg", "txt"},
+        max_age=timedelta(seconds=10),
+        on_orphan=lambda *args: orphans.append(args),
+        clock=lambda: now,
+    )
+
+    fg.register(Path("images/0.jpg"), 0)
+    now = 5.0
+    fg.register(Path("images/1.jpg"), 1)
+    now = 12.0
+    fg.register(Path("inferences/1.txt"), 1)
+
+    # The first group expired before its inference arrived
+    assert orphans == [("0", {"jpg": 0}, OrphanReason.EXPIRED)]
+    assert next(fg) == {"jpg": 1, "txt": 1}
+    assert fg.pending == 0
+
+    fg.register(Path("inferences/2.txt"), 2)
+    now = 30.0
+    assert fg.evict_expired() == 1
+    assert fg.stats == GroupingStats(completed=1, expired=2)
+    assert fg.stats.orphan_rate == pytest.approx(2 / 3)
+
+
+def test_file_grouping_overflow():
+    orphans = []
+    fg = FileGrouping(
+        {"jpg", "txt"},
+        max_pending=2,
+        max_age=None,
+        on_orphan=lambda stem, group, reason: orphans.append((stem, reason)),
+    )
+
+    for index in range(4):
+        fg.register(Path(f"images/{index}.jpg"), index)
+    fg.register(Path("inferences/3.txt"), 3)
+
+    # The oldest incomplete groups are evicted first
+    assert orphans == [("0", OrphanReason.OVERFLOW), ("1", OrphanReason.OVERFLOW)]
+    assert [g["txt"] for g in fg] == [3]
+    assert fg.pending == 1
+    assert fg.stats.overflowed == 2
+
+
+@pytest.mark.trio
+async def test_run_stage(caplog):
+    def work(item: int):
+        if item == 2:
+            raise ValueError("bad item")
+        yield from [item] * item
+
+    send_in, receive_in = trio.open_memory_channel(0)
+    send_out, receive_out = trio.open_memory_channel(10)
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(
+            run_stage, "test", work, receive_in, send_out, trio.CapacityLimiter(1)
+        )
+        async with send_in:
+            for item in range(4):
+                await send_in.send(item)
+
+    # Failing items are skipped and the downstream channel gets closed
+    assert [item async for item in receive_out] == [1, 3, 3, 3]
+    assert "Error in the test stage of the pipeline: bad item" in caplog.text
+
+
+@pytest.mark.trio
+async def test_run_stage_batch():
+    batches = []
+
+    def work(pending: list[int]):
+        batches.append(pending)
+        yield pending[-1]
+
+    send_in, receive_in = trio.open_memory_channel(10)
+    send_out, receive_out = trio.open_memory_channel(10)
+    async with send_in:
+        for item in range(4):
+            await send_in.send(item)
+
+    await run_stage("test", work, receive_in, send_out, batch=True)
+
+    # All items waiting in the channel are handed over at once
+    assert batches == [[0, 1, 2, 3]]
+    assert [item async for item in receive_out] == [3]
+
+
+@pytest.mark.parametrize(
+    "policy, nth, kept",
+    [
+        (FramePolicy.PROCESS_ALL, 1, [[0, 1, 2], [3], [4, 5, 6, 7]]),
+        (FramePolicy.LATEST_WINS, 1, [[2], [3], [7]]),
+        (FramePolicy.EVERY_NTH, 3, [[0], [3], [6]]),
+        (FramePolicy.EVERY_NTH, 2, [[0, 2], [], [4, 6]]),
+        (FramePolicy.EVERY_NTH, 0, [[0, 1, 2], [3], [4, 5, 6, 7]]),
+    ],
+)
+def test_frame_selector(policy, nth, kept):
+    selector = FrameSelector(policy, nth)
+    batches = [[0, 1, 2], [3], [4, 5, 6, 7]]
+
+    assert [selector.select(batch) for batch in batches] == kept
+    assert selector.received == 8
+    assert selector.dropped == 8 - sum(len(batch) for batch in kept)
@@ -0,0 +1,165 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import json
+
+import flatbuffers
+import numpy as np
+import pytest
+from local_console.core.camera.fbs_reflection import Schema
+from local_console.core.camera.fbs_reflection import SchemaError
+from local_console.core.camera.flatbuffers import FlatbufferDecoder
+from local_console.core.camera.flatbuffers import FlatbufferError
+from local_console.core.camera.tensors import as_tensor
+from local_console.core.camera.tensors import decode_tensor
+from local_console.core.camera.tensors import InferenceTensor
+from local_console.core.camera.tensors import match_schema
+from local_console.core.camera.tensors import SCHEMAS_DIR
+from local_console.core.camera.tensors import TensorKind
+
+from tests.unit.core.test_flatbuffers import build_detection_payload
+
+
+def build_classification_payload(classes: list[tuple[int, float]]) -> bytes:
+    builder = flatbuffers.Builder(0)
+    items = []
+    for class_id, score in classes:
+        builder.StartObject(2)
+        builder.PrependUint32Slot(0, class_id, 0)
+        builder.PrependFloat32Slot(1, score, 0)
+        items.append(builder.EndObject())
+    builder.StartVector(4, len(items), 4)
+    for item in reversed(items):
+        builder.PrependUOffsetTRelative(item)
+    vector = builder.EndVector()
+    builder.StartObject(1)
+    builder.PrependUOffsetTRelativeSlot(0, vector, 0)
+    data = builder.EndObject()
+    builder.StartObject(1)
+    builder.PrependUOffsetTRelativeSlot(0, data, 0)
+    builder.Finish(builder.EndObject())
+    return bytes(builder.Output())
+
+
+@pytest.mark.parametrize(
+    "kind, payload",
+    [
+        (
+            TensorKind.CLASSIFICATION,
+            build_classification_payload([(7, 0.929688), (0, 0.5), (2, 0.0)]),
+        ),
+        (
+            TensorKind.DETECTION,
+            build_detection_payload([(3, (1, 2, 3, 4), 0.8), (0, (-5, 6, 7, 8), 0.1)]),
+        ),
+        (TensorKind.DETECTION, build_detection_payload([])),
+    ],
+)
+def test_decode_tensor_matches_decoder(kind, payload):
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / kind.value)
+    assert decoder.tensor_kind == kind
+
+    (tensor,) = decoder.decode_tensors([payload])
+    assert tensor.records.dtype == kind.dtype
+    assert tensor.to_dict() == decoder.decode(payload)
+    assert as_tensor(kind, decoder.decode(payload)).to_dict() == tensor.to_dict()
+
+
+def test_detection_without_box():
+    payload = build_detection_payload([(3, None, 0.8), (0, (5, 6, 7, 8), 0.1)])
+    # As output by `flatc --defaults-json` for the payload
+    flatc_output = {
+        "perception": {
+            "object_detection_list": [
+                {"class_id": 3, "bounding_box_type": "NONE", "score": 0.8},
+                {
+                    "class_id": 0,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"left": 5, "top": 6, "right": 7, "bottom": 8},
+                    "score": 0.1,
+                },
+            ]
+        }
+    }
+
+    tensor = decode_tensor(TensorKind.DETECTION, payload)
+    assert tensor.records["bounding_box_type"].tolist() == [0, 1]
+    output = tensor.to_dict()
+    assert json.dumps(output) == json.dumps(flatc_output)
+
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / "objectdetection.fbs")
+    assert decoder.decode(payload) == flatc_output
+    assert as_tensor(TensorKind.DETECTION, flatc_output).to_dict() == flatc_output
+
+
+def test_detection_records():
+    payload = build_detection_payload([(3, (1, 2, 3, 4), 0.5), (9, (5, 6, 7, 8), 0.25)])
+    tensor = decode_tensor(TensorKind.DETECTION, payload)
+
+    assert tensor.records["class_id"].tolist() == [3, 9]
+    assert tensor.records["score"].tolist() == [0.5, 0.25]
+    assert tensor.records[["left", "top", "right", "bottom"]].tolist() == [
+        (1, 2, 3, 4),
+        (5, 6, 7, 8),
+    ]
+
+
+def test_apply_labels():
+    payload = build_classification_payload([(2, 0.5), (0, 0.25), (7, 0.1)])
+    tensor = decode_tensor(TensorKind.CLASSIFICATION, payload)
+    assert tensor.labels().tolist() == ["2", "0", "7"]
+
+    tensor.apply_labels({0: "person", 2: "cat", 5: "dog"})
+    assert tensor.class_names.tolist() == ["cat", "person", "Unknown"]
+    assert tensor.labels().tolist() == ["cat", "person", "Unknown"]
+    assert [
+        item["class_name"]
+        for item in tensor.to_dict()["perception"]["classification_list"]
+    ] == ["cat", "person", "Unknown"]
+
+    tensor.apply_labels({})
+    assert tensor.class_names.tolist() == ["Unknown"] * 3
+
+
+def test_as_tensor_of_other_kind():
+    tensor = InferenceTensor(
+        TensorKind.CLASSIFICATION, np.zeros(1, TensorKind.CLASSIFICATION.dtype)
+    )
+    assert as_tensor(TensorKind.CLASSIFICATION, tensor) is tensor
+    with pytest.raises(ValueError):
+        as_tensor(TensorKind.DETECTION, tensor)
+
+
+def test_match_schema_by_layout():
+    # Type names do not matter, only how payloads are laid out
+    renamed = (SCHEMAS_DIR / "classification.fbs").read_text()
+    renamed = renamed.replace("GeneralClassification", "Item")
+    assert match_schema(Schema(renamed)) == TensorKind.CLASSIFICATION
+
+    reordered = renamed.replace(
+        "class_id:uint;\n  score:float;", "score:float;\n  class_id:uint;"
+    )
+    assert match_schema(Schema(reordered)) is None
+    assert match_schema(Schema("table A { a:int; } root_type A;")) is None
+
+
+def test_decode_tensor_malformed_payload():
+    payload = build_detection_payload([(3, (1, 2, 3, 4), 0.8)])
+    with pytest.raises(SchemaError, match="Malformed payload"):
+        decode_tensor(TensorKind.DETECTION, payload[:24])
+
+    decoder = FlatbufferDecoder(SCHEMAS_DIR / "objectdetection.fbs")
+    with pytest.raises(FlatbufferError, match="Unexpected error decoding"):
+        decoder.decode_tensors([b"\x10\x00"])
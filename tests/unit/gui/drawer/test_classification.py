@@ -16,7 +16,10 @@
 from pathlib import Path
 from unittest.mock import patch
 
+import cv2
+import numpy as np
 from local_console.gui.drawer.classification import ClassificationDrawer
+from local_console.gui.drawer.drawer import Overlay
 from tests.fixtures.drawer import blank_image  # noreorder # noqa
 
 
@@ -41,3 +44,42 @@ def test_process_frame_text(blank_image):
 
 def test_process_frame_without_output_tensor():
     ClassificationDrawer.process_frame(Path("."), None)
+
+
+def test_process_overlay():
+    output = {
+        "perception": {
+            "classification_list": [
+                {"class_id": index, "score": 0.1 * index} for index in range(7)
+            ]
+        }
+    }
+    assert ClassificationDrawer.process_overlay(output) == Overlay(
+        captions=["0: 0.00", "1: 0.10", "2: 0.20", "3: 0.30", "4: 0.40"]
+    )
+    assert ClassificationDrawer.process_overlay(None) is None
+
+
+def test_text_sizes_kept_across_frames(blank_image):
+    image_path, _ = blank_image
+    output = {
+        "perception": {
+            "classification_list": [
+                {"class_id": index, "score": 0.1 * index} for index in range(3)
+            ]
+        }
+    }
+    ClassificationDrawer.metrics.set_image_height(0)
+    data = image_path.read_bytes()
+
+    with patch(
+        "local_console.gui.drawer.text.cv2.getTextSize", wraps=cv2.getTextSize
+    ) as mock_size:
+        first = ClassificationDrawer.process_buffer(data, output, ".png")
+        second = ClassificationDrawer.process_buffer(data, output, ".png")
+        assert first == second
+        assert mock_size.call_count == 3
+
+        taller = np.zeros((600, 100, 3), dtype=np.uint8)
+        ClassificationDrawer.draw(taller, output)
+        assert mock_size.call_count == 6
@@ -18,6 +18,11 @@ from unittest.mock import patch
 
 import cv2
 import numpy as np
+import pytest
+from local_console.core.camera.tensors import InferenceTensor
+from local_console.core.camera.tensors import TensorKind
+from local_console.gui.drawer.drawer import Overlay
+from local_console.gui.drawer.drawer import OverlayBox
 from local_console.gui.drawer.objectdetection import DetectionDrawer
 from tests.fixtures.drawer import blank_image  # noreorder # noqa
 
@@ -83,13 +88,17 @@ def test_process_frame_text(blank_image):
         }
     }
 
-    with patch("local_console.gui.drawer.objectdetection.cv2") as mock_cv2:
+    with (
+        patch("local_console.gui.drawer.objectdetection.cv2") as mock_cv2,
+        patch("local_console.gui.drawer.drawer.cv2") as mock_drawer_cv2,
+    ):
+        mock_drawer_cv2.imread.return_value = np.zeros((10, 10, 3), np.uint8)
         DetectionDrawer.process_frame(image_path, output)
         mock_cv2.putText.assert_called_once_with(
             mock_cv2.rectangle.return_value,
             "person: 0.10",
             (left, top),
-            mock_cv2.FONT_HERSHEY_SIMPLEX,
+            DetectionDrawer.metrics.font,
             0.5,
             (255, 255, 255),
             1,
@@ -98,3 +107,164 @@ def test_process_frame_text(blank_image):
 
 def test_process_frame_without_output_tensor():
     DetectionDrawer.process_frame(Path("."), None)
+
+
+def test_process_buffer(blank_image):
+    image_path, _ = blank_image
+    output = {
+        "perception": {
+            "object_detection_list": [
+                {
+                    "class_id": 0,
+                    "bounding_box_type": "mytype",
+                    "bounding_box": {"top": 1, "left": 1, "right": 5, "bottom": 4},
+                    "score": 0.1,
+                }
+            ]
+        }
+    }
+
+    # Drawing over the encoded image matches drawing over its file
+    encoded = DetectionDrawer.process_buffer(image_path.read_bytes(), output, ".png")
+    DetectionDrawer.process_frame(image_path, output)
+    assert encoded == image_path.read_bytes()
+
+    data = b"not an image"
+    assert DetectionDrawer.process_buffer(data, None) == data
+    with pytest.raises(ValueError):
+        DetectionDrawer.process_buffer(data, output)
+
+
+def test_process_frame_tensor(blank_image, tmp_path):
+    image_path, _ = blank_image
+    output = {
+        "perception": {
+            "object_detection_list": [
+                {
+                    "class_id": 0,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"top": 1, "left": 1, "right": 5, "bottom": 4},
+                    "score": 0.1,
+                    "class_name": "person",
+                }
+            ]
+        }
+    }
+    tensor = InferenceTensor.from_dict(TensorKind.DETECTION, output)
+
+    # Drawing from the arrays matches drawing from the decoded objects
+    encoded = DetectionDrawer.process_buffer(image_path.read_bytes(), tensor, ".png")
+    DetectionDrawer.process_frame(image_path, output)
+    assert encoded == image_path.read_bytes()
+
+    classification = InferenceTensor(
+        TensorKind.CLASSIFICATION, np.zeros(1, TensorKind.CLASSIFICATION.dtype)
+    )
+    with pytest.raises(ValueError):
+        DetectionDrawer.process_frame(image_path, classification)
+
+
+def test_process_overlay():
+    output = {
+        "perception": {
+            "object_detection_list": [
+                {
+                    "class_id": 0,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"top": 1, "left": 2, "right": 5, "bottom": 4},
+                    "score": 0.1,
+                    "class_name": "person",
+                },
+                {
+                    "class_id": 7,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"top": 3, "left": 4, "right": 8, "bottom": 9},
+                    "score": 0.25,
+                },
+            ]
+        }
+    }
+    assert DetectionDrawer.process_overlay(output) == Overlay(
+        boxes=[
+            OverlayBox(2, 1, 5, 4, "person: 0.10"),
+            OverlayBox(4, 3, 8, 9, "7: 0.25"),
+        ]
+    )
+    assert DetectionDrawer.process_overlay(None) is None
+
+
+def test_overlay_reduced():
+    overlay = Overlay(boxes=[OverlayBox(9, 4, 17, 30, "cat")], captions=["dog"])
+    assert overlay.reduced(1) is overlay
+    assert overlay.reduced(4) == Overlay(
+        boxes=[OverlayBox(2, 1, 4, 7, "cat")], captions=["dog"]
+    )
+
+
+def test_captions_out_of_image(blank_image):
+    image_path, _ = blank_image
+    img = cv2.imread(str(image_path))
+    height, width = img.shape[:2]
+    boxes = [(-200, 5), (width + 5, 5), (2, -20), (2, height + 20), (2, height + 5)]
+    output = {
+        "perception": {
+            "object_detection_list": [
+                {
+                    "class_id": 0,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {
+                        "top": top,
+                        "left": left,
+                        "right": left + 3,
+                        "bottom": top + 3,
+                    },
+                    "score": 0.5,
+                }
+                for left, top in boxes
+            ]
+        }
+    }
+
+    # Drawn the same, without drawing captions that would not be visible
+    with patch(
+        "local_console.gui.drawer.objectdetection.cv2.putText", wraps=cv2.putText
+    ) as mock_put_text:
+        drawn = DetectionDrawer.draw(img.copy(), output)
+        assert mock_put_text.call_count == 1
+
+    expected = img.copy()
+    for left, top in boxes:
+        expected = cv2.rectangle(
+            expected, (left, top), (left + 3, top + 3), (0, 0, 255), 2
+        )
+        expected = cv2.putText(
+            expected,
+            "0: 0.50",
+            (left, top),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (255, 255, 255),
+            1,
+        )
+    assert np.array_equal(drawn, expected)
+
+
+def test_overlay_items_without_box():
+    output = {
+        "perception": {
+            "object_detection_list": [
+                {"class_id": 3, "bounding_box_type": "NONE", "score": 0.8},
+                {
+                    "class_id": 0,
+                    "bounding_box_type": "BoundingBox2d",
+                    "bounding_box": {"top": 1, "left": 2, "right": 5, "bottom": 4},
+                    "score": 0.1,
+                    "class_name": "person",
+                },
+            ]
+        }
+    }
+    # Items without a box are not drawn
+    assert DetectionDrawer.overlay(output) == Overlay(
+        boxes=[OverlayBox(2, 1, 5, 4, "person: 0.10")]
+    )
@@ -0,0 +1,56 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+from unittest.mock import patch
+
+import cv2
+from local_console.gui.drawer.text import TextMetrics
+
+
+def test_text_size_cached():
+    metrics = TextMetrics()
+    expected = cv2.getTextSize("dog: 0.50", cv2.FONT_HERSHEY_SIMPLEX, 0.8, 1)
+    assert metrics.text_size("dog: 0.50", 0.8, 1) == expected
+
+    with patch(
+        "local_console.gui.drawer.text.cv2.getTextSize", wraps=cv2.getTextSize
+    ) as mock_size:
+        assert metrics.text_size("dog: 0.50", 0.8, 1) == expected
+        mock_size.assert_not_called()
+
+        # Same height, so the sizes are kept
+        metrics.set_image_height(None)
+        metrics.text_size("dog: 0.50", 0.8, 1)
+        mock_size.assert_not_called()
+
+        # Font scales follow the image height, so sizes are measured again
+        metrics.set_image_height(300)
+        assert metrics.text_size("dog: 0.50", 0.8, 1) == expected
+        mock_size.assert_called_once()
+
+
+def test_text_size_bounds():
+    metrics = TextMetrics(max_entries=2)
+    for text in ("a", "b", "a", "c"):
+        metrics.text_size(text, 0.5, 1)
+    assert [key[0] for key in metrics._sizes] == ["a", "c"]
+
+    metrics.set_image_height(600)
+    assert len(metrics) == 0
+
+    # Nothing is kept without room for entries
+    metrics = TextMetrics(max_entries=0)
+    metrics.text_size("a", 0.5, 1)
+    assert len(metrics) == 0
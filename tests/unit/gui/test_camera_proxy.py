@@ -23,6 +23,7 @@ from local_console.core.camera.enums import DeploymentType
 from local_console.core.camera.enums import DeployStage
 from local_console.core.camera.enums import OTAUpdateModule
 from local_console.core.camera.enums import StreamStatus
+from local_console.core.camera.preview import FramePixels
 from local_console.core.config import config_obj
 from local_console.gui.model.camera_proxy import CameraStateProxy
 
@@ -366,3 +367,27 @@ def test_difference_of_property_with_force_dispatch(tmp_path):
     test_pilot["was_called"] = False
     camera_proxy.forced_prop = True
     assert test_pilot["was_called"]
+
+
+@pytest.mark.trio
+async def test_push_frame(cs_init) -> None:
+    camera_proxy = CameraStateProxy()
+    camera_state = cs_init
+    camera_proxy.bind_streaming_and_inference(camera_state)
+    assert camera_state.decode_stream_pixels
+    camera_proxy.stream_view_size = [640.0, 480.5]
+    assert camera_state.stream_view_size.value == (640, 480)
+
+    textures = []
+    camera_proxy.bind(stream_texture=lambda instance, value: textures.append(value))
+    camera_state.stream_pixels.value = FramePixels(4, 2, bytes(4 * 2 * 3))
+    camera_state.stream_pixels.value = FramePixels(4, 2, bytes([255] * 4 * 2 * 3))
+
+    # The same texture is dispatched for each frame of the same size
+    assert len(textures) == 2
+    assert textures[0] is textures[1]
+    assert tuple(textures[0].size) == (4, 2)
+
+    camera_state.stream_pixels.value = FramePixels(8, 4, bytes(8 * 4 * 3))
+    assert textures[2] is not textures[1]
+    assert tuple(textures[2].size) == (8, 4)
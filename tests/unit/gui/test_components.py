@@ -13,9 +13,18 @@
 # limitations under the License.
 #
 # SPDX-License-Identifier: Apache-2.0
+from unittest.mock import patch
+
 import pytest
 from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Line
+from kivy.graphics import Rectangle
+from kivy.graphics.texture import Texture
+from local_console.gui.drawer.drawer import Overlay
+from local_console.gui.drawer.drawer import OverlayBox
 from local_console.gui.view.common.components import CodeInputCustom
+from local_console.gui.view.common.components import ImageWithROI
 
 
 @pytest.mark.disable_mock_schedule_once
@@ -27,3 +36,70 @@ def test_code_input_custom():
     assert tuple(code_input.cursor) != (0, 0)
     Clock.tick()
     assert tuple(code_input.cursor) == (0, 0)
+
+
+def test_image_overlay():
+    image = ImageWithROI(size=(200, 200), pos=(0, 0), fit_mode="contain")
+    image.texture = Texture.create(size=(100, 50))
+    assert tuple(image.norm_image_size) == (200, 100)
+    assert image._overlay_group.children == []
+
+    image.overlay = Overlay(
+        boxes=[OverlayBox(10, 5, 30, 25, "cat: 0.50")], captions=["dog: 0.25"]
+    )
+    # Image pixels are mapped to the area the image is fit into,
+    # which is centered within the widget, with y pointing upwards.
+    assert image.image_to_canvas(0, 0) == (0, 150)
+    assert image.image_to_canvas(30, 25) == (60, 100)
+    lines = [i for i in image._overlay_group.children if isinstance(i, Line)]
+    assert len(lines) == 1
+    box_caption, background, caption = [
+        i for i in image._overlay_group.children if isinstance(i, Rectangle)
+    ]
+    # Over the box, and listed from the top left corner
+    assert tuple(box_caption.pos) == (20, 140)
+    assert tuple(caption.pos) == tuple(background.pos)
+    assert caption.pos[0] == 0
+    assert caption.pos[1] + caption.size[1] == 150
+
+    image.overlay = None
+    assert image._overlay_group.children == []
+
+
+def test_caption_textures_are_cached():
+    image = ImageWithROI(size=(200, 200), pos=(0, 0), fit_mode="contain")
+    image.texture = Texture.create(size=(100, 50))
+
+    def overlay() -> Overlay:
+        return Overlay(
+            boxes=[OverlayBox(10, 5, 30, 25, "cat: 0.50")] * 100,
+            captions=["dog: 0.25"],
+        )
+
+    with patch(
+        "local_console.gui.view.common.components.CoreLabel", wraps=CoreLabel
+    ) as mock_label:
+        image.overlay = overlay()
+        image.overlay = overlay()
+        assert mock_label.call_count == 2
+        rectangles = [
+            i for i in image._overlay_group.children if isinstance(i, Rectangle)
+        ]
+        cached = list(image._caption_textures.values())
+        assert sum(r.texture in cached for r in rectangles) == 101
+
+        # Rendered anew at another font size
+        image.overlay_font_size = 20
+        assert mock_label.call_count == 4
+        assert len(image._caption_textures) == 2
+
+
+def test_image_frame_texture():
+    image = ImageWithROI()
+    texture = Texture.create(size=(4, 2))
+    image.frame_texture = texture
+    assert image.texture is texture
+
+    # Streamed frames keep being displayed while no frame is pushed
+    image.frame_texture = None
+    assert image.texture is texture
@@ -13,6 +13,7 @@
 # limitations under the License.
 #
 # SPDX-License-Identifier: Apache-2.0
+import json
 import random
 import shutil
 from pathlib import Path
@@ -27,6 +28,9 @@ from hypothesis import settings
 from hypothesis import strategies as st
 from local_console.core.camera.axis_mapping import SENSOR_SIZE
 from local_console.core.camera.enums import StreamStatus
+from local_console.core.camera.latency import FrameTrace
+from local_console.core.camera.latency import PUBLISH
+from local_console.core.camera.latency import RECEIVE
 from local_console.core.schemas.edge_cloud_if_v1 import StartUploadInferenceData
 from local_console.core.schemas.schemas import DeviceConnection
 from local_console.core.schemas.schemas import MQTTParams
@@ -152,3 +156,19 @@ async def test_send_ppl_configuration(mocked_driver_with_agent, cs_init) -> None
 
     await driver.send_app_config(config)
     mock_send_app_config.send_app_config.assert_awaited_with(config)
+
+
+@pytest.mark.trio
+async def test_report_latency(mocked_driver_with_agent, cs_init, tmp_path) -> None:
+    driver, _ = mocked_driver_with_agent
+    driver.device_manager = MagicMock()
+    driver.device_manager.state_factory = {1883: cs_init}
+    trace = FrameTrace()
+    trace.mark(RECEIVE, 1.0)
+    trace.mark(PUBLISH, 1.1)
+    cs_init.latency.record(trace)
+
+    report_path = tmp_path / "latency.json"
+    driver.report_latency(report_path)
+    report = json.loads(report_path.read_text())
+    assert report["1883"]["pipeline"]["count"] == 1
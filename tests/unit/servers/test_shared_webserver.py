@@ -0,0 +1,159 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+from functools import partial
+from unittest.mock import Mock
+
+import pytest
+import requests
+import trio
+from local_console.servers.shared_webserver import serve_directory
+from local_console.servers.shared_webserver import SharedWebserver
+from local_console.servers.webserver import InMemoryUpload
+
+
+async def put(url: str, data: bytes) -> requests.Response:
+    return await trio.to_thread.run_sync(partial(requests.put, url, data=data))
+
+
+async def get(url: str) -> requests.Response:
+    return await trio.to_thread.run_sync(requests.get, url)
+
+
+@pytest.mark.trio
+async def test_uploads_are_routed_per_device(tmp_path):
+    channels = {key: trio.open_memory_channel(1) for key in ("1883", "1884")}
+    async with SharedWebserver() as server:
+        prefixes = {}
+        for key, (send_channel, _) in channels.items():
+            tmp_path.joinpath(key).mkdir()
+            prefixes[key] = server.register_device(key, tmp_path / key, send_channel)
+        assert server.devices == ["1883", "1884"]
+
+        for key, prefix in prefixes.items():
+            url = f"http://localhost:{server.port}{prefix}/images/{key}.jpg"
+            response = await put(url, key.encode())
+            assert response.status_code == 200
+
+    for key, (_, receive_channel) in channels.items():
+        dest_path = receive_channel.receive_nowait()
+        assert dest_path == tmp_path / key / "images" / f"{key}.jpg"
+        assert dest_path.read_bytes() == key.encode()
+        with pytest.raises(trio.WouldBlock):
+            receive_channel.receive_nowait()
+
+
+@pytest.mark.trio
+async def test_upload_to_unknown_device(tmp_path, caplog):
+    send_channel, receive_channel = trio.open_memory_channel(1)
+    async with SharedWebserver() as server:
+        prefix = server.register_device("1883", tmp_path, send_channel)
+        server.unregister_device("1883")
+        assert server.devices == []
+
+        for target in (f"{prefix}/image.jpg", "/dev/1884/image.jpg", "/image.jpg"):
+            url = f"http://localhost:{server.port}{target}"
+            response = await put(url, b"data")
+            assert response.status_code == 403
+
+    assert caplog.text.count("Error while receiving data") == 3
+    assert not any(tmp_path.iterdir())
+    with pytest.raises(trio.WouldBlock):
+        receive_channel.receive_nowait()
+
+
+@pytest.mark.trio
+async def test_uploads_in_memory_per_device(tmp_path):
+    send_channel, receive_channel = trio.open_memory_channel(2)
+    async with SharedWebserver() as server:
+        prefix = server.register_device("1883", tmp_path, send_channel, True)
+        url = f"http://localhost:{server.port}{prefix}/a.jpg"
+        await put(url, b"memory")
+        server.set_in_memory("1883", False)
+        await put(url, b"disk")
+
+    assert receive_channel.receive_nowait() == InMemoryUpload(
+        tmp_path / "a.jpg", b"memory"
+    )
+    assert receive_channel.receive_nowait() == tmp_path / "a.jpg"
+    assert tmp_path.joinpath("a.jpg").read_bytes() == b"disk"
+
+
+def test_register_device_twice(tmp_path):
+    server = SharedWebserver()
+    server.register_device("1883", tmp_path)
+    with pytest.raises(ValueError):
+        server.register_device("1883", tmp_path)
+
+
+@pytest.mark.trio
+async def test_published_artifacts(tmp_path):
+    tmp_path.joinpath("firmware.bin").write_bytes(b"firmware")
+    tmp_path.joinpath("subdir").mkdir()
+    tmp_path.joinpath("subdir", "model.pkg").write_bytes(b"model")
+    callback = Mock()
+
+    async with SharedWebserver() as server:
+        with server.published(tmp_path, callback) as prefix:
+            base_url = f"http://localhost:{server.port}{prefix}"
+            response = await get(f"{base_url}/firmware.bin")
+            assert response.status_code == 200
+            assert response.content == b"firmware"
+            response = await get(f"{base_url}/subdir/model.pkg")
+            assert response.content == b"model"
+
+            # Files outside of the published directory are out of reach
+            response = await get(f"{base_url}/../{tmp_path.name}/firmware.bin")
+            assert response.status_code == 404
+            response = await get(f"http://localhost:{server.port}/firmware.bin")
+            assert response.status_code == 404
+
+        # Unpublished artifacts are no longer served
+        response = await get(f"{base_url}/firmware.bin")
+        assert response.status_code == 404
+
+    reported = {call.args[0].path.name for call in callback.call_args_list}
+    assert reported == {"firmware.bin", "model.pkg"}
+
+
+@pytest.mark.trio
+async def test_device_uploads_are_not_downloadable(tmp_path):
+    tmp_path.joinpath("image.jpg").write_bytes(b"jpg")
+    async with SharedWebserver() as server:
+        prefix = server.register_device("1883", tmp_path)
+        response = await get(f"http://localhost:{server.port}{prefix}/image.jpg")
+        assert response.status_code == 404
+
+
+@pytest.mark.trio
+async def test_serve_directory(tmp_path):
+    tmp_path.joinpath("firmware.bin").write_bytes(b"firmware")
+    callback = Mock()
+
+    async with SharedWebserver() as server:
+        async with serve_directory(server, tmp_path, 0, callback) as (port, prefix):
+            assert port == server.port
+            response = await get(f"http://localhost:{port}{prefix}/firmware.bin")
+            assert response.content == b"firmware"
+        response = await get(f"http://localhost:{port}{prefix}/firmware.bin")
+        assert response.status_code == 404
+
+    # A dedicated webserver, without the shared one
+    async with serve_directory(None, tmp_path, 0, callback) as (port, prefix):
+        assert prefix == ""
+        response = await get(f"http://localhost:{port}/firmware.bin")
+        assert response.content == b"firmware"
+
+    assert callback.call_count == 2
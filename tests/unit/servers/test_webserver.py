@@ -15,11 +15,21 @@
 # SPDX-License-Identifier: Apache-2.0
 import logging
 import shutil
+import socket
+import time
+from functools import partial
+from typing import Callable
 from unittest.mock import Mock
 from unittest.mock import patch
 
 import pytest
 import requests
+import trio
+from local_console.servers.webserver import AsyncWebserver
+from local_console.servers.webserver import CustomHTTPRequestHandler
+from local_console.servers.webserver import InMemoryUpload
+from local_console.servers.webserver import parse_range
+from local_console.servers.webserver import RangeNotSatisfiable
 from local_console.servers.webserver import SyncWebserver
 
 logger = logging.getLogger(__name__)
@@ -50,13 +60,86 @@ def test_save_error(sync_webserver, caplog):
     url = f"http://localhost:{sync_webserver.port}/{file_name}"
     data = b"data"
 
-    with patch(
-        "local_console.servers.webserver.Path.write_bytes", side_effect=IOError()
-    ):
+    with patch("local_console.servers.webserver.os.replace", side_effect=IOError()):
         response = requests.put(url, data=data)
-        assert response.status_code == 200
+        assert response.status_code == 500
         assert "Error while receiving data" in caplog.text
 
+    # The partially written file is cleaned up
+    assert not any(sync_webserver.dir.iterdir())
+
+
+def generate_chunks(n_chunks: int):
+    for index in range(n_chunks):
+        yield bytes([index]) * (index + 1)
+
+
+def test_chunked_upload(sync_webserver):
+    file_name = "testfile.txt"
+    url = f"http://localhost:{sync_webserver.port}/{file_name}"
+    mock_callback = Mock()
+    sync_webserver.on_incoming = mock_callback
+
+    # Passing a generator makes requests use the chunked transfer encoding
+    response = requests.put(url, data=generate_chunks(50))
+    assert response.status_code == 200
+
+    dest_path = sync_webserver.dir.joinpath(file_name)
+    assert dest_path.read_bytes() == b"".join(generate_chunks(50))
+    mock_callback.assert_called_once_with(dest_path)
+
+
+def test_large_upload_is_streamed(sync_webserver):
+    file_name = "testfile.bin"
+    url = f"http://localhost:{sync_webserver.port}/{file_name}"
+    data = bytes(range(256)) * 4096
+
+    with patch("local_console.servers.webserver.CHUNK_SIZE", 1000):
+        response = requests.put(url, data=data)
+    assert response.status_code == 200
+    assert sync_webserver.dir.joinpath(file_name).read_bytes() == data
+
+
+def test_truncated_upload(sync_webserver, caplog):
+    with socket.create_connection(("localhost", sync_webserver.port)) as sock:
+        sock.sendall(b"PUT /testfile.txt HTTP/1.0\r\nContent-Length: 100\r\n\r\n")
+        sock.sendall(b"only a part")
+        sock.shutdown(socket.SHUT_WR)
+        assert sock.recv(1024).startswith(b"HTTP/1.1 400")
+
+    assert "Connection closed before the end of the body" in caplog.text
+    assert not any(sync_webserver.dir.iterdir())
+
+
+def test_keep_alive(sync_webserver):
+    n_requests = 5
+    with requests.Session() as session:
+        for index in range(n_requests):
+            url = f"http://localhost:{sync_webserver.port}/{index}.txt"
+            response = session.put(url, data=b"data")
+            assert response.status_code == 200
+            assert response.headers["Content-Length"] == "0"
+
+            response = session.get(url)
+            assert response.content == b"data"
+
+    assert sync_webserver.stats.connections == 1
+    assert sync_webserver.stats.requests == 2 * n_requests
+    assert sync_webserver.stats.requests_per_connection == 2 * n_requests
+
+
+def test_keep_alive_idle_timeout(sync_webserver):
+    with (
+        patch.object(CustomHTTPRequestHandler, "timeout", 0.1),
+        socket.create_connection(("localhost", sync_webserver.port)) as sock,
+    ):
+        sock.sendall(b"PUT /testfile.txt HTTP/1.1\r\nContent-Length: 4\r\n\r\ndata")
+        assert sock.recv(1024).startswith(b"HTTP/1.1 200")
+
+        # The server closes the idle connection
+        sock.settimeout(5)
+        assert sock.recv(1024) == b""
+
 
 def test_callback_error(sync_webserver, caplog):
     file_name = "testfile.txt"
@@ -94,3 +177,349 @@ def test_unexpected_deletion_of_save_directory(sync_webserver, tmp_path_factory)
     assert response.status_code == 200
     content = save_dir.joinpath(file_name).read_bytes()
     assert content == data
+
+
+@pytest.mark.trio
+async def test_async_upload(tmp_path):
+    send_channel, receive_channel = trio.open_memory_channel(10)
+    async with AsyncWebserver(tmp_path, incoming=send_channel) as server:
+        n_uploads = 10
+        async with trio.open_nursery() as nursery:
+            for index in range(n_uploads):
+                url = f"http://localhost:{server.port}/images/{index}.jpg"
+                nursery.start_soon(
+                    trio.to_thread.run_sync, partial(requests.put, url, data=b"jpg")
+                )
+
+    received = []
+    while True:
+        try:
+            received.append(receive_channel.receive_nowait())
+        except trio.WouldBlock:
+            break
+
+    # Uploads are served concurrently, so they may arrive in any order
+    expected = {tmp_path / "images" / f"{index}.jpg" for index in range(n_uploads)}
+    assert set(received) == expected
+    assert all(path.read_bytes() == b"jpg" for path in received)
+
+
+@pytest.mark.trio
+async def test_async_upload_closed_channel(tmp_path, caplog):
+    send_channel, receive_channel = trio.open_memory_channel(0)
+    await receive_channel.aclose()
+    async with AsyncWebserver(tmp_path, incoming=send_channel) as server:
+        url = f"http://localhost:{server.port}/testfile.txt"
+        response = await trio.to_thread.run_sync(
+            partial(requests.put, url, data=b"data")
+        )
+
+    assert response.status_code == 200
+    assert tmp_path.joinpath("testfile.txt").read_bytes() == b"data"
+
+
+@pytest.mark.trio
+async def test_async_save_error(tmp_path, caplog):
+    send_channel, receive_channel = trio.open_memory_channel(1)
+    async with AsyncWebserver(tmp_path, incoming=send_channel) as server:
+        url = f"http://localhost:{server.port}/testfile.txt"
+        with patch.object(trio.Path, "replace", side_effect=IOError()):
+            response = await trio.to_thread.run_sync(
+                partial(requests.put, url, data=b"data")
+            )
+
+    assert response.status_code == 500
+    assert "Error while receiving data" in caplog.text
+    assert not any(tmp_path.iterdir())
+    with pytest.raises(trio.WouldBlock):
+        receive_channel.receive_nowait()
+
+
+@pytest.mark.trio
+async def test_async_in_memory_upload(tmp_path):
+    send_channel, receive_channel = trio.open_memory_channel(2)
+    async with AsyncWebserver(
+        tmp_path, incoming=send_channel, in_memory=True
+    ) as server:
+        url = f"http://localhost:{server.port}/images/testfile.jpg"
+        response = await trio.to_thread.run_sync(
+            partial(requests.put, url, data=generate_chunks(50))
+        )
+        assert response.status_code == 200
+
+        # Empty uploads are not notified
+        response = await trio.to_thread.run_sync(partial(requests.put, url, data=b""))
+        assert response.status_code == 200
+
+    upload = receive_channel.receive_nowait()
+    assert upload == InMemoryUpload(
+        tmp_path / "images" / "testfile.jpg", b"".join(generate_chunks(50))
+    )
+    with pytest.raises(trio.WouldBlock):
+        receive_channel.receive_nowait()
+    # Nothing gets written
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.trio
+async def test_async_in_memory_upload_too_large(tmp_path, caplog):
+    send_channel, receive_channel = trio.open_memory_channel(1)
+    with patch("local_console.servers.webserver.MAX_MEMORY_UPLOAD_SIZE", 10):
+        async with AsyncWebserver(
+            tmp_path, incoming=send_channel, in_memory=True
+        ) as server:
+            url = f"http://localhost:{server.port}/testfile.jpg"
+            response = await trio.to_thread.run_sync(
+                partial(requests.put, url, data=b"x" * 11)
+            )
+
+    assert response.status_code == 413
+    assert "Body exceeds 10 bytes" in caplog.text
+    with pytest.raises(trio.WouldBlock):
+        receive_channel.receive_nowait()
+
+
+@pytest.mark.trio
+async def test_async_chunked_upload(tmp_path):
+    send_channel, receive_channel = trio.open_memory_channel(1)
+    async with AsyncWebserver(tmp_path, incoming=send_channel) as server:
+        url = f"http://localhost:{server.port}/testfile.txt"
+        response = await trio.to_thread.run_sync(
+            partial(requests.put, url, data=generate_chunks(50))
+        )
+        assert response.status_code == 200
+
+    dest_path = receive_channel.receive_nowait()
+    assert dest_path == tmp_path / "testfile.txt"
+    assert dest_path.read_bytes() == b"".join(generate_chunks(50))
+
+
+@pytest.mark.trio
+async def test_async_truncated_upload(tmp_path, caplog):
+    async with AsyncWebserver(tmp_path) as server:
+        stream = await trio.open_tcp_stream("localhost", server.port)
+        async with stream:
+            await stream.send_all(
+                b"PUT /testfile.txt HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                b"10\r\nonly a part"
+            )
+            await stream.send_eof()
+            assert (await stream.receive_some()).startswith(b"HTTP/1.1 400")
+
+    assert "Connection closed before the end of the body" in caplog.text
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.trio
+async def test_async_keep_alive(tmp_path):
+    n_requests = 5
+
+    def upload_and_download(port: int) -> None:
+        with requests.Session() as session:
+            for index in range(n_requests):
+                url = f"http://localhost:{port}/{index}.txt"
+                response = session.put(url, data=b"data")
+                assert response.status_code == 200
+                assert response.headers["Connection"] == "keep-alive"
+
+                response = session.get(url)
+                assert response.content == b"data"
+
+    async with AsyncWebserver(tmp_path) as server:
+        await trio.to_thread.run_sync(upload_and_download, server.port)
+
+    assert server.stats.connections == 1
+    assert server.stats.requests == 2 * n_requests
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize(
+    "request_head, keeps_alive",
+    [
+        (b"GET /missing HTTP/1.1\r\n\r\n", True),
+        (b"GET /missing HTTP/1.1\r\nConnection: close\r\n\r\n", False),
+        (b"GET /missing HTTP/1.0\r\n\r\n", False),
+        (b"GET /missing HTTP/1.0\r\nConnection: keep-alive\r\n\r\n", True),
+        (b"DELETE /missing HTTP/1.1\r\n\r\n", False),
+    ],
+)
+async def test_async_keep_alive_negotiation(tmp_path, request_head, keeps_alive):
+    with patch("local_console.servers.webserver.KEEP_ALIVE_TIMEOUT", 0.1):
+        async with AsyncWebserver(tmp_path) as server:
+            stream = await trio.open_tcp_stream("localhost", server.port)
+            async with stream:
+                await stream.send_all(request_head)
+                response = await stream.receive_some()
+                connection = b"keep-alive" if keeps_alive else b"close"
+                assert b"Connection: " + connection in response
+
+                # Whether kept alive or not, the connection is eventually closed
+                with trio.fail_after(5):
+                    assert await stream.receive_some() == b""
+
+
+@pytest.mark.trio
+async def test_async_download(tmp_path):
+    data = bytes(range(256)) * 1024
+    tmp_path.joinpath("firmware.bin").write_bytes(data)
+
+    async with AsyncWebserver(tmp_path) as server:
+        url = f"http://localhost:{server.port}/firmware.bin"
+        response = await trio.to_thread.run_sync(requests.get, url)
+        assert response.status_code == 200
+        assert response.content == data
+
+        url = f"http://localhost:{server.port}/missing.bin"
+        response = await trio.to_thread.run_sync(requests.get, url)
+        assert response.status_code == 404
+
+
+@pytest.mark.trio
+async def test_async_path_outside_directory(tmp_path, caplog):
+    served_dir = tmp_path / "served"
+    served_dir.mkdir()
+    tmp_path.joinpath("secret.txt").write_text("secret")
+
+    async with AsyncWebserver(served_dir) as server:
+        url = f"http://localhost:{server.port}/%2E%2E/secret.txt"
+        response = await trio.to_thread.run_sync(requests.get, url)
+        assert response.status_code == 404
+
+        response = await trio.to_thread.run_sync(
+            partial(requests.put, url, data=b"overwrite")
+        )
+        assert response.status_code == 403
+        assert "Error while receiving data" in caplog.text
+
+    assert tmp_path.joinpath("secret.txt").read_text() == "secret"
+
+
+@pytest.mark.trio
+async def test_async_serve_in_nursery(tmp_path):
+    server = AsyncWebserver(tmp_path)
+    async with trio.open_nursery() as nursery:
+        await nursery.start(server.serve)
+        assert server.port
+
+        url = f"http://localhost:{server.port}/testfile.txt"
+        response = await trio.to_thread.run_sync(
+            partial(requests.put, url, data=b"data")
+        )
+        assert response.status_code == 200
+        nursery.cancel_scope.cancel()
+
+    assert tmp_path.joinpath("testfile.txt").read_bytes() == b"data"
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-9", (0, 10)),
+        ("bytes=10-", (10, 100)),
+        ("bytes=90-200", (90, 100)),
+        ("bytes=-5", (95, 100)),
+        ("bytes=-500", (0, 100)),
+        ("bytes=0-9,20-29", None),
+        ("items=0-9", None),
+        ("bytes=a-b", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=50-10"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 100)
+
+
+DOWNLOAD_DATA = bytes(range(256)) * 1024
+
+
+def check_range_downloads(port: int) -> None:
+    url = f"http://localhost:{port}/firmware.bin"
+    response = requests.get(url)
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.content == DOWNLOAD_DATA
+
+    # Resuming an interrupted download
+    response = requests.get(url, headers={"Range": "bytes=1000-"})
+    assert response.status_code == 206
+    assert (
+        response.headers["Content-Range"]
+        == f"bytes 1000-{len(DOWNLOAD_DATA) - 1}/{len(DOWNLOAD_DATA)}"
+    )
+    assert response.content == DOWNLOAD_DATA[1000:]
+
+    response = requests.get(url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == DOWNLOAD_DATA[10:20]
+
+    response = requests.get(url, headers={"Range": f"bytes={len(DOWNLOAD_DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(DOWNLOAD_DATA)}"
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5) -> None:
+    """
+    Reports of the threaded server can arrive after the client got all data
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def check_download_progress(on_download: Mock) -> None:
+    reports = [call.args[0] for call in on_download.call_args_list]
+    assert all(report.total == len(DOWNLOAD_DATA) for report in reports)
+
+    # Positions grow within each download, which are the whole
+    # file, the resumed download and the short range.
+    last_positions = [
+        report.position
+        for report, following in zip(reports, reports[1:] + [None])
+        if not following or following.position <= report.position
+    ]
+    assert last_positions == [len(DOWNLOAD_DATA), len(DOWNLOAD_DATA), 20]
+    assert reports[-1].transferred == 10
+    assert reports[-1].percentage == 0
+
+
+def test_range_download(tmp_path):
+    tmp_path.joinpath("firmware.bin").write_bytes(DOWNLOAD_DATA)
+    on_download = Mock()
+    with (
+        patch("local_console.servers.webserver.SENDFILE_CHUNK_SIZE", 10000),
+        SyncWebserver(tmp_path, on_download=on_download) as server,
+    ):
+        check_range_downloads(server.port)
+        wait_for(lambda: on_download.call_args.args[0].position == 20)
+
+    check_download_progress(on_download)
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("has_sendfile", [True, False])
+async def test_async_range_download(tmp_path, has_sendfile):
+    tmp_path.joinpath("firmware.bin").write_bytes(DOWNLOAD_DATA)
+    on_download = Mock()
+    with (
+        patch("local_console.servers.webserver.SENDFILE_CHUNK_SIZE", 10000),
+        patch("local_console.servers.webserver.HAS_SENDFILE", has_sendfile),
+    ):
+        async with AsyncWebserver(tmp_path, on_download=on_download) as server:
+            await trio.to_thread.run_sync(check_range_downloads, server.port)
+
+    check_download_progress(on_download)
+
+
+def test_download_callback_error(tmp_path, caplog):
+    tmp_path.joinpath("firmware.bin").write_bytes(DOWNLOAD_DATA)
+    with SyncWebserver(tmp_path, on_download=Mock(side_effect=ValueError)) as server:
+        response = requests.get(f"http://localhost:{server.port}/firmware.bin")
+        assert response.content == DOWNLOAD_DATA
+        wait_for(lambda: "Error while reporting download progress" in caplog.text)
@@ -20,6 +20,7 @@ import random
 import threading
 from collections import OrderedDict
 from collections.abc import Iterator
+from datetime import timedelta
 from itertools import cycle
 from pathlib import Path
 from unittest.mock import MagicMock
@@ -27,9 +28,21 @@ from unittest.mock import Mock
 from unittest.mock import patch
 
 import pytest
+from local_console.utils.fstools import BackgroundDeleter
 from local_console.utils.fstools import check_and_create_directory
+from local_console.utils.fstools import delete_entry
 from local_console.utils.fstools import DirectoryMonitor
+from local_console.utils.fstools import FileInfo
+from local_console.utils.fstools import RetentionPolicy
+from local_console.utils.fstools import scan_files
+from local_console.utils.fstools import StorageIndex
 from local_console.utils.fstools import StorageSizeWatcher
+from watchdog.events import DirDeletedEvent
+from watchdog.events import DirMovedEvent
+from watchdog.events import FileCreatedEvent
+from watchdog.events import FileDeletedEvent
+from watchdog.events import FileModifiedEvent
+from watchdog.events import FileMovedEvent
 from watchdog.events import FileSystemEvent
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
@@ -491,3 +504,559 @@ def test_regular_sequence_update_size(dir_layout, file_creator):
     new_file.write_bytes(new_content)
     w.update_file_size(new_file)
     assert w.storage_usage == size + len(new_content)
+
+
+def test_register_file_again(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+
+    new_file = create_new(dir_base, file_creator)
+    w.incoming(new_file)
+    # A rewritten file replaces its entry, becoming the newest one
+    new_file.write_bytes(b"123")
+    os.utime(new_file, ns=(file_creator.age, file_creator.age))
+    w.incoming(new_file)
+
+    assert w.storage_usage == size + 3
+    assert [entry.path for entry in w.content].count(new_file) == 1
+    assert w.content[-1].path == new_file
+    assert w._consistency_check()
+
+
+def test_same_age_files_are_kept_in_arrival_order(tmp_path):
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(tmp_path)
+    files = [tmp_path / f"{index}" for index in range(5)]
+    for path in files:
+        path.write_bytes(b"0")
+        os.utime(path, ns=(0, 0))
+        w.incoming(path)
+
+    assert [entry.path for entry in w.content] == files
+
+    w.set_storage_limit(3)
+    assert [entry.path for entry in w.content] == files[2:]
+    assert [path.exists() for path in files] == [False, False, True, True, True]
+
+
+def test_prune_already_removed_files(dir_layout, caplog):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    for entry in w.content:
+        entry.path.unlink()
+
+    w.set_storage_limit(0)
+    assert w.storage_usage == 0
+    assert w.get_oldest() is None
+    assert "was already removed" in caplog.text
+
+
+def test_no_consistency_check_without_frequency(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(dir_base)
+
+    with patch.object(w, "_consistency_check") as mock_check:
+        for _ in range(100):
+            w.incoming(create_new(dir_base, file_creator))
+        mock_check.assert_not_called()
+    assert w.storage_usage == size + 100
+
+
+def test_file_events_update_bookkeeping(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(dir_base)
+
+    new_file = create_new(dir_base, file_creator)
+    w.on_file_event(FileCreatedEvent(str(new_file)))
+    assert w.storage_usage == size + 1
+    assert w.content[-1].path == new_file
+
+    age = w.content[-1].age
+    new_file.write_bytes(b"1234")
+    w.on_file_event(FileModifiedEvent(str(new_file)))
+    assert w.storage_usage == size + 4
+    assert w.content[-1].path == new_file
+    assert w.content[-1].age == age
+    assert w.content[-1].mtime == new_file.stat().st_mtime_ns
+
+    moved = dir_base / "sub" / "moved"
+    new_file.rename(moved)
+    w.on_file_event(FileMovedEvent(str(new_file), str(moved)))
+    assert w.storage_usage == size + 4
+    assert moved in {entry.path for entry in w.content}
+
+    moved.unlink()
+    w.on_file_event(FileDeletedEvent(str(moved)))
+    assert w.storage_usage == size
+
+    # Events are idempotent
+    w.on_file_event(FileDeletedEvent(str(moved)))
+    assert w.storage_usage == size
+    assert w._consistency_check()
+
+
+def test_directory_events_update_bookkeeping(dir_layout):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(dir_base)
+
+    sub = dir_base / "sub"
+    renamed = dir_base / "renamed"
+    sub.rename(renamed)
+    w.on_file_event(DirMovedEvent(str(sub), str(renamed)))
+    assert w.storage_usage == size
+    assert w._consistency_check()
+
+    for path in [renamed / "subsub" / "file0", renamed / "file0"]:
+        path.unlink()
+    (renamed / "subsub").rmdir()
+    renamed.rmdir()
+    w.on_file_event(DirDeletedEvent(str(renamed)))
+    assert w.storage_usage == size - 2
+    assert w._consistency_check()
+
+
+def test_file_events_outside_watched_paths_are_ignored(dir_layout, tmp_path_factory):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(dir_base)
+
+    outside = tmp_path_factory.mktemp("outside") / "file"
+    outside.write_bytes(b"123")
+    w.on_file_event(FileCreatedEvent(str(outside)))
+    assert w.storage_usage == size
+
+
+def test_file_events_prune(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(dir_base)
+    w.set_storage_limit(size)
+
+    oldest = w.get_oldest()
+    new_file = create_new(dir_base, file_creator)
+    w.on_file_event(FileCreatedEvent(str(new_file)))
+    assert w.storage_usage == size
+    assert not oldest.path.exists()
+
+
+def test_reconcile_with_stale_scan(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(dir_base)
+
+    in_storage = scan_files(w.roots)
+    # Changes while the scan result was being prepared
+    arrived = create_new(dir_base, file_creator)
+    w.incoming(arrived)
+    removed = w.get_oldest().path
+    removed.unlink()
+    w.on_file_event(FileDeletedEvent(str(removed)))
+
+    assert w.reconcile(in_storage)
+    assert w.storage_usage == size
+    assert arrived in {entry.path for entry in w.content}
+
+
+def test_directory_monitor_file_events(directory_monitor, tmp_path, file_creator):
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(tmp_path)
+    lock = threading.Lock()
+    changed = threading.Event()
+
+    def on_file_event(event: FileSystemEvent) -> None:
+        with lock:
+            w.on_file_event(event)
+        changed.set()
+
+    directory_monitor.watch(tmp_path, Mock(), on_file_event)
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    new_file = sub / "file"
+
+    def settles(usage: int) -> bool:
+        for _ in range(50):
+            changed.wait(0.1)
+            changed.clear()
+            with lock:
+                if w.storage_usage == usage:
+                    return True
+        return False
+
+    file_creator(new_file)
+    assert settles(1)
+    new_file.unlink()
+    assert settles(0)
+
+    with not_raises(KeyError):
+        directory_monitor.unwatch(tmp_path)
+
+
+def touch_directory(path: Path) -> None:
+    # Filesystem timestamps may be too coarse to tell apart quick changes
+    mtime = path.stat().st_mtime_ns + 1
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_index_roundtrip(dir_layout):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    w.unwatch_path(dir_base)
+
+    index = StorageIndex(dir_base)
+    assert index.location.is_file()
+    assert scan_files([dir_base]) == {entry.path for entry in w.content}
+
+    reloaded = StorageSizeWatcher(check_frequency=10)
+    with patch.object(
+        StorageIndex, "_scan_directory", wraps=StorageIndex._scan_directory
+    ) as mock_scan:
+        reloaded.set_path(dir_base)
+        mock_scan.assert_not_called()
+    assert reloaded.content == w.content
+    assert reloaded.storage_usage == size
+
+
+def test_index_rescans_changed_directories(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    w.save_index(dir_base)
+
+    added = create_new(dir_base / "sub", file_creator)
+    touch_directory(dir_base / "sub")
+    removed = dir_base / "sub" / "subsub" / "file0"
+    removed.unlink()
+    touch_directory(removed.parent)
+    new_dir = dir_base / "new"
+    new_dir.mkdir()
+    nested = create_new(new_dir, file_creator)
+
+    reloaded = StorageSizeWatcher(check_frequency=10)
+    with patch.object(
+        StorageIndex, "_scan_directory", wraps=StorageIndex._scan_directory
+    ) as mock_scan:
+        reloaded.set_path(dir_base)
+        scanned = {call.args[0] for call in mock_scan.call_args_list}
+    assert scanned == {dir_base, dir_base / "sub", removed.parent, new_dir}
+
+    paths = {entry.path for entry in reloaded.content}
+    assert added in paths and nested in paths and removed not in paths
+    assert reloaded.storage_usage == size + 1
+    assert reloaded._consistency_check()
+
+
+def test_index_is_not_accounted(dir_layout):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    w.save_index(dir_base)
+    location = StorageIndex(dir_base).location
+
+    w.on_file_event(FileCreatedEvent(str(location)))
+    assert w._consistency_check()
+    w.set_storage_limit(0)
+    assert w.storage_usage == 0
+    assert location.is_file()
+
+
+def test_unreadable_index_is_ignored(dir_layout, caplog):
+    dir_base, size = dir_layout
+    location = StorageIndex(dir_base).location
+    location.parent.mkdir()
+    location.write_bytes(b"not a database")
+
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    assert w.storage_usage == size
+    assert "Ignoring unreadable storage index" in caplog.text
+
+
+def test_background_deletion(dir_layout):
+    dir_base, size = dir_layout
+    reports = []
+    deleter = BackgroundDeleter(reports.append, batch_size=3)
+    w = StorageSizeWatcher(check_frequency=10, deleter=deleter)
+    w.set_path(dir_base)
+    pruned = [entry.path for entry in w.content]
+
+    w.set_storage_limit(0)
+    assert w.storage_usage == 0
+    assert w.get_oldest() is None
+
+    deleter.flush()
+    assert not any(path.exists() for path in pruned)
+    assert sum(report.deleted for report in reports) == size
+    assert not deleter.is_pending(pruned[0])
+    deleter.stop()
+
+
+def test_background_deletion_outcomes(tmp_path):
+    kept = tmp_path / "kept"
+    kept.write_bytes(b"0")
+    failing = tmp_path / "failing"
+    failing.write_bytes(b"0")
+    entries = [
+        FileInfo(kept.stat().st_mtime_ns + 1, kept, 1),
+        FileInfo(0, tmp_path / "missing", 1),
+        FileInfo(failing.stat().st_mtime_ns, failing, 1),
+    ]
+    reports = []
+    deleter = BackgroundDeleter(reports.append)
+
+    with patch.object(Path, "unlink", side_effect=PermissionError("denied")):
+        deleter.delete(entries)
+        deleter.flush()
+    deleter.stop()
+
+    (report,) = reports
+    assert (report.deleted, report.replaced, report.missing) == (0, 1, 1)
+    assert [path for path, _ in report.failed] == [failing]
+    assert kept.exists()
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_prune_file_rewritten_in_place(tmp_path, background):
+    deleter = BackgroundDeleter() if background else None
+    w = StorageSizeWatcher(check_frequency=None, deleter=deleter)
+    w.set_path(tmp_path)
+    first = tmp_path / "1.jpg"
+    first.write_bytes(b"0" * 100)
+    os.utime(first, ns=(1, 1))
+    w.incoming(first)
+
+    # As drawing onto an image does
+    first.write_bytes(b"1" * 100)
+    os.utime(first, ns=(2, 2))
+    w.update_file_size(first)
+    second = tmp_path / "2.jpg"
+    second.write_bytes(b"2" * 100)
+    os.utime(second, ns=(3, 3))
+    w.incoming(second)
+
+    w.set_storage_limit(150)
+    if deleter:
+        deleter.flush()
+        deleter.stop()
+    assert not first.exists()
+    assert [entry.path for entry in w.content] == [second]
+    assert w.storage_usage == 100
+
+
+def test_pruned_file_written_anew_is_tracked_again(tmp_path):
+    reports = []
+    deleter = BackgroundDeleter(reports.append)
+    w = StorageSizeWatcher(check_frequency=None, deleter=deleter)
+    w.set_path(tmp_path)
+    reused = tmp_path / "reused.jpg"
+    reused.write_bytes(b"0")
+    os.utime(reused, ns=(1, 1))
+    w.incoming(reused)
+
+    gate = threading.Event()
+    delete_batch = deleter._delete_batch
+
+    def gated_delete_batch(items):
+        gate.wait()
+        delete_batch(items)
+
+    with patch.object(deleter, "_delete_batch", gated_delete_batch):
+        w.set_storage_limit(0)
+        assert w.file_count == 0
+        # Written anew under the same name before getting deleted
+        reused.write_bytes(b"1234")
+        os.utime(reused, ns=(2, 2))
+        gate.set()
+        deleter.flush()
+    deleter.stop()
+
+    assert reused.exists()
+    assert reports[0].replaced == 1
+    assert w.content == [FileInfo(2, reused, 4)]
+    assert w.storage_usage == 4
+
+
+def test_pruned_file_written_anew_is_tracked_again_in_place(tmp_path):
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(tmp_path)
+    reused = tmp_path / "reused.jpg"
+    reused.write_bytes(b"0")
+    os.utime(reused, ns=(1, 1))
+    w.incoming(reused)
+
+    def rewrite_then_delete(entry):
+        # Written anew under the same name between pruning and deleting
+        reused.write_bytes(b"1234")
+        os.utime(reused, ns=(2, 2))
+        return delete_entry(entry)
+
+    with patch("local_console.utils.fstools.delete_entry", rewrite_then_delete):
+        w.set_storage_limit(0)
+
+    assert reused.exists()
+    assert w.content == [FileInfo(2, reused, 4)]
+    assert w.storage_usage == 4
+
+
+def test_pending_deletion_is_not_tracked_again(dir_layout):
+    dir_base, size = dir_layout
+    deleter = BackgroundDeleter()
+    w = StorageSizeWatcher(check_frequency=None, deleter=deleter)
+    w.set_path(dir_base)
+    oldest = w.get_oldest().path
+
+    gate = threading.Event()
+    delete_batch = deleter._delete_batch
+
+    def gated_delete_batch(entries):
+        gate.wait()
+        delete_batch(entries)
+
+    with patch.object(deleter, "_delete_batch", gated_delete_batch):
+        w.set_storage_limit(size - 1)
+        assert deleter.is_pending(oldest) and oldest.exists()
+
+        w.on_file_event(FileModifiedEvent(str(oldest)))
+        w.reconcile(scan_files(w.roots))
+        assert w.storage_usage == size - 1
+
+        gate.set()
+        deleter.stop()
+    assert not oldest.exists()
+
+
+def test_file_count_limit(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    oldest = [entry.path for entry in w.content[:2]]
+
+    w.set_file_limit(size - 2)
+    assert w.file_count == size - 2
+    assert not any(path.exists() for path in oldest)
+
+    w.incoming(create_new(dir_base, file_creator))
+    assert w.file_count == size - 2
+
+    w.set_file_limit(None)
+    w.incoming(create_new(dir_base, file_creator))
+    assert w.file_count == size - 1
+
+
+def test_age_limit(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    # Files from the fixture are dated at the epoch
+    recent = dir_base / "recent"
+    recent.write_bytes(b"0")
+    w.incoming(recent)
+
+    w.set_age_limit(timedelta(hours=1))
+    assert [entry.path for entry in w.content] == [recent]
+    assert w.policy == RetentionPolicy(max_age=timedelta(hours=1))
+
+    w.set_age_limit(timedelta(0))
+    w.apply_retention()
+    assert w.file_count == 0
+    assert not recent.exists()
+
+
+def test_evict_oldest(dir_layout):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    oldest = w.get_oldest()
+
+    assert w.evict_oldest() == oldest
+    assert not oldest.path.exists()
+    assert w.storage_usage == size - 1
+
+    while w.evict_oldest():
+        pass
+    assert w.file_count == 0 and w.storage_usage == 0
+
+
+def test_entries_before(dir_layout):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=10)
+    w.set_path(dir_base)
+    content = w.content
+
+    assert w.entries_before(2, dir_base, 10) == content[:2]
+    assert w.entries_before(size, dir_base, 3) == content[:3]
+    assert w.entries_before(size, dir_base / "sub", 10) == content[2:]
+    excluded = content[0].path
+    assert w.entries_before(2, dir_base, 10, lambda p: p == excluded) == content[1:2]
+
+    merged = dir_base / "merged"
+    merged.write_bytes(b"12")
+    w.replace_entries(content[:2], merged)
+    assert w.storage_usage == size
+    assert merged in {entry.path for entry in w.content}
+
+
+def test_concurrent_ingestion(tmp_path):
+    w = StorageSizeWatcher(check_frequency=7)
+    w.set_path(tmp_path)
+    w.set_storage_limit(40)
+    workers = 4
+    per_worker = 50
+
+    def ingest(worker: int) -> None:
+        for index in range(per_worker):
+            path = tmp_path / f"{worker}_{index}"
+            path.write_bytes(b"0")
+            age = index * workers + worker
+            os.utime(path, ns=(age, age))
+            w.incoming(path)
+
+    threads = [threading.Thread(target=ingest, args=(n,)) for n in range(workers)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        w.reconcile()
+        w.set_file_limit(30)
+        w.set_file_limit(None)
+    for thread in threads:
+        thread.join()
+
+    assert w._consistency_check()
+    assert w.storage_usage == sum(entry.size for entry in w.content) <= 40
+    assert {entry.path for entry in w.content} == set(scan_files(w.roots))
+
+
+def test_incoming_during_reconciliation(dir_layout, file_creator):
+    dir_base, size = dir_layout
+    w = StorageSizeWatcher(check_frequency=None)
+    w.set_path(dir_base)
+
+    scanning = threading.Event()
+    gate = threading.Event()
+
+    def gated_scan(roots):
+        scanning.set()
+        gate.wait()
+        return scan_files(roots)
+
+    with patch("local_console.utils.fstools.scan_files", gated_scan):
+        reconciling = threading.Thread(target=w.reconcile)
+        reconciling.start()
+        scanning.wait()
+        assert w.state == StorageSizeWatcher.State.Checking
+        # Files keep being registered, and no other reconciliation starts
+        w.incoming(create_new(dir_base, file_creator))
+        assert w.storage_usage == size + 1
+        assert w.reconcile()
+
+        gate.set()
+        reconciling.join()
+
+    assert w.state == StorageSizeWatcher.State.Accumulating
+    assert w.storage_usage == size + 1
+    assert w._consistency_check()
@@ -0,0 +1,119 @@
+# Copyright 2024 Sony Semiconductor Solutions Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+import os
+import threading
+from pathlib import Path
+
+import pytest
+from local_console.utils.fstools import StorageSizeWatcher
+from local_console.utils.retention import StoragePool
+
+
+def populate(root: Path, count: int, size: int = 1) -> StorageSizeWatcher:
+    root.mkdir()
+    for index in range(count):
+        path = root / f"{index}"
+        path.write_bytes(b"0" * size)
+        os.utime(path, ns=(index, index))
+    watcher = StorageSizeWatcher(check_frequency=10)
+    watcher.set_path(root)
+    return watcher
+
+
+@pytest.fixture
+def pool_members(tmp_path) -> list[StorageSizeWatcher]:
+    return [
+        populate(tmp_path / "busy", 8),
+        populate(tmp_path / "quiet", 2),
+        populate(tmp_path / "large", 2, size=3),
+    ]
+
+
+def test_no_budget_keeps_everything(pool_members):
+    pool = StoragePool()
+    for watcher in pool_members:
+        pool.join(watcher)
+
+    assert pool.rebalance() == 0
+    assert pool.storage_usage == 16
+    assert pool.file_count == 12
+
+
+def test_byte_budget_evicts_from_largest_user(pool_members):
+    busy, quiet, large = pool_members
+    pool = StoragePool()
+    for watcher in pool_members:
+        pool.join(watcher)
+
+    pool.set_budget(max_bytes=12, max_files=None)
+    assert pool.storage_usage <= 12
+    # Evictions alternate among the largest users, sparing the smallest one
+    assert (busy.storage_usage, quiet.storage_usage, large.storage_usage) == (5, 2, 3)
+    # The oldest files are evicted first
+    assert [entry.path.name for entry in busy.content] == ["3", "4", "5", "6", "7"]
+
+
+def test_file_budget_evicts_from_most_files(pool_members):
+    busy, quiet, large = pool_members
+    pool = StoragePool(max_files=6)
+    for watcher in pool_members:
+        pool.join(watcher)
+
+    assert pool.rebalance() == 6
+    assert (busy.file_count, quiet.file_count, large.file_count) == (2, 2, 2)
+
+
+def test_leaving_members_are_not_evicted(pool_members):
+    busy, quiet, large = pool_members
+    pool = StoragePool(max_files=2)
+    for watcher in pool_members:
+        pool.join(watcher)
+    pool.leave(busy)
+    pool.leave(busy)
+
+    pool.rebalance()
+    assert busy.file_count == 8
+    assert quiet.file_count + large.file_count == 2
+
+
+def test_rebalance_while_ingesting(tmp_path, pool_members):
+    busy, quiet, large = pool_members
+    pool = StoragePool(max_files=5)
+    pool.join(busy)
+
+    def ingest() -> None:
+        for index in range(8, 40):
+            path = tmp_path / "busy" / f"{index}"
+            path.write_bytes(b"0")
+            os.utime(path, ns=(index, index))
+            busy.incoming(path)
+
+    ingesting = threading.Thread(target=ingest)
+    ingesting.start()
+    while ingesting.is_alive():
+        pool.rebalance()
+    ingesting.join()
+
+    pool.rebalance()
+    assert busy.file_count == 5
+    assert busy.storage_usage == sum(entry.size for entry in busy.content)
+    assert [entry.path.name for entry in busy.content] == [
+        "35",
+        "36",
+        "37",
+        "38",
+        "39",
+    ]